@@ -1,3 +1,253 @@
-from django.contrib import admin
+"""
+Administración de Django para los modelos de gestion_clinica.
 
-# Register your models here.
+Pensada para tablas grandes:
+- los listados traen sus relaciones en la misma consulta (list_select_related)
+  y usan el paginador con conteo aproximado de la API (ver conteo.py), sin
+  el conteo total de la tabla (show_full_result_count = False);
+- las claves foráneas se eligen con autocompletado o por id, nunca con un
+  <select> con toda la tabla;
+- las búsquedas van por prefijo o igualdad sobre columnas indexadas;
+- las acciones masivas son un único UPDATE que además marca updated_at,
+  invalida las caches que dependen de los registros modificados, publica los
+  eventos en vivo y descarta los recordatorios de las citas que ya no
+  corresponde recordar.
+"""
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import agenda, recordatorios
+from .coalescencia import invalidar_modelo
+from .conteo import PaginadorEstimado
+from .eventos import publicar_cambios
+from .models import (
+    Cita, Clinica, ConsultaMedica, Especialidad, Medicamento, Medico, Paciente, RecetaMedica, RegistroAuditoria,
+    Tratamiento,
+)
+from .normalizacion import normalizar
+
+# Modelos cuyos cambios se publican en vivo (ver eventos.py)
+MODELOS_EN_VIVO = (Cita, ConsultaMedica)
+
+# Eventos en vivo que se arman y publican juntos en una acción masiva
+TAMANO_LOTE = 1000
+
+
+def actualizar_en_bloque(queryset, **cambios):
+    """
+    Aplica los cambios con un solo UPDATE y devuelve la cantidad de filas.
+    QuerySet.update() no envía señales, por lo que aquí se hace lo que harían
+    los receptores: marcar updated_at (sincronización delta y ETag de los
+    calendarios), invalidar la agenda y la coalescencia de GET, publicar los
+    eventos en vivo y descartar los recordatorios pendientes de las citas
+    que dejaron de recordarse. Todo en la misma transacción que el UPDATE y
+    sin cargar en memoria las filas modificadas: los eventos se arman por
+    lotes de TAMANO_LOTE.
+    """
+    modelo = queryset.model
+    alias = queryset.db
+    # Las filas del UPDATE comparten este updated_at y por él se vuelven a
+    # encontrar: el filtro del queryset puede no coincidir después
+    ahora = timezone.now()
+    campo_fecha = agenda.CAMPO_FECHA.get(modelo)
+    with transaction.atomic(using=alias):
+        if campo_fecha:
+            dias = queryset.order_by().values_list(
+                'medico_id', TruncDate(campo_fecha, tzinfo=timezone.get_current_timezone()),
+            ).distinct()
+            agenda.invalidar(list(dias), alias)
+        total = queryset.update(updated_at=ahora, **cambios)
+        actualizadas = modelo.objects.using(alias).filter(updated_at=ahora)
+        invalidar_modelo(modelo, alias)
+        if modelo in MODELOS_EN_VIVO:
+            lote = []
+            for instancia in actualizadas.only('medico', 'paciente', 'estado', campo_fecha).iterator(TAMANO_LOTE):
+                lote.append(instancia)
+                if len(lote) == TAMANO_LOTE:
+                    publicar_cambios(lote, 'actualizada')
+                    lote = []
+            publicar_cambios(lote, 'actualizada')
+        if modelo is Cita:
+            recordatorios.descartar(citas=actualizadas.values('pk'))
+    return total
+
+
+class AdminBase(admin.ModelAdmin):
+    """
+    Opciones comunes a todos los modelos clínicos.
+    """
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    list_per_page = 50
+
+    def _accion_en_bloque(self, request, queryset, mensaje, **cambios):
+        total = actualizar_en_bloque(queryset, **cambios)
+        self.message_user(request, mensaje.format(total=total), messages.SUCCESS)
+
+
+class BusquedaNormalizadaMixin:
+    """
+    Busca sin tildes ni mayúsculas sobre columnas *_normalizado.
+    """
+    def get_search_results(self, request, queryset, search_term):
+        return super().get_search_results(request, queryset, normalizar(search_term))
+
+
+@admin.register(Clinica)
+class ClinicaAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'codigo', 'alias_bd', 'activa']
+    list_filter = ['activa']
+    search_fields = ['=codigo', '^nombre']
+    show_full_result_count = False
+
+
+@admin.register(Especialidad)
+class EspecialidadAdmin(BusquedaNormalizadaMixin, AdminBase):
+    list_display = ['nombre', 'updated_at']
+    search_fields = ['^nombre_normalizado']
+    ordering = ['nombre']
+
+
+@admin.register(Paciente)
+class PacienteAdmin(AdminBase):
+    list_display = ['rut', 'apellido', 'nombre', 'fecha_nacimiento', 'tipo_sangre', 'telefono', 'activo']
+    list_filter = ['activo', 'tipo_sangre']
+    search_fields = ['=rut', '^apellido', '^nombre']
+    ordering = ['apellido', 'nombre']
+    actions = ['activar', 'desactivar']
+
+    @admin.action(description='Activar los pacientes seleccionados')
+    def activar(self, request, queryset):
+        self._accion_en_bloque(request, queryset, '{total} pacientes activados.', activo=True)
+
+    @admin.action(description='Desactivar los pacientes seleccionados')
+    def desactivar(self, request, queryset):
+        self._accion_en_bloque(request, queryset, '{total} pacientes desactivados.', activo=False)
+
+
+@admin.register(Medico)
+class MedicoAdmin(AdminBase):
+    list_display = ['rut', 'apellido', 'nombre', 'especialidad', 'correo', 'activo']
+    list_filter = ['activo']
+    list_select_related = ['especialidad']
+    search_fields = ['=rut', '^apellido', '^nombre']
+    autocomplete_fields = ['especialidad']
+    ordering = ['apellido', 'nombre']
+    actions = ['activar', 'desactivar']
+
+    @admin.action(description='Activar los médicos seleccionados')
+    def activar(self, request, queryset):
+        self._accion_en_bloque(request, queryset, '{total} médicos activados.', activo=True)
+
+    @admin.action(description='Desactivar los médicos seleccionados')
+    def desactivar(self, request, queryset):
+        self._accion_en_bloque(request, queryset, '{total} médicos desactivados.', activo=False)
+
+
+@admin.register(ConsultaMedica)
+class ConsultaMedicaAdmin(AdminBase):
+    list_display = ['fecha_consulta', 'paciente', 'medico', 'motivo', 'estado']
+    list_filter = ['estado']
+    list_select_related = ['paciente', 'medico']
+    search_fields = ['=paciente__rut', '^paciente__apellido', '^medico__apellido']
+    autocomplete_fields = ['paciente', 'medico']
+    date_hierarchy = 'fecha_consulta'
+    ordering = ['-fecha_consulta']
+    actions = ['marcar_completadas', 'cancelar']
+
+    @admin.action(description='Marcar como completadas')
+    def marcar_completadas(self, request, queryset):
+        self._accion_en_bloque(
+            request, queryset.filter(estado__in=['AGENDADA', 'EN_CURSO']),
+            '{total} consultas marcadas como completadas.', estado='COMPLETADA',
+        )
+
+    @admin.action(description='Cancelar las consultas seleccionadas')
+    def cancelar(self, request, queryset):
+        self._accion_en_bloque(
+            request, queryset.filter(estado='AGENDADA'), '{total} consultas canceladas.', estado='CANCELADA',
+        )
+
+
+@admin.register(Tratamiento)
+class TratamientoAdmin(AdminBase):
+    list_display = ['id', 'consulta', 'duracion_dias', 'fecha_inicio', 'fecha_fin']
+    list_select_related = ['consulta__paciente', 'consulta__medico']
+    search_fields = ['=consulta__paciente__rut', '^consulta__paciente__apellido']
+    raw_id_fields = ['consulta']
+    readonly_fields = ['fecha_inicio', 'fecha_fin']
+    ordering = ['-id']
+
+
+@admin.register(Medicamento)
+class MedicamentoAdmin(BusquedaNormalizadaMixin, AdminBase):
+    list_display = ['nombre', 'laboratorio', 'stock', 'precio_unitario']
+    search_fields = ['^nombre_normalizado', '^laboratorio_normalizado']
+    ordering = ['nombre']
+
+
+@admin.register(RecetaMedica)
+class RecetaMedicaAdmin(AdminBase):
+    list_display = ['id', 'medicamento', 'dosis', 'frecuencia', 'tratamiento', 'fecha_inicio', 'fecha_fin']
+    list_filter = ['frecuencia']
+    list_select_related = ['medicamento', 'tratamiento__consulta__paciente', 'tratamiento__consulta__medico']
+    search_fields = ['=tratamiento__consulta__paciente__rut', '^medicamento__nombre']
+    raw_id_fields = ['tratamiento']
+    autocomplete_fields = ['medicamento']
+    readonly_fields = RecetaMedica.CAMPOS_POSOLOGIA
+    ordering = ['-id']
+
+
+@admin.register(Cita)
+class CitaAdmin(AdminBase):
+    list_display = ['fecha_hora', 'paciente', 'medico', 'tipo_cita', 'estado', 'duracion_minutos']
+    list_filter = ['estado', 'tipo_cita']
+    list_select_related = ['paciente', 'medico']
+    search_fields = ['=paciente__rut', '^paciente__apellido', '^medico__apellido']
+    autocomplete_fields = ['paciente', 'medico']
+    date_hierarchy = 'fecha_hora'
+    ordering = ['-fecha_hora']
+    actions = ['confirmar', 'cancelar', 'marcar_no_asistio']
+
+    @admin.action(description='Confirmar las citas seleccionadas')
+    def confirmar(self, request, queryset):
+        self._accion_en_bloque(
+            request, queryset.filter(estado='PROGRAMADA'), '{total} citas confirmadas.', estado='CONFIRMADA',
+        )
+
+    @admin.action(description='Cancelar las citas seleccionadas')
+    def cancelar(self, request, queryset):
+        self._accion_en_bloque(
+            request, queryset.filter(estado__in=['PROGRAMADA', 'CONFIRMADA']),
+            '{total} citas canceladas.', estado='CANCELADA',
+        )
+
+    @admin.action(description='Marcar como no asistió')
+    def marcar_no_asistio(self, request, queryset):
+        self._accion_en_bloque(
+            request, queryset.filter(estado__in=['PROGRAMADA', 'CONFIRMADA']),
+            '{total} citas marcadas como no asistió.', estado='NO_ASISTIO',
+        )
+
+
+@admin.register(RegistroAuditoria)
+class RegistroAuditoriaAdmin(AdminBase):
+    """
+    Consulta de la bitácora de auditoría; no se puede crear, editar ni borrar.
+    """
+    list_display = ['fecha', 'recurso', 'objeto_id', 'accion', 'usuario']
+    list_filter = ['recurso', 'accion']
+    search_fields = ['=objeto_id', '=usuario']
+    date_hierarchy = 'fecha'
+    ordering = ['-fecha']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,223 @@
+"""
+Agenda diaria de cada médico: citas y consultas del día, con un resumen
+del paciente embebido, armadas con dos consultas SQL (una por modelo).
+
+Cada día (sede, médico, día) tiene en la cache un número de versión que se
+incrementa al confirmar un cambio en una cita o consulta de ese médico en
+ese día, o en los datos de un paciente que aparece en él (ver signals.py).
+La agenda se guarda bajo una clave que incluye la versión: una lectura que
+empezó antes del cambio guarda su resultado bajo la versión anterior, que
+ya nadie lee, en vez de dejar la agenda vieja en la clave vigente. La vista
+semanal reutiliza las entradas diarias con get_many/set_many.
+
+Solo se cachean los días de la ventana de AGENDA_CACHE_DIAS_ATRAS a
+AGENDA_CACHE_DIAS_ADELANTE en torno a hoy; los demás se arman en cada
+lectura. Así, al modificar un paciente basta con invalidar sus días dentro
+de la ventana, sin recorrer todo su historial.
+"""
+from datetime import datetime, time, timedelta
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cita, ConsultaMedica
+from .sedes import alias_actual
+
+# Campo de fecha y hora de cada modelo que aparece en la agenda
+CAMPO_FECHA = {
+    Cita: 'fecha_hora',
+    ConsultaMedica: 'fecha_consulta',
+}
+
+# Datos del paciente incluidos en cada entrada
+CAMPOS_PACIENTE = ['id', 'nombre', 'apellido', 'rut', 'telefono', 'fecha_nacimiento']
+
+
+def clave_version(medico_id, dia, alias=None):
+    # Los ids se repiten entre sedes: la clave incluye la base de datos
+    return f'agenda:version:{alias or alias_actual()}:{medico_id}:{dia.isoformat()}'
+
+
+def clave_dia(medico_id, dia, version, alias=None):
+    return f'agenda:{alias or alias_actual()}:{medico_id}:{dia.isoformat()}:{version}'
+
+
+def dia_local(fecha_hora):
+    """
+    Día (en la zona horaria de la clínica) al que pertenece una fecha y hora.
+    """
+    return timezone.localtime(fecha_hora).date()
+
+
+def _limites(dia):
+    """
+    Inicio y fin (excluido) del día en la zona horaria local.
+    """
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+
+
+def _resumen_paciente(paciente):
+    resumen = {campo: getattr(paciente, campo) for campo in CAMPOS_PACIENTE}
+    resumen['fecha_nacimiento'] = paciente.fecha_nacimiento.isoformat()
+    return resumen
+
+
+def construir_dia(medico_id, dia):
+    """
+    Arma las entradas de la agenda de un día, ordenadas por hora.
+    Usa el índice (medico, fecha) de cada modelo y trae el paciente en la
+    misma consulta con select_related.
+    """
+    inicio, fin = _limites(dia)
+    campos_paciente = [f'paciente__{campo}' for campo in CAMPOS_PACIENTE]
+    citas = (
+        Cita.objects
+        .filter(medico_id=medico_id, fecha_hora__gte=inicio, fecha_hora__lt=fin)
+        .select_related('paciente')
+        .only('fecha_hora', 'duracion_minutos', 'tipo_cita', 'estado', 'motivo', *campos_paciente)
+    )
+    consultas = (
+        ConsultaMedica.objects
+        .filter(medico_id=medico_id, fecha_consulta__gte=inicio, fecha_consulta__lt=fin)
+        .select_related('paciente')
+        .only('fecha_consulta', 'estado', 'motivo', *campos_paciente)
+    )
+
+    entradas = [
+        {
+            'tipo': 'cita',
+            'id': cita.pk,
+            'inicio': timezone.localtime(cita.fecha_hora),
+            'fin': timezone.localtime(cita.fecha_hora + timedelta(minutes=cita.duracion_minutos)).isoformat(),
+            'tipo_cita': cita.tipo_cita,
+            'estado': cita.estado,
+            'motivo': cita.motivo,
+            'paciente': _resumen_paciente(cita.paciente),
+        }
+        for cita in citas
+    ]
+    entradas += [
+        {
+            'tipo': 'consulta',
+            'id': consulta.pk,
+            'inicio': timezone.localtime(consulta.fecha_consulta),
+            'fin': None,
+            'tipo_cita': None,
+            'estado': consulta.estado,
+            'motivo': consulta.motivo,
+            'paciente': _resumen_paciente(consulta.paciente),
+        }
+        for consulta in consultas
+    ]
+    entradas.sort(key=lambda entrada: (entrada['inicio'], entrada['tipo'], entrada['id']))
+    for entrada in entradas:
+        entrada['inicio'] = entrada['inicio'].isoformat()
+    return entradas
+
+
+def ventana_cache():
+    """
+    Primer y último día (incluidos) cuya agenda se guarda en la cache.
+    """
+    hoy = timezone.localdate()
+    return (
+        hoy - timedelta(days=getattr(settings, 'AGENDA_CACHE_DIAS_ATRAS', 7)),
+        hoy + timedelta(days=getattr(settings, 'AGENDA_CACHE_DIAS_ADELANTE', 90)),
+    )
+
+
+def _duracion_cache():
+    return getattr(settings, 'AGENDA_CACHE_SEGUNDOS', 86400)
+
+
+def _nueva_version():
+    # Distinta de cualquier versión anterior aunque la clave haya expirado
+    return time_ns()
+
+
+def versiones(medico_id, dias):
+    """
+    Versión vigente de cada día; los días sin versión reciben una nueva.
+    """
+    claves = {clave_version(medico_id, dia): dia for dia in dias}
+    actuales = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in actuales]
+    for clave in faltantes:
+        cache.add(clave, _nueva_version(), _duracion_cache())
+    if faltantes:
+        actuales.update(cache.get_many(faltantes))
+    # Si la cache no guardó la versión, una nueva evita reutilizar una entrada anterior
+    return {dia: actuales.get(clave) or _nueva_version() for clave, dia in claves.items()}
+
+
+def agenda_dias(medico_id, dias):
+    """
+    Devuelve {día: entradas} para los días pedidos. Los días que ya están en la
+    cache se leen en una sola operación y solo se arman los que faltan; los
+    que quedan fuera de ventana_cache() se arman sin pasar por la cache.
+    """
+    desde, hasta = ventana_cache()
+    cacheables = [dia for dia in dias if desde <= dia <= hasta]
+    claves = {clave_dia(medico_id, dia, version): dia for dia, version in versiones(medico_id, cacheables).items()}
+    en_cache = cache.get_many(claves)
+    faltantes = {
+        clave: construir_dia(medico_id, dia)
+        for clave, dia in claves.items() if clave not in en_cache
+    }
+    if faltantes:
+        cache.set_many(faltantes, _duracion_cache())
+    resultado = {dia: en_cache.get(clave, faltantes.get(clave)) for clave, dia in claves.items()}
+    return {dia: resultado[dia] if dia in resultado else construir_dia(medico_id, dia) for dia in dias}
+
+
+def agenda_dia(medico_id, dia):
+    return agenda_dias(medico_id, [dia])[dia]
+
+
+def agenda_semana(medico_id, dia):
+    """
+    Agenda de lunes a domingo de la semana que contiene el día.
+    """
+    lunes = dia - timedelta(days=dia.weekday())
+    return agenda_dias(medico_id, [lunes + timedelta(days=n) for n in range(7)])
+
+
+def _incrementar(claves):
+    for clave in claves:
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, _nueva_version(), _duracion_cache())
+
+
+def invalidar(dias_por_medico, alias):
+    """
+    Incrementa la versión de los días (medico_id, día) indicados al
+    confirmar la transacción.
+    """
+    claves = [clave_version(medico_id, dia, alias) for medico_id, dia in dias_por_medico]
+    if claves:
+        transaction.on_commit(lambda: _incrementar(claves), using=alias)
+
+
+def invalidar_paciente(paciente_id, alias):
+    """
+    Invalida los días de la ventana cacheada en que aparece el paciente, ya
+    que su resumen está embebido en las entradas.
+    """
+    desde, hasta = ventana_cache()
+    inicio, fin = _limites(desde)[0], _limites(hasta)[1]
+    dias = set()
+    for modelo, campo in CAMPO_FECHA.items():
+        filas = (
+            modelo.objects.using(alias)
+            .filter(paciente_id=paciente_id, **{f'{campo}__gte': inicio, f'{campo}__lt': fin})
+            .values_list('medico_id', campo)
+        )
+        for medico_id, fecha in filas:
+            dias.add((medico_id, dia_local(fecha)))
+    invalidar(dias, alias)
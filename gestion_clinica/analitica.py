@@ -0,0 +1,258 @@
+"""
+Analítica de ocupación de los médicos y de asistencia a las citas.
+
+Para un período se calculan:
+- la ocupación de cada médico por hora de la semana (7 x 24): minutos
+  reservados sobre los minutos que esa hora ocurre en el período;
+- por especialidad, las tasas de cancelación e inasistencia;
+- por especialidad, la distribución de la anticipación con que se agendan
+  las citas (días entre la creación y la hora de la cita).
+
+Las columnas se cargan en bloque, con el día, la hora y el minuto locales
+calculados por la base de datos, y todo el cálculo es vectorizado con NumPy
+(np.bincount y arreglos de diferencias), sin bucles de Python sobre las
+citas. Los resultados se cachean por sede y período, sin depender de las
+escrituras de citas (que en horario de atención llegan a cada momento):
+- un período cerrado (hasta antes de hoy) dura ANALITICA_CACHE_SEGUNDOS;
+- uno que incluye hoy, solo ANALITICA_CACHE_ABIERTO_SEGUNDOS, de modo que
+  las reservas del día aparecen con ese retraso máximo.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute
+from django.utils import timezone
+
+from .models import Cita, Especialidad, Medico
+from .sedes import alias_actual
+
+HORAS_SEMANA = 7 * 24
+
+# Estados en que la cita ocupa la agenda del médico (la cancelada la libera)
+ESTADOS_OCUPADOS = ['PROGRAMADA', 'CONFIRMADA', 'REALIZADA', 'NO_ASISTIO']
+
+# Límites, en días, de los tramos del histograma de anticipación; el último es abierto
+TRAMOS_ANTICIPACION = [0, 1, 3, 7, 14, 30]
+
+
+def _cargar_citas(inicio, fin):
+    """
+    Carga en bloque las citas entre inicio y fin. Devuelve arreglos: médico,
+    especialidad, minuto de la semana local en que empieza (0 = lunes 00:00),
+    duración en minutos, estado y anticipación en días.
+    """
+    filas = list(
+        Cita.objects
+        .filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+        .annotate(
+            dia=ExtractIsoWeekDay('fecha_hora'),
+            hora=ExtractHour('fecha_hora'),
+            minuto=ExtractMinute('fecha_hora'),
+            anticipacion=ExpressionWrapper(F('fecha_hora') - F('created_at'), output_field=DurationField()),
+        )
+        .values_list(
+            'medico_id', 'medico__especialidad_id', 'dia', 'hora', 'minuto', 'duracion_minutos', 'estado',
+            'anticipacion',
+        )
+    )
+    if not filas:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio, vacio, vacio, np.zeros(0, dtype=str), np.zeros(0)
+
+    medicos, especialidades, dias, horas, minutos, duraciones, estados, anticipaciones = zip(*filas)
+    comienzo = ((np.array(dias, dtype=np.int64) - 1) * 24 + np.array(horas, dtype=np.int64)) * 60
+    anticipacion = np.array(anticipaciones, dtype='timedelta64[s]').astype(np.float64) / 86400
+    return (
+        np.array(medicos, dtype=np.int64),
+        np.array(especialidades, dtype=np.int64),
+        comienzo + np.array(minutos, dtype=np.int64),
+        np.array(duraciones, dtype=np.int64),
+        np.array(estados),
+        anticipacion,
+    )
+
+
+def _indices(ids, valores):
+    """
+    Posición de cada valor en `ids` (ordenado); -1 si no está.
+    """
+    if not len(ids):
+        return np.full(len(valores), -1, dtype=np.int64)
+    posicion = np.searchsorted(ids, valores)
+    acotada = np.minimum(posicion, len(ids) - 1)
+    return np.where(ids[acotada] == valores, acotada, -1)
+
+
+def grilla_ocupacion(fila, comienzo, duracion, n):
+    """
+    Minutos reservados de cada médico en cada hora de la semana (n x 168).
+
+    Una cita de s a e minutos aporta a su primera hora los minutos hasta el
+    cambio de hora, 60 a cada hora intermedia y el resto a la última. Las
+    horas intermedias se suman con un arreglo de diferencias (+1 / -1 y
+    cumsum) y np.bincount agrega todas las citas sobre la matriz (médico x
+    hora) aplanada. Lo que pasa del domingo a medianoche vuelve al lunes.
+    """
+    ancho = 2 * HORAS_SEMANA + 1
+    final = comienzo + np.clip(duracion, 0, HORAS_SEMANA * 60)
+    primera, resto_inicio = np.divmod(comienzo, 60)
+    ultima, resto_final = np.divmod(final, 60)
+    misma = primera == ultima
+    base = fila * ancho
+
+    minutos = np.bincount(
+        base + primera, weights=np.where(misma, final - comienzo, 60 - resto_inicio), minlength=n * ancho,
+    )
+    minutos += np.bincount(base[~misma] + ultima[~misma], weights=resto_final[~misma], minlength=n * ancho)
+    intermedias = ~misma & (ultima > primera + 1)
+    diferencias = (
+        np.bincount(base[intermedias] + primera[intermedias] + 1, minlength=n * ancho)
+        - np.bincount(base[intermedias] + ultima[intermedias], minlength=n * ancho)
+    )
+    minutos = minutos.reshape(n, ancho) + 60 * np.cumsum(diferencias.reshape(n, ancho), axis=1)
+    return minutos[:, :HORAS_SEMANA] + minutos[:, HORAS_SEMANA:2 * HORAS_SEMANA]
+
+
+def horas_disponibles(desde, hasta):
+    """
+    Cuántas veces ocurre cada hora de la semana entre desde y hasta (inclusive).
+    """
+    dias = np.arange(np.datetime64(desde, 'D'), np.datetime64(hasta, 'D') + 1)
+    # El 1970-01-01 fue jueves: (días desde la época + 3) % 7 da 0 para el lunes
+    dia_semana = (dias.astype(np.int64) + 3) % 7
+    return np.repeat(np.bincount(dia_semana, minlength=7), 24)
+
+
+def tasas_por_grupo(grupo, estado, m):
+    """
+    Cantidad de citas por grupo y estado, y tasas de cancelación e
+    inasistencia. La inasistencia se mide sobre las citas ya resueltas
+    (realizadas o no asistidas).
+    """
+    conteo = {
+        nombre: np.bincount(grupo[estado == nombre], minlength=m)
+        for nombre in ('CANCELADA', 'REALIZADA', 'NO_ASISTIO')
+    }
+    total = np.bincount(grupo, minlength=m)
+    resueltas = conteo['REALIZADA'] + conteo['NO_ASISTIO']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cancelacion = np.where(total > 0, conteo['CANCELADA'] / total, np.nan)
+        inasistencia = np.where(resueltas > 0, conteo['NO_ASISTIO'] / resueltas, np.nan)
+    return total, conteo, cancelacion, inasistencia
+
+
+def distribucion_anticipacion(grupo, dias, m):
+    """
+    Histograma por tramos (m x tramos) y percentiles 50 y 90 de la
+    anticipación por grupo. Los percentiles se toman sobre los tramos
+    contiguos del arreglo ordenado por (grupo, anticipación).
+    """
+    dias = np.maximum(dias, 0)
+    tramo = np.digitize(dias, TRAMOS_ANTICIPACION[1:])
+    n_tramos = len(TRAMOS_ANTICIPACION)
+    histograma = np.bincount(grupo * n_tramos + tramo, minlength=m * n_tramos).reshape(m, n_tramos)
+
+    orden = np.lexsort((dias, grupo))
+    ordenados, grupos = dias[orden], grupo[orden]
+    limites = np.searchsorted(grupos, np.arange(m + 1))
+    percentiles = np.full((m, 2), np.nan)
+    for g in range(m):
+        if limites[g + 1] > limites[g]:
+            percentiles[g] = np.percentile(ordenados[limites[g]:limites[g + 1]], [50, 90])
+    return histograma, percentiles
+
+
+def _redondear(valor, decimales=3):
+    return None if np.isnan(valor) else round(float(valor), decimales)
+
+
+def _nombres_tramos():
+    limites = TRAMOS_ANTICIPACION
+    return [f'{a}-{b}' for a, b in zip(limites, limites[1:])] + [f'{limites[-1]}+']
+
+
+def calcular(desde, hasta):
+    """
+    Calcula la analítica de las citas entre las fechas locales desde y hasta (inclusive).
+    """
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    medico, especialidad, comienzo, duracion, estado, anticipacion = _cargar_citas(inicio, fin)
+
+    medicos = list(Medico.objects.order_by('pk').values_list('pk', 'nombre', 'apellido', 'especialidad_id'))
+    especialidades = list(Especialidad.objects.order_by('pk').values_list('pk', 'nombre'))
+    ids_medicos = np.array([m[0] for m in medicos], dtype=np.int64)
+    ids_especialidades = np.array([e[0] for e in especialidades], dtype=np.int64)
+
+    # Ocupación por médico y hora de la semana
+    fila = _indices(ids_medicos, medico)
+    ocupa = (fila >= 0) & np.isin(estado, ESTADOS_OCUPADOS)
+    minutos = grilla_ocupacion(fila[ocupa], comienzo[ocupa], duracion[ocupa], len(medicos))
+    disponibles = horas_disponibles(desde, hasta) * 60
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ocupacion = np.where(disponibles > 0, minutos / disponibles, 0.0)
+        media = minutos.sum(axis=1) / disponibles.sum()
+
+    # Tasas y anticipación por especialidad
+    grupo = _indices(ids_especialidades, especialidad)
+    validas = grupo >= 0
+    m = len(especialidades)
+    total, conteo, cancelacion, inasistencia = tasas_por_grupo(grupo[validas], estado[validas], m)
+    histograma, percentiles = distribucion_anticipacion(grupo[validas], anticipacion[validas], m)
+    tramos = _nombres_tramos()
+
+    return {
+        'calculado': timezone.now().isoformat(),
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'medicos': [
+            {
+                'medico': pk,
+                'nombre': f'{nombre} {apellido}',
+                'especialidad': especialidad_id,
+                'minutos_reservados': int(minutos[i].sum()),
+                'ocupacion_media': round(float(media[i]), 3),
+                # 7 filas (lunes a domingo) x 24 horas
+                'ocupacion': np.round(ocupacion[i], 3).reshape(7, 24).tolist(),
+            }
+            for i, (pk, nombre, apellido, especialidad_id) in enumerate(medicos)
+        ],
+        'especialidades': [
+            {
+                'especialidad': pk,
+                'nombre': nombre,
+                'citas': int(total[g]),
+                'canceladas': int(conteo['CANCELADA'][g]),
+                'realizadas': int(conteo['REALIZADA'][g]),
+                'no_asistio': int(conteo['NO_ASISTIO'][g]),
+                'tasa_cancelacion': _redondear(cancelacion[g]),
+                'tasa_inasistencia': _redondear(inasistencia[g]),
+                'anticipacion_dias': {
+                    'mediana': _redondear(percentiles[g, 0], 1),
+                    'p90': _redondear(percentiles[g, 1], 1),
+                    'tramos': dict(zip(tramos, histograma[g].tolist())),
+                },
+            }
+            for g, (pk, nombre) in enumerate(especialidades)
+        ],
+    }
+
+
+def obtener_analitica(desde, hasta):
+    """
+    Devuelve la analítica del período en la sede actual desde la cache,
+    recalculándola si expiró.
+    """
+    clave = f'analitica:{alias_actual()}:{desde.isoformat()}:{hasta.isoformat()}'
+    analitica = cache.get(clave)
+    if analitica is None:
+        analitica = calcular(desde, hasta)
+        if hasta < timezone.localdate():
+            duracion = getattr(settings, 'ANALITICA_CACHE_SEGUNDOS', 900)
+        else:
+            duracion = getattr(settings, 'ANALITICA_CACHE_ABIERTO_SEGUNDOS', 60)
+        cache.set(clave, analitica, duracion)
+    return analitica
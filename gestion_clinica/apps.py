@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class GestionClinicaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_clinica'
+
+    def ready(self):
+        # Registro de las tareas disponibles para la cola de trabajos
+        from . import tareas  # noqa: F401
+        # Conexión de los receptores de señales
+        from . import signals  # noqa: F401
+        # Revisiones de rendimiento de la configuración (check --deploy)
+        from . import checks  # noqa: F401
+        # Índices FTS5 para la búsqueda de texto completo en SQLite
+        from .busqueda import preparar_sqlite
+        post_migrate.connect(preparar_sqlite, sender=self)
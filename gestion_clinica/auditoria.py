@@ -0,0 +1,333 @@
+"""
+Bitácora de auditoría de los datos clínicos: quién cambió qué y cuándo.
+
+Se registran, campo a campo, los cambios de los campos listados en
+CAMPOS_AUDITADOS de cada modelo (los datos del paciente, el diagnóstico de la
+consulta y la receta) en RegistroAuditoria, una tabla que solo admite
+inserciones. Cada entrada guarda {campo: [antes, después]}.
+
+Para no duplicar la latencia de las escrituras:
+- los valores anteriores se toman al cargar la instancia (post_init), sin
+  volver a leer la fila al guardarla;
+- las entradas no se insertan al guardar: se acumulan por transacción y se
+  escriben con un solo INSERT masivo al confirmarla (transaction.on_commit).
+  Si la transacción o el savepoint se revierten, sus entradas se descartan
+  junto con ellos;
+- en una petición web, lo confirmado (y lo escrito fuera de una transacción,
+  como los form.save() en autocommit) se junta hasta el final de la
+  petición (AuditoriaMiddleware): un INSERT por petición y base de datos.
+  Fuera de una petición, lo escrito sin transacción se inserta de inmediato.
+
+Limitación: el INSERT de la bitácora va después del COMMIT (al terminar la
+petición) y no dentro de la misma transacción. Si el proceso muere entre
+ambos, el cambio queda confirmado sin su entrada.
+
+El usuario de cada entrada es el de la petición (AuditoriaMiddleware) o el
+indicado con auditando(), como hacen las tareas en segundo plano.
+
+QuerySet.update, bulk_update y bulk_create no envían señales; los cubre
+AuditadoQuerySet, el manager de los modelos auditados. Los borrados, incluidos
+los en cascada, pasan por post_delete. La bitácora misma usa
+InmutableQuerySet, que rechaza los UPDATE y DELETE masivos aunque la base no
+tenga el trigger de PostgreSQL.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+CREAR, MODIFICAR, ELIMINAR = 'CREAR', 'MODIFICAR', 'ELIMINAR'
+
+# Filas por INSERT y claves por lectura en los caminos masivos
+TAMANO_LOTE = 1000
+
+_usuario = contextvars.ContextVar('auditoria_usuario', default=None)
+_pendientes = contextvars.ContextVar('auditoria_pendientes', default=None)
+
+
+class RegistroInmutable(Exception):
+    """
+    Se intentó modificar o eliminar una entrada de la bitácora.
+    """
+
+
+def campos_auditados(modelo):
+    """
+    Nombres de columna (attname) de los campos auditados del modelo.
+    """
+    return [modelo._meta.get_field(campo).attname for campo in getattr(modelo, 'CAMPOS_AUDITADOS', ())]
+
+
+def _datos_usuario():
+    # request.user es perezoso: se resuelve solo si la petición escribe algo auditado
+    usuario = _usuario.get()
+    if usuario is None or not usuario.is_authenticated:
+        return None, ''
+    return usuario.pk, usuario.get_username()
+
+
+def _entrada(modelo, objeto_id, accion, cambios):
+    from .models import RegistroAuditoria
+
+    usuario_id, usuario = _datos_usuario()
+    return RegistroAuditoria(
+        recurso=modelo._meta.model_name,
+        objeto_id=objeto_id,
+        accion=accion,
+        cambios=cambios,
+        usuario_id=usuario_id,
+        usuario=usuario,
+        fecha=timezone.now(),
+    )
+
+
+def _insertar(alias, entradas):
+    from .models import RegistroAuditoria
+
+    if entradas:
+        RegistroAuditoria.objects.using(alias).bulk_create(entradas, batch_size=TAMANO_LOTE)
+
+
+def _guardar(alias, entradas):
+    """
+    Escribe entradas ya confirmadas, o las deja para el final de la petición.
+    """
+    pendientes = _pendientes.get()
+    if pendientes is None:
+        _insertar(alias, entradas)
+    else:
+        pendientes.setdefault(alias, []).extend(entradas)
+
+
+class _Lote:
+    """
+    Entradas de una transacción (o de un savepoint) en una base de datos.
+    Se registra como callback on_commit: Django lo descarta si se revierte.
+    """
+    def __init__(self, alias):
+        self.alias = alias
+        self.entradas = []
+
+    def __call__(self):
+        _guardar(self.alias, self.entradas)
+
+
+def encolar(alias, entradas):
+    """
+    Agrega entradas al lote de la transacción en curso; sin transacción
+    quedan confirmadas y van al lote de la petición (o se insertan).
+    """
+    if not entradas:
+        return
+    conexion = connections[alias]
+    if not conexion.in_atomic_block:
+        _guardar(alias, entradas)
+        return
+    # Un lote por nivel de savepoint, buscado entre los on_commit pendientes:
+    # así un savepoint revertido se lleva sus entradas y no las de los demás
+    puntos = set(conexion.savepoint_ids)
+    for registrados, funcion, _ in reversed(conexion.run_on_commit):
+        if isinstance(funcion, _Lote) and registrados == puntos:
+            funcion.entradas.extend(entradas)
+            return
+    lote = _Lote(alias)
+    lote.entradas.extend(entradas)
+    transaction.on_commit(lote, using=alias)
+
+
+@contextmanager
+def auditando(usuario=None):
+    """
+    Atribuye al usuario los cambios del bloque.
+    """
+    token = _usuario.set(usuario)
+    try:
+        yield
+    finally:
+        _usuario.reset(token)
+
+
+@contextmanager
+def juntando():
+    """
+    Junta las entradas confirmadas dentro del bloque y las escribe al
+    salir, con un INSERT por base de datos.
+    """
+    token = _pendientes.set({})
+    try:
+        yield
+    finally:
+        pendientes = _pendientes.get()
+        _pendientes.reset(token)
+        for alias, entradas in pendientes.items():
+            _insertar(alias, entradas)
+
+
+class AuditoriaMiddleware:
+    """
+    Audita cada petición a nombre de request.user y escribe sus entradas
+    al terminarla (va después de AuthenticationMiddleware).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with auditando(getattr(request, 'user', None)), juntando():
+            return self.get_response(request)
+
+
+# Receptores de señales (se conectan en signals.py)
+
+def capturar_originales(sender, instance, **kwargs):
+    """
+    post_init: recuerda los valores cargados. Los campos diferidos quedan
+    fuera y se leen al guardar solo si hacen falta.
+    """
+    datos = instance.__dict__
+    instance._auditoria_original = {campo: datos[campo] for campo in campos_auditados(sender) if campo in datos}
+
+
+def _guardados(sender, update_fields):
+    campos = campos_auditados(sender)
+    if update_fields is None:
+        return campos
+    return [campo for campo in campos if sender._meta.get_field(campo).name in update_fields or campo in update_fields]
+
+
+def completar_originales(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """
+    pre_save: lee de la base los valores anteriores que no se cargaron.
+    """
+    if raw or instance.pk is None:
+        return
+    if instance._state.adding:
+        # Instancia armada con su pk: lo anterior, si existe, está en la base
+        instance._auditoria_original = {}
+    original = instance._auditoria_original
+    faltan = [campo for campo in _guardados(sender, update_fields) if campo not in original]
+    if faltan:
+        fila = sender._base_manager.using(using).filter(pk=instance.pk).values(*faltan).first()
+        original.update(fila or {})
+
+
+def registrar_guardado(sender, instance, created, raw=False, using=None, update_fields=None, **kwargs):
+    """
+    post_save: encola la creación o los campos que cambiaron.
+    """
+    if raw:
+        return
+    datos = instance.__dict__
+    actual = {campo: datos[campo] for campo in _guardados(sender, update_fields) if campo in datos}
+    original = instance._auditoria_original
+    if created:
+        cambios = {campo: [None, valor] for campo, valor in actual.items()}
+    else:
+        cambios = {
+            campo: [original[campo], valor]
+            for campo, valor in actual.items()
+            if campo in original and original[campo] != valor
+        }
+    original.update(actual)
+    if created or cambios:
+        encolar(using, [_entrada(sender, instance.pk, CREAR if created else MODIFICAR, cambios)])
+
+
+def registrar_eliminacion(sender, instance, using=None, **kwargs):
+    """
+    post_delete: encola la eliminación con los últimos valores del registro.
+    """
+    datos = instance.__dict__
+    cambios = {campo: [datos[campo], None] for campo in campos_auditados(sender) if campo in datos}
+    encolar(using, [_entrada(sender, instance.pk, ELIMINAR, cambios)])
+
+
+class AuditadoQuerySet(models.QuerySet):
+    """
+    QuerySet de los modelos auditados: registra también los cambios de los
+    caminos masivos, leyendo antes y después solo los campos auditados que
+    se modifican. bulk_update no se redefine: Django lo ejecuta como un
+    update() por lote sobre este mismo QuerySet.
+    """
+    def _auditados(self, nombres):
+        return [
+            campo for campo in campos_auditados(self.model)
+            if campo in nombres or self.model._meta.get_field(campo).name in nombres
+        ]
+
+    def _valores(self, pks, campos):
+        base = self.model._base_manager.using(self.db)
+        pks = list(pks)
+        valores = {}
+        for inicio in range(0, len(pks), TAMANO_LOTE):
+            for pk, *fila in base.filter(pk__in=pks[inicio:inicio + TAMANO_LOTE]).values_list('pk', *campos):
+                valores[pk] = fila
+        return valores
+
+    def _diferencias(self, campos, antes, despues):
+        entradas = []
+        for pk, valores in despues.items():
+            cambios = {
+                campo: [anterior, nuevo]
+                for campo, anterior, nuevo in zip(campos, antes.get(pk, ()), valores)
+                if anterior != nuevo
+            }
+            if cambios:
+                entradas.append(_entrada(self.model, pk, MODIFICAR, cambios))
+        return entradas
+
+    def update(self, **kwargs):
+        campos = self._auditados(kwargs)
+        if not campos:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            antes = {pk: list(fila) for pk, *fila in self.values_list('pk', *campos)}
+            total = super().update(**kwargs)
+            # Se relee por pk: el filtro original puede no coincidir tras el UPDATE
+            encolar(self.db, self._diferencias(campos, antes, self._valores(antes, campos)))
+        return total
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        campos = campos_auditados(self.model)
+        encolar(self.db, [
+            _entrada(self.model, obj.pk, CREAR, {campo: [None, getattr(obj, campo)] for campo in campos})
+            for obj in objs
+            if obj.pk is not None
+        ])
+        return objs
+
+    bulk_create.alters_data = True
+
+
+class InmutableQuerySet(models.QuerySet):
+    """
+    QuerySet de la bitácora: solo admite lecturas e inserciones.
+    """
+    def delete(self):
+        raise RegistroInmutable("La bitácora de auditoría no admite eliminaciones.")
+
+    delete.alters_data = True
+
+    def update(self, **kwargs):
+        raise RegistroInmutable("La bitácora de auditoría no admite modificaciones.")
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        raise RegistroInmutable("La bitácora de auditoría no admite modificaciones.")
+
+    bulk_update.alters_data = True
+
+
+def historial(modelo, objeto_id):
+    """
+    Entradas de la bitácora de un registro, de la más reciente a la más antigua.
+    """
+    from .models import RegistroAuditoria
+
+    return RegistroAuditoria.objects.filter(
+        recurso=modelo._meta.model_name, objeto_id=objeto_id,
+    ).order_by('-fecha', '-id')
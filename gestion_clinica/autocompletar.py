@@ -0,0 +1,142 @@
+"""
+Búsquedas remotas para los campos de selección de los formularios HTML.
+En lugar de renderizar toda la tabla como <option>, los formularios usan
+AutocompletarSelect, que solo dibuja el valor seleccionado y consulta
+los endpoints paginados de /api/autocompletar/<recurso>/ mientras se escribe.
+"""
+from django import forms
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ConsultaMedica, Medicamento, Medico, Paciente, Tratamiento
+from .normalizacion import normalizar
+
+# Cantidad de resultados por página en las búsquedas
+TAMANO_PAGINA = 20
+
+
+class Busqueda:
+    """
+    Describe cómo buscar un recurso: queryset base, campos de búsqueda
+    (todos por prefijo, para aprovechar los índices), orden y etiqueta.
+    Con normalizado=True los términos se comparan sin tildes ni mayúsculas
+    contra columnas *_normalizado.
+    """
+    def __init__(self, queryset, campos, orden, etiqueta, normalizado=False):
+        self.queryset = queryset
+        self.campos = campos
+        self.orden = orden
+        self.etiqueta = etiqueta
+        self.normalizado = normalizado
+
+    def filtrar(self, texto):
+        """
+        Cada palabra del texto debe coincidir por prefijo con alguno de los campos.
+        """
+        queryset = self.queryset.all()
+        if self.normalizado:
+            texto = normalizar(texto)
+        for termino in texto.split():
+            condicion = Q()
+            for campo in self.campos:
+                condicion |= Q(**{campo: termino})
+            queryset = queryset.filter(condicion)
+        return queryset.order_by(*self.orden)
+
+    def pagina(self, texto, numero):
+        """
+        Devuelve una página de resultados como (lista de {id, texto}, hay_mas).
+        Se pide un elemento extra para saber si existe otra página sin hacer COUNT(*).
+        """
+        inicio = (numero - 1) * TAMANO_PAGINA
+        objetos = list(self.filtrar(texto)[inicio:inicio + TAMANO_PAGINA + 1])
+        resultados = [{'id': obj.pk, 'texto': self.etiqueta(obj)} for obj in objetos[:TAMANO_PAGINA]]
+        return resultados, len(objetos) > TAMANO_PAGINA
+
+
+def _etiqueta_paciente(paciente):
+    return f"{paciente.nombre} {paciente.apellido} ({paciente.rut})"
+
+
+def _etiqueta_consulta(consulta):
+    return (
+        f"{timezone.localtime(consulta.fecha_consulta):%d/%m/%Y %H:%M} - {consulta.paciente.nombre} "
+        f"{consulta.paciente.apellido} con Dr. {consulta.medico.apellido}"
+    )
+
+
+def _etiqueta_tratamiento(tratamiento):
+    paciente = tratamiento.consulta.paciente
+    return f"#{tratamiento.pk} {tratamiento.descripcion[:40]} - {paciente.nombre} {paciente.apellido}"
+
+
+BUSQUEDAS = {
+    'pacientes': Busqueda(
+        queryset=Paciente.objects.only('id', 'nombre', 'apellido', 'rut'),
+        campos=['rut__startswith', 'apellido__istartswith', 'nombre__istartswith'],
+        orden=['apellido', 'nombre', 'id'],
+        etiqueta=_etiqueta_paciente,
+    ),
+    'medicos': Busqueda(
+        queryset=Medico.objects.only('id', 'nombre', 'apellido'),
+        campos=['rut__startswith', 'apellido__istartswith', 'nombre__istartswith'],
+        orden=['apellido', 'nombre', 'id'],
+        etiqueta=str,
+    ),
+    'consultas': Busqueda(
+        queryset=ConsultaMedica.objects.select_related('paciente', 'medico').only(
+            'id', 'fecha_consulta', 'paciente__nombre', 'paciente__apellido', 'medico__apellido',
+        ),
+        campos=['paciente__rut__startswith', 'paciente__apellido__istartswith', 'paciente__nombre__istartswith'],
+        orden=['-fecha_consulta', '-id'],
+        etiqueta=_etiqueta_consulta,
+    ),
+    'tratamientos': Busqueda(
+        queryset=Tratamiento.objects.select_related('consulta__paciente').only(
+            'id', 'descripcion', 'consulta__paciente__nombre', 'consulta__paciente__apellido',
+        ),
+        campos=[
+            'consulta__paciente__rut__startswith',
+            'consulta__paciente__apellido__istartswith',
+            'consulta__paciente__nombre__istartswith',
+        ],
+        orden=['-id'],
+        etiqueta=_etiqueta_tratamiento,
+    ),
+    'medicamentos': Busqueda(
+        queryset=Medicamento.objects.only('id', 'nombre'),
+        campos=['nombre_normalizado__startswith'],
+        orden=['nombre_normalizado', 'id'],
+        etiqueta=str,
+        normalizado=True,
+    ),
+}
+
+
+class AutocompletarSelect(forms.Select):
+    """
+    Widget de selección con búsqueda remota.
+    Solo renderiza la opción actualmente seleccionada, de modo que el costo
+    de dibujar el formulario no depende del tamaño de la tabla.
+    """
+    def __init__(self, recurso, attrs=None):
+        super().__init__(attrs)
+        self.recurso = recurso
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocompletar-url'] = reverse('autocompletar', args=[self.recurso])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        """
+        Igual que Select.optgroups, pero consultando solo los ids seleccionados.
+        """
+        opciones = [self.create_option(name, '', '---------', False, 0)]
+        seleccionados = {str(v) for v in value if str(v).isdigit()}
+        if seleccionados:
+            busqueda = BUSQUEDAS[self.recurso]
+            for obj in busqueda.queryset.filter(pk__in=seleccionados):
+                opciones.append(self.create_option(name, obj.pk, busqueda.etiqueta(obj), True, len(opciones)))
+        return [(None, opciones, 0)]
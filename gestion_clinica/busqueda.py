@@ -0,0 +1,194 @@
+"""
+Búsqueda de texto completo sobre ConsultaMedica (motivo, diagnóstico)
+y Tratamiento (descripción).
+
+En PostgreSQL se usa una columna tsvector (`busqueda`) con índice GIN,
+mantenida por un trigger con la configuración `es_unaccent` (stemming en
+español y sin acentos). En SQLite, para desarrollo local, se usa una tabla
+virtual FTS5 con contenido externo y triggers; FTS5 no trae stemmer en
+español, por lo que cada palabra se busca por prefijo.
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, TextField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import ConsultaMedica, Tratamiento
+
+# Configuración de búsqueda de texto de PostgreSQL creada en la migración
+CONFIGURACION = 'es_unaccent'
+
+# Etiquetas para resaltar las coincidencias en los fragmentos
+INICIO_RESALTADO = '<mark>'
+FIN_RESALTADO = '</mark>'
+
+# Marcas que la base de datos pone alrededor de las coincidencias (caracteres
+# de uso privado): el texto se escapa antes de cambiarlas por las etiquetas
+MARCA_INICIO = '\ue000'
+MARCA_FIN = '\ue001'
+
+
+class IndiceTexto:
+    """
+    Describe un índice de texto completo: modelo, columnas indexadas (con su peso
+    en PostgreSQL) y nombre de la tabla FTS5 equivalente en SQLite.
+    """
+    def __init__(self, modelo, campos, tabla_fts, campo_fragmento):
+        self.modelo = modelo
+        self.campos = campos
+        self.tabla_fts = tabla_fts
+        self.campo_fragmento = campo_fragmento
+
+    @property
+    def tabla(self):
+        return self.modelo._meta.db_table
+
+
+INDICES = {
+    'consultas': IndiceTexto(
+        ConsultaMedica, [('motivo', 'A'), ('diagnostico', 'B')],
+        'gestion_clinica_consulta_fts', 'diagnostico',
+    ),
+    'tratamientos': IndiceTexto(
+        Tratamiento, [('descripcion', 'A')],
+        'gestion_clinica_tratamiento_fts', 'descripcion',
+    ),
+}
+
+INDICE_POR_MODELO = {indice.modelo: indice for indice in INDICES.values()}
+
+
+def _expresion_fts5(texto):
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura:
+    cada palabra entre comillas y por prefijo, todas obligatorias.
+    """
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def filtrar(queryset, texto):
+    """
+    Filtra el queryset por el texto y lo ordena por relevancia (anotación `rango`).
+    """
+    indice = INDICE_POR_MODELO[queryset.model]
+    texto = texto.strip()
+    if not texto:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        consulta = SearchQuery(texto, config=CONFIGURACION, search_type='websearch')
+        return (
+            queryset.filter(busqueda=consulta)
+            .annotate(rango=SearchRank(F('busqueda'), consulta))
+            .order_by('-rango', '-pk')
+        )
+
+    expresion = _expresion_fts5(texto)
+    if not expresion:
+        return queryset.none()
+    # bm25() devuelve valores negativos: más negativo es más relevante
+    rango = RawSQL(
+        f'SELECT -bm25({indice.tabla_fts}) FROM {indice.tabla_fts} '
+        f'WHERE {indice.tabla_fts} MATCH %s AND rowid = {indice.tabla}.id',
+        [expresion], output_field=FloatField(),
+    )
+    return (
+        queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {indice.tabla_fts} WHERE {indice.tabla_fts} MATCH %s', [expresion],
+        ))
+        .annotate(rango=rango)
+        .order_by('-rango', '-pk')
+    )
+
+
+def resaltar(queryset, texto):
+    """
+    Agrega la anotación `fragmento` con las coincidencias entre MARCA_INICIO
+    y MARCA_FIN, sin escapar; se convierte a HTML con fragmento_html().
+    Pensado para páginas pequeñas de resultados ya filtrados con filtrar().
+    """
+    indice = INDICE_POR_MODELO[queryset.model]
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.annotate(fragmento=SearchHeadline(
+            indice.campo_fragmento,
+            SearchQuery(texto, config=CONFIGURACION, search_type='websearch'),
+            config=CONFIGURACION, start_sel=MARCA_INICIO, stop_sel=MARCA_FIN,
+            max_fragments=2, max_words=20, min_words=5,
+        ))
+
+    columna = [campo for campo, _ in indice.campos].index(indice.campo_fragmento)
+    return queryset.annotate(fragmento=RawSQL(
+        f"SELECT snippet({indice.tabla_fts}, {columna}, %s, %s, '…', 16) FROM {indice.tabla_fts} "
+        f'WHERE {indice.tabla_fts} MATCH %s AND rowid = {indice.tabla}.id',
+        [MARCA_INICIO, MARCA_FIN, _expresion_fts5(texto)], output_field=TextField(),
+    ))
+
+
+def fragmento_html(fragmento):
+    """
+    HTML seguro del fragmento: el texto clínico se escapa y solo las
+    coincidencias quedan entre <mark> y </mark>.
+    """
+    if not fragmento:
+        return ''
+    texto = escape(fragmento)
+    partes = []
+    abierta = False
+    # Se reconstruye marca por marca para que las etiquetas siempre queden balanceadas
+    for trozo in re.split(f'([{MARCA_INICIO}{MARCA_FIN}])', texto):
+        if trozo == MARCA_INICIO and not abierta:
+            partes.append(INICIO_RESALTADO)
+            abierta = True
+        elif trozo == MARCA_FIN and abierta:
+            partes.append(FIN_RESALTADO)
+            abierta = False
+        elif trozo not in (MARCA_INICIO, MARCA_FIN):
+            partes.append(trozo)
+    if abierta:
+        partes.append(FIN_RESALTADO)
+    return ''.join(partes)
+
+
+def preparar_sqlite(using='default', **kwargs):
+    """
+    Crea (o repara) las tablas FTS5 y sus triggers en SQLite.
+    Se ejecuta en post_migrate porque SQLite reconstruye las tablas al alterarlas
+    y en ese proceso se pierden los triggers.
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for indice in INDICES.values():
+            columnas = [campo for campo, _ in indice.campos]
+            nuevas = ', '.join(f'new.{c}' for c in columnas)
+            viejas = ', '.join(f'old.{c}' for c in columnas)
+            lista = ', '.join(columnas)
+            fts = indice.tabla_fts
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{fts}_%'],
+            )
+            if cursor.fetchone()[0] == 3:
+                continue
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, '
+                f"content='{indice.tabla}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {indice.tabla} BEGIN '
+                f'INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevas}); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {indice.tabla} BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejas}); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {indice.tabla} BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejas}); "
+                f'INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevas}); END'
+            )
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
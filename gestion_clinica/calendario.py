@@ -0,0 +1,139 @@
+"""
+Feeds iCalendar (RFC 5545) con las citas de un médico o de una especialidad,
+para suscribirse desde las aplicaciones de calendario.
+
+Los clientes consultan el feed con frecuencia, por eso:
+- el contenido se genera en streaming sobre una ventana de fechas indexada
+  (índice (medico, fecha_hora) de Cita), sin armar el archivo en memoria;
+- el ETag se calcula con una sola consulta agregada (cantidad de citas y
+  última modificación en la ventana), de modo que el caso habitual "no hubo
+  cambios" responde 304 sin generar el feed.
+"""
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Cita
+from .sedes import alias_actual
+
+# Estado de la cita -> STATUS de iCalendar
+ESTADOS_ICAL = {
+    'PROGRAMADA': 'TENTATIVE',
+    'CONFIRMADA': 'CONFIRMED',
+    'REALIZADA': 'CONFIRMED',
+    'NO_ASISTIO': 'CONFIRMED',
+    'CANCELADA': 'CANCELLED',
+}
+
+TIPOS_CITA = dict(Cita.TIPO_CITA_CHOICES)
+
+
+def ventana():
+    """
+    Rango [desde, hasta) de fechas incluido en los feeds, relativo a hoy.
+    """
+    hoy = timezone.localdate()
+    desde = hoy - timedelta(days=getattr(settings, 'CALENDARIO_DIAS_ATRAS', 30))
+    hasta = hoy + timedelta(days=getattr(settings, 'CALENDARIO_DIAS_ADELANTE', 180))
+    return (
+        timezone.make_aware(datetime.combine(desde, time.min)),
+        timezone.make_aware(datetime.combine(hasta, time.min)),
+    )
+
+
+def citas_feed(alias=None, **filtro):
+    """
+    Citas de la ventana que cumplen el filtro (medico_id o medico__especialidad_id).
+    """
+    desde, hasta = ventana()
+    return Cita.objects.using(alias or alias_actual()).filter(fecha_hora__gte=desde, fecha_hora__lt=hasta, **filtro)
+
+
+def etag(**filtro):
+    """
+    ETag del feed: cambia si se agrega, modifica o elimina una cita de la
+    ventana, si cambia el paciente o el médico de alguna (el feed muestra
+    su nombre y correo), o si la ventana avanza de día.
+    """
+    resumen = citas_feed(**filtro).aggregate(
+        total=Count('pk'),
+        ultimo=Max(Greatest('updated_at', 'paciente__updated_at', 'medico__updated_at')),
+    )
+    desde, _ = ventana()
+    firma = f"{alias_actual()}|{sorted(filtro.items())}|{desde.date()}|{resumen['total']}|{resumen['ultimo']}"
+    return hashlib.sha1(firma.encode()).hexdigest()
+
+
+def _escapar(texto):
+    return (
+        texto.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _plegar(linea):
+    """
+    Parte las líneas de más de 75 octetos, como exige RFC 5545.
+    """
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea + '\r\n'
+    partes = []
+    while datos:
+        corte = min(len(datos), 75 if not partes else 74)
+        # No cortar en medio de un carácter UTF-8
+        while corte < len(datos) and (datos[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(datos[:corte].decode('utf-8'))
+        datos = datos[corte:]
+    return '\r\n '.join(partes) + '\r\n'
+
+
+def _utc(fecha_hora):
+    return fecha_hora.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def generar(nombre, **filtro):
+    """
+    Genera el feed línea por línea, leyendo las citas por bloques.
+    La respuesta se recorre después de que el middleware restaura la sede,
+    por eso la base de datos se fija al crear el generador.
+    """
+    return _lineas(nombre, alias_actual(), filtro)
+
+
+def _lineas(nombre, alias, filtro):
+    yield _plegar('BEGIN:VCALENDAR')
+    yield _plegar('VERSION:2.0')
+    yield _plegar('PRODID:-//Salud Vital//Agenda de citas//ES')
+    yield _plegar('CALSCALE:GREGORIAN')
+    yield _plegar(f'X-WR-CALNAME:{_escapar(nombre)}')
+    citas = (
+        citas_feed(alias, **filtro)
+        .select_related('paciente', 'medico')
+        .only(
+            'fecha_hora', 'duracion_minutos', 'tipo_cita', 'estado', 'motivo', 'updated_at',
+            'paciente__nombre', 'paciente__apellido', 'medico__nombre', 'medico__apellido', 'medico__correo',
+        )
+        .order_by('fecha_hora', 'pk')
+    )
+    for cita in citas.iterator(chunk_size=500):
+        fin = cita.fecha_hora + timedelta(minutes=cita.duracion_minutos)
+        resumen = f"{TIPOS_CITA.get(cita.tipo_cita, cita.tipo_cita)}: {cita.paciente.nombre} {cita.paciente.apellido}"
+        yield ''.join(_plegar(linea) for linea in [
+            'BEGIN:VEVENT',
+            f'UID:cita-{cita.pk}@saludvital',
+            f'DTSTAMP:{_utc(cita.updated_at)}',
+            f'DTSTART:{_utc(cita.fecha_hora)}',
+            f'DTEND:{_utc(fin)}',
+            f'SUMMARY:{_escapar(resumen)}',
+            f'DESCRIPTION:{_escapar(cita.motivo)}',
+            f'ORGANIZER;CN="{cita.medico.nombre} {cita.medico.apellido}":mailto:{cita.medico.correo}',
+            f'STATUS:{ESTADOS_ICAL.get(cita.estado, "CONFIRMED")}',
+            'END:VEVENT',
+        ])
+    yield _plegar('END:VCALENDAR')
@@ -0,0 +1,105 @@
+"""
+Revisiones de rendimiento de la configuración.
+
+Se registran como revisiones de despliegue de Django con la etiqueta
+'rendimiento': aparecen en `manage.py check --deploy` y en
+`manage.py revisar_rendimiento`, pensado para ejecutarse al arrancar el
+servicio. Cada advertencia señala una opción que reduce el rendimiento bajo
+carga y cómo corregirla.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+ETIQUETA = 'rendimiento'
+
+CACHES_LOCALES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+SESIONES_SIN_CACHE = {
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.file',
+}
+CARGADOR_CACHEADO = 'django.template.loaders.cached.Loader'
+
+
+@register(ETIQUETA, deploy=True)
+def revisar_debug(app_configs, **kwargs):
+    if not settings.DEBUG:
+        return []
+    return [Warning(
+        'DEBUG está activo: cada consulta SQL de la petición se guarda en memoria.',
+        hint='Use saludvital.settings_produccion o DEBUG=False en el entorno.',
+        id='gestion_clinica.W101',
+    )]
+
+
+@register(ETIQUETA, deploy=True)
+def revisar_conexiones(app_configs, **kwargs):
+    avisos = []
+    for alias, base in settings.DATABASES.items():
+        if base.get('CONN_MAX_AGE', 0) == 0:
+            avisos.append(Warning(
+                f"La base '{alias}' abre una conexión nueva en cada petición (CONN_MAX_AGE = 0).",
+                hint='Defina DB_CONN_MAX_AGE (por ejemplo 600) para reutilizar las conexiones.',
+                id='gestion_clinica.W102',
+            ))
+        elif not base.get('CONN_HEALTH_CHECKS', False):
+            avisos.append(Warning(
+                f"La base '{alias}' reutiliza conexiones sin verificarlas (CONN_HEALTH_CHECKS = False).",
+                hint='Con DB_CONN_HEALTH_CHECKS=True una conexión caída se reemplaza en vez de fallar la petición.',
+                id='gestion_clinica.W103',
+            ))
+    return avisos
+
+
+@register(ETIQUETA, deploy=True)
+def revisar_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in CACHES_LOCALES:
+        return []
+    return [Warning(
+        f'La cache por defecto ({backend.rsplit(".", 1)[-1]}) no se comparte entre procesos: '
+        'la coalescencia, los candados y las versiones de cache solo valen dentro de cada proceso.',
+        hint='Defina REDIS_URL o use la cache en base de datos de saludvital.settings_produccion.',
+        id='gestion_clinica.W104',
+    )]
+
+
+@register(ETIQUETA, deploy=True)
+def revisar_sesiones(app_configs, **kwargs):
+    if settings.SESSION_ENGINE not in SESIONES_SIN_CACHE:
+        return []
+    return [Warning(
+        f'Las sesiones ({settings.SESSION_ENGINE}) se leen del almacenamiento en cada petición.',
+        hint="Use SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'.",
+        id='gestion_clinica.W105',
+    )]
+
+
+def _cargadores(motor):
+    for cargador in motor.get('OPTIONS', {}).get('loaders', ()):
+        yield cargador[0] if isinstance(cargador, (list, tuple)) else cargador
+
+
+@register(ETIQUETA, deploy=True)
+def revisar_plantillas(app_configs, **kwargs):
+    avisos = []
+    for motor in settings.TEMPLATES:
+        if motor['BACKEND'] != 'django.template.backends.django.DjangoTemplates':
+            continue
+        opciones = motor.get('OPTIONS', {})
+        # Sin 'loaders' explícitos Django ya usa el cargador cacheado
+        if 'loaders' in opciones and CARGADOR_CACHEADO not in _cargadores(motor):
+            avisos.append(Warning(
+                'Las plantillas se vuelven a leer y compilar en cada render.',
+                hint=f'Envuelva los cargadores de plantillas en {CARGADOR_CACHEADO}.',
+                id='gestion_clinica.W106',
+            ))
+        if opciones.get('debug'):
+            avisos.append(Warning(
+                "Las plantillas se renderizan con 'debug' activo.",
+                hint="Quite 'debug' de OPTIONS en TEMPLATES.",
+                id='gestion_clinica.W107',
+            ))
+    return avisos
@@ -0,0 +1,170 @@
+"""
+Coalescencia de peticiones GET idénticas (single-flight).
+
+Cuando llegan a la vez varias peticiones iguales (misma URL normalizada y
+mismos permisos), solo la primera consulta la base de datos; las demás
+esperan y reciben el mismo resultado.
+
+- Dentro de un proceso, los hilos que llegan mientras la primera petición
+  está en vuelo esperan un threading.Event.
+- Entre procesos, el primero toma un candado en la cache (cache.add) y deja
+  el resultado en ella unos instantes; los demás lo leen desde ahí. Requiere
+  un backend de cache compartido; con LocMemCache solo coalesce por proceso.
+
+Las claves incluyen una versión por modelo que se incrementa al confirmar
+cualquier escritura (ver signals.py), de modo que un resultado compartido
+nunca sobrevive a un cambio.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .sedes import alias_actual
+
+# Marca para distinguir "no está en la cache" de un resultado None
+_AUSENTE = object()
+
+
+class _Vuelo:
+    """
+    Petición en curso dentro del proceso, compartida por los hilos que esperan.
+    """
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.fallo = False
+
+
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+
+
+def _espera():
+    return getattr(settings, 'COALESCENCIA_ESPERA_SEGUNDOS', 5)
+
+
+def clave_version(modelo, alias):
+    return f'coalescencia:version:{alias}:{modelo._meta.label_lower}'
+
+
+def version(modelo, alias):
+    return cache.get_or_set(clave_version(modelo, alias), 1, None)
+
+
+def invalidar_modelo(modelo, alias):
+    """
+    Incrementa la versión del modelo en esa sede al confirmar la transacción en curso.
+    """
+    def incrementar():
+        try:
+            cache.incr(clave_version(modelo, alias))
+        except ValueError:
+            cache.set(clave_version(modelo, alias), 2, None)
+    transaction.on_commit(incrementar, using=alias)
+
+
+def huella_permisos(usuario):
+    """
+    Identifica el conjunto de permisos del usuario, para que solo compartan
+    resultado las peticiones que verían los mismos datos.
+    """
+    if not usuario.is_authenticated:
+        return 'anonimo'
+    if usuario.is_superuser:
+        return 'superusuario'
+    permisos = ','.join(sorted(usuario.get_all_permissions()))
+    return hashlib.sha1(permisos.encode()).hexdigest()
+
+
+def clave_peticion(request, modelo):
+    """
+    Clave de la petición: sede, ruta, parámetros ordenados, permisos y versión del modelo.
+    """
+    alias = alias_actual()
+    parametros = sorted((nombre, sorted(valores)) for nombre, valores in request.GET.lists())
+    firma = f"{alias}|{request.path}|{parametros}|{huella_permisos(request.user)}|{version(modelo, alias)}"
+    return hashlib.sha1(firma.encode()).hexdigest()
+
+
+def _entre_procesos(clave, calcular):
+    """
+    Comparte el resultado con otros procesos a través de la cache.
+    """
+    clave_resultado = f'coalescencia:{clave}:resultado'
+    clave_candado = f'coalescencia:{clave}:candado'
+    resultado = cache.get(clave_resultado, _AUSENTE)
+    if resultado is not _AUSENTE:
+        return resultado
+
+    # El candado guarda un token propio: si vence y lo toma otro proceso, no se le borra
+    token = uuid.uuid4().hex
+    if cache.add(clave_candado, token, timeout=_espera()):
+        try:
+            resultado = calcular()
+            cache.set(clave_resultado, resultado, getattr(settings, 'COALESCENCIA_RESULTADO_SEGUNDOS', 2))
+            return resultado
+        finally:
+            if cache.get(clave_candado) == token:
+                cache.delete(clave_candado)
+
+    # Otro proceso está calculando: se espera su resultado
+    limite = time.monotonic() + _espera()
+    while time.monotonic() < limite:
+        time.sleep(0.02)
+        resultado = cache.get(clave_resultado, _AUSENTE)
+        if resultado is not _AUSENTE:
+            return resultado
+        if cache.get(clave_candado) is None:
+            # Terminó sin dejar resultado (falló): se calcula aquí
+            break
+    return calcular()
+
+
+def compartir(clave, calcular):
+    """
+    Ejecuta `calcular` una sola vez por clave entre las peticiones concurrentes
+    y devuelve el mismo resultado a todas. Si la petición líder falla o tarda
+    más que COALESCENCIA_ESPERA_SEGUNDOS, cada una calcula por su cuenta.
+    """
+    with _vuelos_lock:
+        vuelo = _vuelos.get(clave)
+        lider = vuelo is None
+        if lider:
+            vuelo = _vuelos[clave] = _Vuelo()
+
+    if not lider:
+        if vuelo.listo.wait(_espera()) and not vuelo.fallo:
+            return vuelo.resultado
+        return calcular()
+
+    try:
+        vuelo.resultado = _entre_procesos(clave, calcular)
+        return vuelo.resultado
+    except BaseException:
+        vuelo.fallo = True
+        raise
+    finally:
+        with _vuelos_lock:
+            _vuelos.pop(clave, None)
+        vuelo.listo.set()
+
+
+class CoalescenciaMixin:
+    """
+    Mixin para vistas de listado de DRF: las peticiones GET idénticas y
+    simultáneas comparten una sola consulta a la base de datos.
+    Se comparten los datos ya serializados; cada petición arma su propia Response.
+    """
+    def list(self, request, *args, **kwargs):
+        def calcular():
+            respuesta = super(CoalescenciaMixin, self).list(request, *args, **kwargs)
+            return respuesta.status_code, respuesta.data
+
+        estado, datos = compartir(clave_peticion(request, self.get_queryset().model), calcular)
+        return Response(datos, status=estado)
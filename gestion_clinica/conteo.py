@@ -0,0 +1,157 @@
+"""
+Conteos aproximados para los listados paginados.
+
+Contar exactamente una tabla de millones de filas cuesta más que leer la
+página, así que el total se obtiene así:
+1. Se pide al planificador una estimación: en PostgreSQL, reltuples de
+   pg_class si el listado no tiene filtros, o las filas estimadas por
+   EXPLAIN si los tiene. Si supera CONTEO_UMBRAL_EXACTO se usa tal cual.
+2. Si no, se cuenta exactamente, pero con el conteo acotado a
+   CONTEO_UMBRAL_EXACTO + 1 filas (COUNT sobre una subconsulta con LIMIT),
+   de modo que una estimación demasiado baja nunca dispara un conteo completo.
+3. Los motores sin estimación (SQLite en desarrollo) cuentan exactamente.
+
+Las respuestas indican si el total es exacto (`conteo_exacto`) y las
+vistas web muestran "aproximadamente N" cuando no lo es.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def umbral_exacto():
+    return getattr(settings, 'CONTEO_UMBRAL_EXACTO', 10000)
+
+
+def estimar(queryset):
+    """
+    Filas estimadas por el planificador para el queryset, o None si el motor
+    no ofrece una estimación (o la tabla aún no tiene estadísticas).
+    """
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql':
+        return None
+    with conexion.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            fila = cursor.fetchone()
+            return fila[0] if fila and fila[0] >= 0 else None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def contar(queryset, umbral=None):
+    """
+    Devuelve (total, exacto) para el queryset, según la estrategia del módulo.
+    """
+    umbral = umbral_exacto() if umbral is None else umbral
+    estimacion = estimar(queryset)
+    if estimacion is None:
+        return queryset.count(), True
+    if estimacion > umbral:
+        return estimacion, False
+    acotado = queryset.order_by()[:umbral + 1].count()
+    if acotado <= umbral:
+        return acotado, True
+    # La estimación se quedó corta: se informa al menos el umbral superado
+    return max(estimacion, acotado), False
+
+
+class PaginaEstimada(Page):
+    """
+    Página que sabe si hay una siguiente sin depender del total, que puede
+    ser aproximado.
+    """
+    def __init__(self, object_list, number, paginator, hay_siguiente):
+        super().__init__(object_list, number, paginator)
+        self.hay_siguiente = hay_siguiente
+
+    def has_next(self):
+        return self.hay_siguiente
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator de Django con conteo aproximado. Como el total puede no ser
+    exacto, no rechaza páginas más allá de la última calculada y cada página
+    lee una fila extra para saber si existe la siguiente.
+    """
+    @cached_property
+    def _conteo(self):
+        return contar(self.object_list)
+
+    @cached_property
+    def count(self):
+        return self._conteo[0]
+
+    @property
+    def conteo_exacto(self):
+        return self._conteo[1]
+
+    def validate_number(self, number):
+        if self.conteo_exacto:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage(self.error_messages['invalid_page'])
+        if number < 1:
+            raise InvalidPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        filas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        return PaginaEstimada(filas[:self.per_page], number, self, len(filas) > self.per_page)
+
+
+class PaginacionEstimada(PageNumberPagination):
+    """
+    Paginación por número de página para la API, con conteo aproximado.
+    Parámetros: page y page_size (hasta PAGINA_TAMANO_MAXIMO).
+    """
+    django_paginator_class = PaginadorEstimado
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'PAGINA_TAMANO_MAXIMO', 200)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'conteo_exacto': self.page.paginator.conteo_exacto,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        esquema = super().get_paginated_response_schema(schema)
+        esquema['properties']['conteo_exacto'] = {'type': 'boolean'}
+        return esquema
+
+
+def paginar(request, queryset, parametro='pagina'):
+    """
+    Página de la vista web indicada por ?pagina=, con conteo aproximado.
+    Una página inválida muestra la primera.
+    """
+    paginador = PaginadorEstimado(queryset, getattr(settings, 'PAGINA_TAMANO_WEB', 50))
+    try:
+        return paginador.page(request.GET.get(parametro) or 1)
+    except InvalidPage:
+        return paginador.page(1)
@@ -0,0 +1,156 @@
+"""
+Eventos en vivo de Cita y ConsultaMedica para las pantallas de recepción
+y sala de espera. Los cambios se publican en un broker al confirmar la
+transacción y se entregan por Server-Sent Events en /api/eventos/.
+
+El broker se elige con el setting EVENTOS_BROKER. BrokerMemoria reparte los
+eventos dentro de un proceso; con varios procesos o servidores se debe usar
+un broker compartido que implemente la misma interfaz (suscribir, cancelar
+y publicar) y reparta localmente lo que recibe.
+"""
+import asyncio
+import itertools
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .sedes import alias_actual
+
+
+class Suscripcion:
+    """
+    Suscripción de una conexión SSE: filtros y cola de eventos pendientes.
+    La cola pertenece al event loop de la conexión y solo se toca desde él.
+    """
+    def __init__(self, loop, medico=None, fecha=None, maximo=100, sede='default'):
+        self.loop = loop
+        self.sede = sede
+        self.medico = medico
+        self.fecha = fecha
+        self.cola = asyncio.Queue(maxsize=maximo)
+
+    def acepta(self, evento):
+        if evento['sede'] != self.sede:
+            return False
+        if self.medico is not None and evento['medico'] != self.medico:
+            return False
+        if self.fecha is not None and evento['dia'] != self.fecha:
+            return False
+        return True
+
+    def entregar(self, evento):
+        """
+        Encola el evento; si el cliente no alcanza a leer, se descarta el más
+        antiguo para que una pantalla lenta no haga crecer la memoria.
+        """
+        if self.cola.full():
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+
+class BrokerMemoria:
+    """
+    Broker de difusión en memoria, válido dentro de un solo proceso.
+    """
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self._secuencia = itertools.count(1)
+
+    def suscribir(self, medico=None, fecha=None):
+        """
+        Registra una suscripción ligada al event loop en ejecución y a la sede actual.
+        """
+        suscripcion = Suscripcion(
+            asyncio.get_running_loop(), medico, fecha,
+            getattr(settings, 'EVENTOS_COLA_MAXIMA', 100), alias_actual(),
+        )
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, evento):
+        """
+        Entrega el evento a las suscripciones que lo aceptan.
+        Puede llamarse desde cualquier hilo: la entrega se agenda en el loop
+        de cada suscriptor.
+        """
+        evento = dict(evento, id=next(self._secuencia))
+        with self._lock:
+            destinatarios = [s for s in self._suscripciones if s.acepta(evento)]
+        for suscripcion in destinatarios:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # El loop de la conexión ya se cerró
+                self.cancelar(suscripcion)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obtener_broker():
+    """
+    Devuelve la instancia única del broker configurado en EVENTOS_BROKER.
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                clase = import_string(getattr(settings, 'EVENTOS_BROKER', 'gestion_clinica.eventos.BrokerMemoria'))
+                _broker = clase()
+    return _broker
+
+
+def construir_evento(instancia, accion):
+    """
+    Arma el evento de cambio para una Cita o ConsultaMedica.
+    """
+    if instancia._meta.model_name == 'cita':
+        tipo, fecha = 'cita', instancia.fecha_hora
+    else:
+        tipo, fecha = 'consulta', instancia.fecha_consulta
+    return {
+        'sede': instancia._state.db or 'default',
+        'tipo': tipo,
+        'accion': accion,
+        'objeto_id': instancia.pk,
+        'medico': instancia.medico_id,
+        'paciente': instancia.paciente_id,
+        'estado': instancia.estado,
+        'fecha': fecha.isoformat(),
+        'dia': timezone.localtime(fecha).date().isoformat(),
+    }
+
+
+def publicar_cambio(instancia, accion):
+    """
+    Publica el cambio cuando la transacción se confirma, para no anunciar
+    estados que luego se revierten.
+    """
+    evento = construir_evento(instancia, accion)
+    transaction.on_commit(partial(obtener_broker().publicar, evento), using=evento['sede'])
+
+
+def _publicar_todos(broker, eventos):
+    for evento in eventos:
+        broker.publicar(evento)
+
+
+def publicar_cambios(instancias, accion):
+    """
+    Como publicar_cambio para varias instancias de una misma base, con un
+    solo callback de on_commit para todas.
+    """
+    eventos = [construir_evento(instancia, accion) for instancia in instancias]
+    if eventos:
+        transaction.on_commit(partial(_publicar_todos, obtener_broker(), eventos), using=eventos[0]['sede'])
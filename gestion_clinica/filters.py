@@ -2,17 +2,113 @@
 Filtros personalizados para los modelos de la aplicación.
 Permite filtrar los registros según diferentes criterios.
 """
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Value, When
 from django_filters import rest_framework as filters
-from .models import Medico, Paciente, ConsultaMedica, Tratamiento, RecetaMedica, Medicamento
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .models import Medico, Paciente, PacienteMedico, ConsultaMedica, Tratamiento, RecetaMedica, Medicamento, Cita
+from .normalizacion import normalizar
+from . import busqueda
 
-class MedicoFilter(filters.FilterSet):
+
+def filtrar_vigentes(queryset, fecha):
+    """
+    Registros vigentes en la fecha: fecha_inicio <= fecha <= fecha_fin.
+    Ambas columnas están en el índice de vigencia, por lo que basta un
+    recorrido por rango del índice, sin cálculos por fila.
+    """
+    return queryset.filter(fecha_fin__gte=fecha, fecha_inicio__lte=fecha)
+
+def filtrar_normalizado(queryset, campo, texto):
+    """
+    Busca el texto (sin tildes ni mayúsculas) dentro de la columna normalizada
+    `campo` y anota `rango_<campo>`: 0 si coincide por prefijo y 1 si solo lo
+    contiene. La comparación es directa contra la columna, así que usa el
+    índice de prefijo o el de trigramas en PostgreSQL.
+    """
+    termino = normalizar(texto)
+    if not termino:
+        return queryset
+    return queryset.filter(**{f'{campo}__contains': termino}).annotate(**{
+        f"rango_{campo.replace('__', '_')}": Case(
+            When(**{f'{campo}__startswith': termino}, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    })
+
+
+def parsear_ids(valor):
+    """
+    Convierte "1,2,3" en [1, 2, 3], sin repetidos y en el orden recibido.
+    """
+    try:
+        ids = list(dict.fromkeys(int(parte) for parte in valor.split(',') if parte.strip()))
+    except ValueError:
+        raise ValidationError({'ids': 'Debe ser una lista de números separados por coma.'})
+    maximo = getattr(settings, 'PAGINA_TAMANO_MAXIMO', 200)
+    if len(ids) > maximo:
+        raise ValidationError({'ids': f'Se pueden pedir a lo más {maximo} registros a la vez.'})
+    return ids
+
+
+class FiltroIds(BaseFilterBackend):
+    """
+    Filtro de DRF para todos los listados: ?ids=1,2,3 trae esos registros
+    con una sola consulta pk IN (...), en vez de uno por petición. No se
+    aplica al detalle (get_object), que ya indica su registro en la URL.
+    """
+    parametro = 'ids'
+
+    def filter_queryset(self, request, queryset, view):
+        valor = request.query_params.get(self.parametro)
+        consulta = getattr(view, 'lookup_url_kwarg', None) or getattr(view, 'lookup_field', None)
+        if not valor or consulta in getattr(view, 'kwargs', {}):
+            return queryset
+        return queryset.filter(pk__in=parsear_ids(valor))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.parametro,
+            'required': False,
+            'in': 'query',
+            'description': 'Ids separados por coma.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class CatalogoFilterSet(filters.FilterSet):
+    """
+    FilterSet para búsquedas en catálogos: si se buscó por texto, los
+    resultados que empiezan con el texto van primero y luego el orden
+    alfabético de `orden_catalogo`.
+    """
+    orden_catalogo = ('pk',)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        rangos = [nombre for nombre in queryset.query.annotations if nombre.startswith('rango_')]
+        if rangos:
+            queryset = queryset.order_by(*rangos, *self.orden_catalogo)
+        return queryset
+
+    def filtrar_normalizado(self, queryset, name, value):
+        # name es el field_name del filtro: la columna normalizada
+        return filtrar_normalizado(queryset, name, value)
+
+class MedicoFilter(CatalogoFilterSet):
     """
     Filtros para el modelo Médico.
     Permite filtrar médicos por especialidad y estado activo.
+    El nombre de la especialidad se busca sin distinguir tildes ni mayúsculas.
     """
     especialidad = filters.NumberFilter(field_name='especialidad__id')
-    especialidad_nombre = filters.CharFilter(field_name='especialidad__nombre', lookup_expr='icontains')
+    especialidad_nombre = filters.CharFilter(
+        field_name='especialidad__nombre_normalizado', method='filtrar_normalizado',
+    )
     activo = filters.BooleanFilter()
+    orden_catalogo = ('apellido', 'nombre', 'pk')
 
     class Meta:
         model = Medico
@@ -21,64 +117,126 @@ class MedicoFilter(filters.FilterSet):
 class PacienteFilter(filters.FilterSet):
     """
     Filtros para el modelo Paciente.
-    Permite filtrar pacientes por médico tratante y tipo de sangre.
+    Permite filtrar pacientes por médico tratante y tipo de sangre, y
+    ordenarlos por última visita (orden=-ultima_visita).
     """
-    medico = filters.NumberFilter(field_name='consultamedica__medico__id', distinct=True)
+    medico = filters.NumberFilter(method='filtrar_medico')
     tipo_sangre = filters.ChoiceFilter(choices=Paciente.TIPO_SANGRE_CHOICES)
     activo = filters.BooleanFilter()
+    orden = filters.ChoiceFilter(
+        choices=[('ultima_visita', 'Última visita ascendente'), ('-ultima_visita', 'Última visita descendente')],
+        method='ordenar',
+    )
 
     class Meta:
         model = Paciente
-        fields = ['medico', 'tipo_sangre', 'activo']
+        fields = ['medico', 'tipo_sangre', 'activo', 'orden']
+
+    def filtrar_medico(self, queryset, name, value):
+        # La relación paciente–médico tiene una fila por par, así que el join
+        # no duplica pacientes y no hace falta DISTINCT sobre las consultas
+        return queryset.filter(relaciones_medico__medico_id=value).annotate(
+            ultima_visita=F('relaciones_medico__ultima_consulta'),
+            total_consultas=F('relaciones_medico__total_consultas'),
+        )
+
+    def ordenar(self, queryset, name, value):
+        if 'ultima_visita' not in queryset.query.annotations:
+            # Sin médico: última visita con cualquier médico
+            queryset = queryset.annotate(ultima_visita=Subquery(
+                PacienteMedico.objects.filter(paciente=OuterRef('pk'))
+                .order_by('-ultima_consulta').values('ultima_consulta')[:1]
+            ))
+        descendente = value.startswith('-')
+        return queryset.order_by(
+            F('ultima_visita').desc(nulls_last=True) if descendente else F('ultima_visita').asc(nulls_last=True),
+            'pk',
+        )
 
 class ConsultaMedicaFilter(filters.FilterSet):
     """
     Filtros para el modelo ConsultaMedica.
-    Permite filtrar consultas por médico, paciente, estado y rango de fechas.
+    Permite filtrar consultas por médico, paciente, estado y rango de fechas,
+    y buscar por texto en motivo y diagnóstico (q), ordenando por relevancia.
     """
     medico = filters.NumberFilter(field_name='medico__id')
     paciente = filters.NumberFilter(field_name='paciente__id')
     estado = filters.ChoiceFilter(choices=ConsultaMedica.ESTADO_CHOICES)
     fecha_desde = filters.DateTimeFilter(field_name='fecha_consulta', lookup_expr='gte')
     fecha_hasta = filters.DateTimeFilter(field_name='fecha_consulta', lookup_expr='lte')
+    q = filters.CharFilter(method='filtrar_texto')
 
     class Meta:
         model = ConsultaMedica
-        fields = ['medico', 'paciente', 'estado', 'fecha_desde', 'fecha_hasta']
+        fields = ['medico', 'paciente', 'estado', 'fecha_desde', 'fecha_hasta', 'q']
+
+    def filtrar_texto(self, queryset, name, value):
+        return busqueda.filtrar(queryset, value)
 
 class TratamientoFilter(filters.FilterSet):
     """
     Filtros para el modelo Tratamiento.
-    Permite filtrar tratamientos por consulta y médico.
+    Permite filtrar tratamientos por consulta, médico y vigencia en una fecha (activo_en),
+    y buscar por texto en la descripción (q), ordenando por relevancia.
     """
     consulta = filters.NumberFilter(field_name='consulta__id')
     medico = filters.NumberFilter(field_name='consulta__medico__id')
     paciente = filters.NumberFilter(field_name='consulta__paciente__id')
+    activo_en = filters.DateFilter(method='filtrar_activo_en')
+    q = filters.CharFilter(method='filtrar_texto')
 
     class Meta:
         model = Tratamiento
-        fields = ['consulta', 'medico', 'paciente']
+        fields = ['consulta', 'medico', 'paciente', 'activo_en', 'q']
+
+    def filtrar_activo_en(self, queryset, name, value):
+        return filtrar_vigentes(queryset, value)
+
+    def filtrar_texto(self, queryset, name, value):
+        return busqueda.filtrar(queryset, value)
 
 class RecetaMedicaFilter(filters.FilterSet):
     """
     Filtros para el modelo RecetaMedica.
-    Permite filtrar recetas por tratamiento, medicamento y frecuencia.
+    Permite filtrar recetas por tratamiento, medicamento, frecuencia y vigencia en una fecha.
     """
     tratamiento = filters.NumberFilter(field_name='tratamiento__id')
     medicamento = filters.NumberFilter(field_name='medicamento__id')
     frecuencia = filters.ChoiceFilter(choices=RecetaMedica.FRECUENCIA_CHOICES)
+    activo_en = filters.DateFilter(method='filtrar_activo_en')
 
     class Meta:
         model = RecetaMedica
-        fields = ['tratamiento', 'medicamento', 'frecuencia']
+        fields = ['tratamiento', 'medicamento', 'frecuencia', 'activo_en']
+
+    def filtrar_activo_en(self, queryset, name, value):
+        return filtrar_vigentes(queryset, value)
+
+class CitaFilter(filters.FilterSet):
+    """
+    Filtros para el modelo Cita.
+    Permite filtrar citas por médico, paciente, estado, tipo y rango de fechas.
+    """
+    medico = filters.NumberFilter(field_name='medico__id')
+    paciente = filters.NumberFilter(field_name='paciente__id')
+    estado = filters.ChoiceFilter(choices=Cita.ESTADO_CITA_CHOICES)
+    tipo_cita = filters.ChoiceFilter(choices=Cita.TIPO_CITA_CHOICES)
+    fecha_desde = filters.DateTimeFilter(field_name='fecha_hora', lookup_expr='gte')
+    fecha_hasta = filters.DateTimeFilter(field_name='fecha_hora', lookup_expr='lte')
+
+    class Meta:
+        model = Cita
+        fields = ['medico', 'paciente', 'estado', 'tipo_cita', 'fecha_desde', 'fecha_hasta']
 
-class MedicamentoFilter(filters.FilterSet):
+class MedicamentoFilter(CatalogoFilterSet):
     """
     Filtros para el modelo Medicamento.
-    Permite filtrar medicamentos por nombre y laboratorio.
+    Permite filtrar medicamentos por nombre y laboratorio, sin distinguir
+    tildes ni mayúsculas y con las coincidencias por prefijo primero.
     """
-    nombre = filters.CharFilter(lookup_expr='icontains')
-    laboratorio = filters.CharFilter(lookup_expr='icontains')
+    nombre = filters.CharFilter(field_name='nombre_normalizado', method='filtrar_normalizado')
+    laboratorio = filters.CharFilter(field_name='laboratorio_normalizado', method='filtrar_normalizado')
+    orden_catalogo = ('nombre_normalizado', 'pk')
     stock_minimo = filters.NumberFilter(field_name='stock', lookup_expr='gte')
 
     class Meta:
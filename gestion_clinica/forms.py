@@ -8,6 +8,8 @@ from .models import (
     Paciente, Medico, Especialidad, ConsultaMedica, 
     Tratamiento, Medicamento, RecetaMedica
 )
+from .autocompletar import AutocompletarSelect
+from .medicacion import revisar_duplicado
 
 
 class PacienteForm(forms.ModelForm):
@@ -77,12 +79,14 @@ class EspecialidadForm(forms.ModelForm):
 class ConsultaMedicaForm(forms.ModelForm):
     """
     Formulario para crear y editar consultas médicas.
-    Incluye selección de paciente y médico.
+    Incluye selección de paciente y médico mediante búsqueda remota.
     """
     class Meta:
         model = ConsultaMedica
         fields = ['paciente', 'medico', 'fecha_consulta', 'motivo', 'diagnostico', 'estado']
         widgets = {
+            'paciente': AutocompletarSelect('pacientes'),
+            'medico': AutocompletarSelect('medicos'),
             'fecha_consulta': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'motivo': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Motivo de la consulta'}),
             'diagnostico': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Diagnóstico médico'}),
@@ -100,11 +104,13 @@ class ConsultaMedicaForm(forms.ModelForm):
 class TratamientoForm(forms.ModelForm):
     """
     Formulario para crear y editar tratamientos médicos.
+    La consulta se elige mediante búsqueda remota.
     """
     class Meta:
         model = Tratamiento
         fields = ['consulta', 'descripcion', 'duracion_dias', 'observaciones']
         widgets = {
+            'consulta': AutocompletarSelect('consultas'),
             'descripcion': forms.Textarea(attrs={'rows': 4, 'placeholder': 'Descripción detallada del tratamiento'}),
             'observaciones': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Observaciones adicionales'}),
         }
@@ -139,12 +145,21 @@ class MedicamentoForm(forms.ModelForm):
 class RecetaMedicaForm(forms.ModelForm):
     """
     Formulario para crear y editar recetas médicas.
-    Incluye selección de tratamiento y medicamento.
+    Incluye selección de tratamiento y medicamento mediante búsqueda remota,
+    y avisa si el paciente ya tiene vigente el mismo medicamento.
     """
+    confirmar_duplicado = forms.BooleanField(
+        required=False,
+        label='Registrar de todas formas',
+        widget=forms.CheckboxInput(attrs={'style': 'width: auto;'}),
+    )
+
     class Meta:
         model = RecetaMedica
         fields = ['tratamiento', 'medicamento', 'dosis', 'frecuencia', 'duracion', 'motivo']
         widgets = {
+            'tratamiento': AutocompletarSelect('tratamientos'),
+            'medicamento': AutocompletarSelect('medicamentos'),
             'dosis': forms.TextInput(attrs={'placeholder': 'Ej: 500mg, 1 comprimido'}),
             'duracion': forms.TextInput(attrs={'placeholder': 'Ej: 7 días, 2 semanas'}),
             'motivo': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Motivo de la prescripción'}),
@@ -157,3 +172,13 @@ class RecetaMedicaForm(forms.ModelForm):
             'duracion': 'Duración',
             'motivo': 'Motivo de la Prescripción',
         }
+
+    def clean(self):
+        datos = super().clean()
+        tratamiento = datos.get('tratamiento')
+        medicamento = datos.get('medicamento')
+        if tratamiento and medicamento and not datos.get('confirmar_duplicado'):
+            aviso = revisar_duplicado(tratamiento, medicamento, datos.get('duracion', ''), self.instance)
+            if aviso:
+                raise forms.ValidationError(aviso, code='terapia_duplicada')
+        return datos
@@ -0,0 +1,160 @@
+"""
+Claves de idempotencia (cabecera Idempotency-Key) para los POST de creación.
+
+Los clientes móviles reintentan los POST cuando la conexión falla; con la
+misma Idempotency-Key, el reintento recibe la respuesta original en vez de
+crear un duplicado:
+
+1. La primera petición reserva la clave insertando una fila EN_CURSO (la
+   restricción única sobre clave y ruta decide quién gana si llegan dos a la
+   vez). Una reserva dura IDEMPOTENCIA_RESERVA_SEGUNDOS; si el proceso muere,
+   la clave se libera sola al vencer.
+2. La creación y el guardado de la respuesta van en la misma transacción, en
+   la base de la sede: o quedan ambos o ninguno.
+3. Los reintentos devuelven la respuesta guardada (con la cabecera
+   Idempotent-Replayed) sin tocar las tablas de negocio, durante
+   IDEMPOTENCIA_RETENCION_HORAS. Un duplicado que llega mientras la primera
+   sigue en curso recibe 409 con Retry-After; la misma clave con otro cuerpo
+   u otro usuario, 422.
+
+Solo se guardan las respuestas exitosas: ante un error la clave se libera y
+el cliente puede reintentar con ella. Las claves vencidas se borran por
+lotes con `manage.py limpiar_idempotencia`.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import ClaveIdempotencia
+from .sedes import alias_actual
+
+CABECERA = 'Idempotency-Key'
+
+# Filas borradas por sentencia al limpiar
+TAMANO_LOTE = 1000
+
+
+class _ReservaPerdida(Exception):
+    """
+    La reserva venció y la tomó otra petición antes de confirmar la creación.
+    """
+
+
+def _retencion():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCIA_RETENCION_HORAS', 24))
+
+
+def _reserva():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_RESERVA_SEGUNDOS', 60))
+
+
+def huella(request):
+    """
+    Identifica la petición original: método, usuario y cuerpo.
+    """
+    usuario = request.user.pk if request.user.is_authenticated else ''
+    datos = hashlib.sha256(f'{request.method}:{usuario}:'.encode())
+    datos.update(request._request.body)
+    return datos.hexdigest()
+
+
+def _conflicto(mensaje):
+    return Response({'detail': mensaje}, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+
+
+def _reservar(alias, clave, ruta, firma):
+    """
+    Devuelve (reserva, None) si la petición debe procesarse, o (None,
+    respuesta) si es un duplicado.
+    """
+    claves = ClaveIdempotencia.objects.using(alias)
+    for _ in range(2):
+        ahora = timezone.now()
+        try:
+            with transaction.atomic(using=alias):
+                return claves.create(clave=clave, ruta=ruta, huella=firma, expira=ahora + _reserva()), None
+        except IntegrityError:
+            existente = claves.filter(clave=clave, ruta=ruta).first()
+        if existente is None:
+            continue
+        if existente.expira <= ahora:
+            # Vencida o abandonada: se libera y se intenta reservar de nuevo
+            claves.filter(pk=existente.pk, expira__lte=ahora).delete()
+            continue
+        if existente.huella != firma:
+            return None, Response(
+                {'detail': f'La {CABECERA} ya se usó con otra petición.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if existente.estado == 'EN_CURSO':
+            return None, _conflicto('Una petición con la misma clave está en curso.')
+        return None, Response(existente.respuesta, status=existente.codigo, headers={'Idempotent-Replayed': 'true'})
+    return None, _conflicto('No se pudo reservar la clave.')
+
+
+def ejecutar(request, clave, crear):
+    """
+    Ejecuta crear() a lo más una vez por clave y ruta, y devuelve su
+    respuesta o la guardada de la primera ejecución.
+    """
+    if len(clave) > ClaveIdempotencia._meta.get_field('clave').max_length:
+        raise ValidationError({CABECERA: 'La clave es demasiado larga.'})
+    alias = alias_actual()
+    reserva, duplicado = _reservar(alias, clave, request.path, huella(request))
+    if duplicado is not None:
+        return duplicado
+    claves = ClaveIdempotencia.objects.using(alias)
+    try:
+        with transaction.atomic(using=alias):
+            respuesta = crear()
+            if status.is_success(respuesta.status_code):
+                guardadas = claves.filter(pk=reserva.pk, estado='EN_CURSO').update(
+                    estado='COMPLETADA',
+                    codigo=respuesta.status_code,
+                    respuesta=respuesta.data,
+                    expira=timezone.now() + _retencion(),
+                )
+                if not guardadas:
+                    raise _ReservaPerdida
+    except _ReservaPerdida:
+        return _conflicto('La reserva de la clave venció antes de completar la petición.')
+    except BaseException:
+        claves.filter(pk=reserva.pk, estado='EN_CURSO').delete()
+        raise
+    if not status.is_success(respuesta.status_code):
+        claves.filter(pk=reserva.pk, estado='EN_CURSO').delete()
+    return respuesta
+
+
+class IdempotenciaMixin:
+    """
+    Mixin para vistas de creación de DRF: con la cabecera Idempotency-Key,
+    un POST repetido devuelve la respuesta del primero.
+    """
+    def create(self, request, *args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if not clave:
+            return super().create(request, *args, **kwargs)
+        return ejecutar(request, clave, lambda: super(IdempotenciaMixin, self).create(request, *args, **kwargs))
+
+
+def limpiar(lote=TAMANO_LOTE):
+    """
+    Borra las claves vencidas de la sede actual, por lotes para mantener
+    cortas las transacciones. Devuelve la cantidad de filas borradas.
+    """
+    ahora = timezone.now()
+    vencidas = ClaveIdempotencia.objects.filter(expira__lte=ahora)
+    total = 0
+    while True:
+        pks = list(vencidas.values_list('pk', flat=True)[:lote])
+        if not pks:
+            return total
+        borradas, _ = ClaveIdempotencia.objects.filter(pk__in=pks, expira__lte=ahora).delete()
+        total += borradas
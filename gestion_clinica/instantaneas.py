@@ -0,0 +1,416 @@
+"""
+Instantáneas columnares de los datos clínicos para análisis.
+
+`manage.py crear_instantanea` exporta consultas, citas, recetas y sus
+dimensiones (pacientes, médicos, especialidades y medicamentos) a
+INSTANTANEAS_DIR/<sede>/<fecha>/, un archivo .npy por columna:
+- arreglos de ancho fijo (enteros, decimales, fechas datetime64 en UTC y
+  textos de largo máximo fijo);
+- los campos con choices (estado, tipo_sangre, frecuencia, ...) se guardan
+  codificados con diccionario: un uint8 por fila y la lista de valores en
+  manifiesto.json;
+- los nulos son -1 en los enteros, NaN en los decimales y NaT en las fechas.
+
+Todas las tablas se leen en una sola transacción de solo lectura (REPEATABLE
+READ en PostgreSQL), de modo que la instantánea es consistente. Se escribe
+en un directorio temporal y se publica al final renombrándolo y
+actualizando el archivo ACTUAL, así que los lectores nunca ven una a medias.
+
+Instantanea.abrir() mapea los archivos en memoria (np.load con mmap_mode):
+los filtros y agrupaciones se calculan sobre el archivo, sin copiarlo y sin
+consultar la base de datos:
+
+    citas = Instantanea.abrir()['citas']
+    mascara = citas.filtrar(estado='NO_ASISTIO', fecha_hora__gte=date(2025, 1, 1))
+    citas.agrupar('especialidad_id', mascara)
+"""
+import json
+import os
+import shutil
+from datetime import date, datetime, time, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Cita, ConsultaMedica, Especialidad, Medicamento, Medico, Paciente, RecetaMedica
+from .sedes import alias_actual
+
+# Filas leídas y escritas por lote al exportar
+TAMANO_LOTE = 5000
+
+FECHA_HORA = 'datetime64[s]'
+FECHA = 'datetime64[D]'
+DICCIONARIO = 'diccionario'
+TEXTO = 'texto'
+
+# Valor de los enteros nulos y de los códigos fuera del diccionario
+NULO = -1
+DESCONOCIDO = 255
+
+
+class Columna:
+    """
+    Columna exportada: nombre en la instantánea, ruta del campo en el ORM y tipo.
+    """
+    def __init__(self, nombre, origen=None, tipo='int64'):
+        self.nombre = nombre
+        self.origen = origen or nombre
+        self.tipo = tipo
+
+    def preparar(self, modelo):
+        """
+        Resuelve el dtype y, si corresponde, el diccionario desde el campo del modelo.
+        """
+        campo = modelo._meta.get_field(self.origen.split('__')[0])
+        for parte in self.origen.split('__')[1:]:
+            campo = campo.related_model._meta.get_field(parte)
+        self.diccionario = None
+        if self.tipo == DICCIONARIO:
+            self.diccionario = [valor for valor, _ in campo.choices]
+            self.codigos = {valor: codigo for codigo, valor in enumerate(self.diccionario)}
+            self.dtype = np.dtype('uint8')
+        elif self.tipo == TEXTO:
+            self.dtype = np.dtype(f'U{campo.max_length}')
+        else:
+            self.dtype = np.dtype(self.tipo)
+        return self
+
+    def convertir(self, valores):
+        if self.tipo == DICCIONARIO:
+            return np.array([self.codigos.get(valor, DESCONOCIDO) for valor in valores], dtype=self.dtype)
+        if self.tipo == TEXTO:
+            return np.array(['' if valor is None else valor for valor in valores], dtype=self.dtype)
+        if self.tipo == FECHA_HORA:
+            # Sin zona horaria: los instantes se guardan en UTC
+            return np.array(
+                [None if valor is None else timezone.make_naive(valor, dt_timezone.utc) for valor in valores],
+                dtype=self.dtype,
+            )
+        if self.dtype.kind in 'iu':
+            return np.array([NULO if valor is None else valor for valor in valores], dtype=self.dtype)
+        if self.dtype.kind == 'f':
+            return np.array([np.nan if valor is None else valor for valor in valores], dtype=self.dtype)
+        return np.array(valores, dtype=self.dtype)
+
+    def describir(self):
+        descripcion = {'dtype': self.dtype.str, 'tipo': self.tipo}
+        if self.diccionario is not None:
+            descripcion['diccionario'] = self.diccionario
+        return descripcion
+
+
+# Tablas de la instantánea: modelo y columnas. Las filas van ordenadas por id.
+TABLAS = {
+    'consultas': (ConsultaMedica, [
+        Columna('id'),
+        Columna('paciente_id'),
+        Columna('medico_id'),
+        Columna('especialidad_id', 'medico__especialidad_id'),
+        Columna('fecha_consulta', tipo=FECHA_HORA),
+        Columna('estado', tipo=DICCIONARIO),
+    ]),
+    'citas': (Cita, [
+        Columna('id'),
+        Columna('paciente_id'),
+        Columna('medico_id'),
+        Columna('especialidad_id', 'medico__especialidad_id'),
+        Columna('fecha_hora', tipo=FECHA_HORA),
+        Columna('created_at', tipo=FECHA_HORA),
+        Columna('duracion_minutos', tipo='int32'),
+        Columna('tipo_cita', tipo=DICCIONARIO),
+        Columna('estado', tipo=DICCIONARIO),
+    ]),
+    'recetas': (RecetaMedica, [
+        Columna('id'),
+        Columna('tratamiento_id'),
+        Columna('consulta_id', 'tratamiento__consulta_id'),
+        Columna('paciente_id', 'tratamiento__consulta__paciente_id'),
+        Columna('medico_id', 'tratamiento__consulta__medico_id'),
+        Columna('medicamento_id'),
+        Columna('frecuencia', tipo=DICCIONARIO),
+        Columna('dosis_cantidad', tipo='float64'),
+        Columna('duracion_dias', tipo='int32'),
+        Columna('fecha_inicio', tipo=FECHA),
+        Columna('fecha_fin', tipo=FECHA),
+    ]),
+    'pacientes': (Paciente, [
+        Columna('id'),
+        Columna('fecha_nacimiento', tipo=FECHA),
+        Columna('tipo_sangre', tipo=DICCIONARIO),
+        Columna('activo', tipo='bool'),
+    ]),
+    'medicos': (Medico, [
+        Columna('id'),
+        Columna('nombre', tipo=TEXTO),
+        Columna('apellido', tipo=TEXTO),
+        Columna('especialidad_id'),
+        Columna('activo', tipo='bool'),
+    ]),
+    'especialidades': (Especialidad, [
+        Columna('id'),
+        Columna('nombre', tipo=TEXTO),
+    ]),
+    'medicamentos': (Medicamento, [
+        Columna('id'),
+        Columna('nombre', tipo=TEXTO),
+        Columna('laboratorio', tipo=TEXTO),
+        Columna('stock', tipo='int32'),
+        Columna('precio_unitario', tipo='float64'),
+    ]),
+}
+
+
+def _valor_nulo(dtype):
+    """
+    Valor con que se representan los nulos en una columna del dtype dado.
+    """
+    if dtype.kind == 'U':
+        return ''
+    if dtype.kind == 'u':
+        return DESCONOCIDO
+    if dtype.kind == 'i':
+        return NULO
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'M':
+        return np.datetime64('NaT')
+    return None
+
+
+def directorio_sede(alias=None):
+    return Path(settings.INSTANTANEAS_DIR) / (alias or alias_actual())
+
+
+def _exportar_tabla(destino, modelo, columnas, lote):
+    columnas = [columna.preparar(modelo) for columna in columnas]
+    filas = modelo._base_manager.order_by('pk').values_list(*(columna.origen for columna in columnas))
+    total = filas.count()
+    destino.mkdir(parents=True)
+    arreglos = [
+        np.lib.format.open_memmap(destino / f'{columna.nombre}.npy', mode='w+', dtype=columna.dtype, shape=(total,))
+        for columna in columnas
+    ]
+    escritas = 0
+    pendientes = []
+
+    def escribir(pendientes, escritas):
+        bloque = pendientes[:total - escritas]
+        for columna, arreglo, valores in zip(columnas, arreglos, zip(*bloque)):
+            arreglo[escritas:escritas + len(bloque)] = columna.convertir(valores)
+        return escritas + len(bloque)
+
+    for fila in filas.iterator(chunk_size=lote):
+        pendientes.append(fila)
+        if len(pendientes) >= lote:
+            escritas = escribir(pendientes, escritas)
+            pendientes = []
+    if pendientes:
+        escritas = escribir(pendientes, escritas)
+    for arreglo in arreglos:
+        arreglo.flush()
+    return {'filas': total, 'columnas': {columna.nombre: columna.describir() for columna in columnas}}
+
+
+def _lectura_consistente(alias):
+    # Primera sentencia de la transacción: todas las tablas ven el mismo momento
+    conexion = connections[alias]
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+
+
+def _publicar(raiz, nombre):
+    temporal = raiz / f'.ACTUAL.{os.getpid()}'
+    temporal.write_text(nombre)
+    os.replace(temporal, raiz / 'ACTUAL')
+
+
+def _podar(raiz, conservar):
+    instantaneas = sorted(ruta for ruta in raiz.iterdir() if ruta.is_dir() and not ruta.name.startswith('.'))
+    for ruta in instantaneas[:-conservar]:
+        shutil.rmtree(ruta, ignore_errors=True)
+
+
+def crear(lote=TAMANO_LOTE, conservar=None):
+    """
+    Exporta la instantánea de la sede actual, la publica como la vigente y
+    borra las más antiguas. Devuelve su directorio.
+    """
+    alias = alias_actual()
+    conservar = conservar or getattr(settings, 'INSTANTANEAS_CONSERVAR', 3)
+    raiz = directorio_sede(alias)
+    creada = timezone.now()
+    nombre = creada.strftime('%Y%m%dT%H%M%SZ')
+    temporal = raiz / f'.{nombre}.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    try:
+        with transaction.atomic(using=alias):
+            _lectura_consistente(alias)
+            tablas = {
+                tabla: _exportar_tabla(temporal / tabla, modelo, columnas, lote)
+                for tabla, (modelo, columnas) in TABLAS.items()
+            }
+        manifiesto = {'creada': creada.isoformat(), 'sede': alias, 'tablas': tablas}
+        (temporal / 'manifiesto.json').write_text(json.dumps(manifiesto, indent=2, ensure_ascii=False))
+        destino = raiz / nombre
+        shutil.rmtree(destino, ignore_errors=True)
+        temporal.rename(destino)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+    _publicar(raiz, nombre)
+    _podar(raiz, conservar)
+    return destino
+
+
+class InstantaneaNoDisponible(Exception):
+    """
+    La sede aún no tiene una instantánea publicada.
+    """
+
+
+class TablaInstantanea:
+    """
+    Tabla de una instantánea. Cada columna es un arreglo mapeado en memoria,
+    de solo lectura, que se abre la primera vez que se usa.
+    """
+    def __init__(self, ruta, descripcion):
+        self.ruta = ruta
+        self.filas = descripcion['filas']
+        self.columnas = descripcion['columnas']
+        self._abiertas = {}
+
+    def __len__(self):
+        return self.filas
+
+    def __getitem__(self, columna):
+        if columna not in self.columnas:
+            raise KeyError(columna)
+        if columna not in self._abiertas:
+            self._abiertas[columna] = np.load(self.ruta / f'{columna}.npy', mmap_mode='r')
+        return self._abiertas[columna]
+
+    def diccionario(self, columna):
+        return self.columnas[columna].get('diccionario')
+
+    def codigo(self, columna, valor):
+        """
+        Código con que se guardó `valor` en una columna codificada con diccionario.
+        """
+        try:
+            return self.diccionario(columna).index(valor)
+        except ValueError:
+            raise KeyError(f'{valor!r} no está en el diccionario de {columna}')
+
+    def decodificar(self, columna, codigos=None):
+        """
+        Valores originales de los códigos (toda la columna si no se indican).
+        """
+        codigos = self[columna] if codigos is None else codigos
+        diccionario = np.array(self.diccionario(columna) + [None], dtype=object)
+        return diccionario[np.minimum(codigos, len(diccionario) - 1)]
+
+    def _valor(self, columna, valor):
+        descripcion = self.columnas[columna]
+        if descripcion['tipo'] == DICCIONARIO:
+            return self.codigo(columna, valor)
+        if descripcion['tipo'] == FECHA_HORA:
+            if not isinstance(valor, datetime):
+                valor = timezone.make_aware(datetime.combine(valor, time.min))
+            return np.datetime64(timezone.make_naive(valor, dt_timezone.utc), 's')
+        if descripcion['tipo'] == FECHA and isinstance(valor, date):
+            return np.datetime64(valor, 'D')
+        return valor
+
+    def filtrar(self, mascara=None, **condiciones):
+        """
+        Máscara booleana de las filas que cumplen todas las condiciones, con
+        la sintaxis del ORM: columna=valor, columna__in=[...] y columna__gt,
+        __gte, __lt, __lte. Las fechas sin hora se toman a medianoche local.
+        """
+        operaciones = {
+            'exact': np.equal, 'gt': np.greater, 'gte': np.greater_equal, 'lt': np.less, 'lte': np.less_equal,
+        }
+        resultado = np.ones(self.filas, dtype=bool) if mascara is None else mascara.copy()
+        for condicion, valor in condiciones.items():
+            columna, _, operacion = condicion.partition('__')
+            operacion = operacion or 'exact'
+            datos = self[columna]
+            if operacion == 'in':
+                resultado &= np.isin(datos, [self._valor(columna, v) for v in valor])
+            elif operacion in operaciones:
+                resultado &= operaciones[operacion](datos, self._valor(columna, valor))
+            else:
+                raise ValueError(f'Operación no soportada: {operacion}')
+        return resultado
+
+    def agrupar(self, por, mascara=None, sumar=None):
+        """
+        Cantidad de filas (o suma de la columna `sumar`) por valor de la
+        columna `por`, entre las filas de la máscara. Devuelve un dict.
+        """
+        claves = self[por] if mascara is None else self[por][mascara]
+        valores, inversa = np.unique(claves, return_inverse=True)
+        pesos = None
+        if sumar is not None:
+            pesos = self[sumar] if mascara is None else self[sumar][mascara]
+        totales = np.bincount(inversa, weights=pesos, minlength=len(valores))
+        if self.diccionario(por) is not None:
+            valores = self.decodificar(por, valores)
+        return {clave.item() if hasattr(clave, 'item') else clave: total.item() for clave, total in zip(valores, totales)}
+
+    def unir(self, columna, dimension, atributo):
+        """
+        Valor de `atributo` de la tabla `dimension` para cada fila, siguiendo
+        la clave foránea `columna` (las dimensiones están ordenadas por id).
+        Las filas sin correspondencia quedan con el valor nulo del tipo
+        (ver _valor_nulo) y se informan en la máscara devuelta:
+        (valores, encontradas).
+        """
+        ids = dimension['id']
+        claves = self[columna]
+        atributos = dimension[atributo]
+        nulo = _valor_nulo(atributos.dtype)
+        if not len(ids):
+            return np.full(len(claves), nulo, dtype=atributos.dtype), np.zeros(len(claves), dtype=bool)
+        posicion = np.minimum(np.searchsorted(ids, claves), len(ids) - 1)
+        encontradas = ids[posicion] == claves
+        return np.where(encontradas, atributos[posicion], nulo), encontradas
+
+
+class Instantanea:
+    """
+    Instantánea publicada de una sede, abierta en modo de solo lectura.
+    """
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.manifiesto = json.loads((self.ruta / 'manifiesto.json').read_text())
+        self._tablas = {}
+
+    @classmethod
+    def abrir(cls, alias=None):
+        """
+        Abre la instantánea vigente de la sede (la actual si no se indica).
+        """
+        raiz = directorio_sede(alias)
+        try:
+            nombre = (raiz / 'ACTUAL').read_text().strip()
+        except FileNotFoundError:
+            raise InstantaneaNoDisponible(f'No hay instantáneas en {raiz}.')
+        return cls(raiz / nombre)
+
+    @property
+    def creada(self):
+        return datetime.fromisoformat(self.manifiesto['creada'])
+
+    @property
+    def tablas(self):
+        return list(self.manifiesto['tablas'])
+
+    def __getitem__(self, tabla):
+        if tabla not in self._tablas:
+            self._tablas[tabla] = TablaInstantanea(self.ruta / tabla, self.manifiesto['tablas'][tabla])
+        return self._tablas[tabla]
@@ -0,0 +1,189 @@
+"""
+Lecturas por lotes: varias peticiones GET de la API en un solo viaje.
+
+POST /api/batch/ recibe {"peticiones": [{"id": "p1", "url": "/api/pacientes/1/"}, ...]}
+(o directamente las URL) y responde {"respuestas": [{"id", "status", "body"}]}
+en el mismo orden. Cada subpetición pasa por la vista de DRF de su ruta con la
+autenticación, la sede y los permisos de la petición original.
+
+Las subpeticiones se ejecutan una tras otra en el hilo de la petición y
+sobre su misma conexión a la base de datos. En Django cada hilo abre su
+propia conexión, así que repartirlas en hilos no compartiría una conexión
+sino que abriría una por hilo. Para ahorrar viajes a la base:
+- las lecturas de detalle de un mismo recurso (/api/pacientes/1/,
+  /api/pacientes/2/, ...) se resuelven juntas con una sola consulta pk IN (...);
+- las URL repetidas se ejecutan una sola vez.
+"""
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import exceptions, status
+from rest_framework.generics import GenericAPIView
+from rest_framework.mixins import RetrieveModelMixin
+from rest_framework.views import APIView
+
+# Atributos que los middleware dejan en la petición y que las subpeticiones heredan
+ATRIBUTOS_HEREDADOS = ('user', 'session', 'clinica_id')
+
+
+def maximo_peticiones():
+    return getattr(settings, 'LOTE_PETICIONES_MAXIMO', 25)
+
+
+class _Subpeticion:
+    def __init__(self, identificador, url):
+        partes = urlsplit(url)
+        self.id = identificador
+        self.url = url
+        self.ruta = partes.path
+        self.consulta = partes.query
+        self.resultado = None
+        try:
+            self.coincidencia = resolve(self.ruta)
+        except Resolver404:
+            self.coincidencia = None
+
+
+def leer_peticiones(datos):
+    """
+    Valida el cuerpo del lote y devuelve las subpeticiones.
+    """
+    peticiones = datos.get('peticiones') if isinstance(datos, dict) else None
+    if not isinstance(peticiones, list) or not peticiones:
+        raise exceptions.ValidationError({'peticiones': 'Debe ser una lista de peticiones GET.'})
+    if len(peticiones) > maximo_peticiones():
+        raise exceptions.ValidationError(
+            {'peticiones': f'Se pueden enviar a lo más {maximo_peticiones()} peticiones por lote.'}
+        )
+    subpeticiones = []
+    for indice, peticion in enumerate(peticiones):
+        if isinstance(peticion, str):
+            peticion = {'url': peticion}
+        url = peticion.get('url') if isinstance(peticion, dict) else None
+        if not isinstance(url, str) or not url.startswith('/'):
+            raise exceptions.ValidationError({'peticiones': f'La petición {indice} no tiene una url válida.'})
+        subpeticiones.append(_Subpeticion(peticion.get('id', indice), url))
+    return subpeticiones
+
+
+def _peticion_get(request, ruta, consulta):
+    """
+    Petición GET para la ruta con las cabeceras, el usuario y la sesión de la original.
+    """
+    original = request._request
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = ruta
+    sub.META = {clave: valor for clave, valor in original.META.items() if clave not in ('wsgi.input', 'CONTENT_TYPE')}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=ruta, QUERY_STRING=consulta, CONTENT_LENGTH='0')
+    sub.GET = QueryDict(consulta)
+    for atributo in ATRIBUTOS_HEREDADOS:
+        if hasattr(original, atributo):
+            setattr(sub, atributo, getattr(original, atributo))
+    return sub
+
+
+def _error(codigo, detalle):
+    return codigo, {'detail': str(detalle)}
+
+
+def _vista(subpeticion):
+    coincidencia = subpeticion.coincidencia
+    return getattr(coincidencia.func, 'cls', None) if coincidencia else None
+
+
+def _agrupable(subpeticion):
+    """
+    Lectura de detalle por pk con la implementación estándar de DRF, que se
+    puede resolver junto con otras de la misma ruta.
+    """
+    vista = _vista(subpeticion)
+    return (
+        vista is not None
+        and issubclass(vista, RetrieveModelMixin)
+        and vista.retrieve is RetrieveModelMixin.retrieve
+        and vista.get_object is GenericAPIView.get_object
+        and vista.lookup_field == 'pk'
+        and not subpeticion.consulta
+        and not subpeticion.coincidencia.args
+        and set(subpeticion.coincidencia.kwargs) == {'pk'}
+    )
+
+
+def _ejecutar_agrupadas(request, subpeticiones):
+    """
+    Resuelve lecturas de detalle de una misma vista con una sola consulta.
+    Si la vista rechaza la petición, las deja sin resultado para que se
+    ejecuten de a una y cada una reciba su propio error.
+    """
+    primera = subpeticiones[0]
+    funcion = primera.coincidencia.func
+    vista = funcion.cls(**funcion.initkwargs)
+    vista.setup(_peticion_get(request, primera.ruta, ''), **primera.coincidencia.kwargs)
+    peticion = vista.initialize_request(vista.request, **vista.kwargs)
+    vista.request = peticion
+    vista.headers = vista.default_response_headers
+    try:
+        vista.initial(peticion, **vista.kwargs)
+        pks = {int(subpeticion.coincidencia.kwargs['pk']) for subpeticion in subpeticiones}
+        objetos = {obj.pk: obj for obj in vista.filter_queryset(vista.get_queryset()).filter(pk__in=pks)}
+    except exceptions.APIException:
+        return
+    for subpeticion in subpeticiones:
+        obj = objetos.get(int(subpeticion.coincidencia.kwargs['pk']))
+        if obj is None:
+            subpeticion.resultado = _error(status.HTTP_404_NOT_FOUND, exceptions.NotFound.default_detail)
+            continue
+        try:
+            vista.check_object_permissions(peticion, obj)
+        except exceptions.APIException as error:
+            subpeticion.resultado = _error(error.status_code, error.detail)
+            continue
+        subpeticion.resultado = status.HTTP_200_OK, vista.get_serializer(obj).data
+
+
+def _ejecutar(request, subpeticion):
+    if subpeticion.coincidencia is None:
+        return _error(status.HTTP_404_NOT_FOUND, exceptions.NotFound.default_detail)
+    vista = _vista(subpeticion)
+    if vista is None or not issubclass(vista, APIView) or not getattr(vista, 'admite_lote', True):
+        return _error(status.HTTP_400_BAD_REQUEST, 'Esta ruta no se puede incluir en un lote.')
+    coincidencia = subpeticion.coincidencia
+    respuesta = coincidencia.func(
+        _peticion_get(request, subpeticion.ruta, subpeticion.consulta), *coincidencia.args, **coincidencia.kwargs,
+    )
+    if respuesta.streaming:
+        respuesta.close()
+        return _error(status.HTTP_400_BAD_REQUEST, 'Esta ruta no se puede incluir en un lote.')
+    if hasattr(respuesta, 'data'):
+        return respuesta.status_code, respuesta.data
+    return respuesta.status_code, respuesta.content.decode(respuesta.charset)
+
+
+def ejecutar_lote(request, subpeticiones):
+    """
+    Ejecuta las subpeticiones y devuelve sus respuestas en el orden recibido.
+    """
+    unicas = {}
+    for subpeticion in subpeticiones:
+        unicas.setdefault(subpeticion.url, subpeticion)
+
+    grupos = {}
+    for subpeticion in unicas.values():
+        if _agrupable(subpeticion):
+            grupos.setdefault(subpeticion.coincidencia.func, []).append(subpeticion)
+    for grupo in grupos.values():
+        if len(grupo) > 1:
+            _ejecutar_agrupadas(request, grupo)
+
+    for subpeticion in unicas.values():
+        if subpeticion.resultado is None:
+            subpeticion.resultado = _ejecutar(request, subpeticion)
+
+    respuestas = []
+    for subpeticion in subpeticiones:
+        codigo, cuerpo = unicas[subpeticion.url].resultado
+        respuestas.append({'id': subpeticion.id, 'status': codigo, 'body': cuerpo})
+    return respuestas
@@ -0,0 +1,32 @@
+"""
+Comando para exportar la instantánea columnar de los datos clínicos de cada sede.
+Uso: python manage.py crear_instantanea --lote 5000 --conservar 3
+"""
+from django.core.management.base import BaseCommand
+
+from gestion_clinica import instantaneas
+from gestion_clinica.sedes import alias_sedes, en_sede
+
+
+class Command(BaseCommand):
+    help = 'Exporta consultas, citas, recetas y sus dimensiones a arreglos .npy para análisis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=instantaneas.TAMANO_LOTE,
+            help='Filas leídas y escritas por lote.',
+        )
+        parser.add_argument(
+            '--conservar', type=int, default=None,
+            help='Instantáneas que se conservan por sede (INSTANTANEAS_CONSERVAR por defecto).',
+        )
+        parser.add_argument(
+            '--sede', action='append',
+            help='Alias de base de datos de la sede; se puede repetir. Por defecto, todas.',
+        )
+
+    def handle(self, *args, **options):
+        for alias in options['sede'] or alias_sedes():
+            with en_sede(alias):
+                ruta = instantaneas.crear(max(1, options['lote']), options['conservar'] and max(1, options['conservar']))
+            self.stdout.write(self.style.SUCCESS(f'Instantánea de {alias} publicada en {ruta}.'))
@@ -0,0 +1,42 @@
+"""
+Comando para generar y despachar los recordatorios de citas de todas las sedes.
+Uso: python manage.py enviar_recordatorios --concurrencia 8 --lote 500
+"""
+from django.core.management.base import BaseCommand
+
+from gestion_clinica import recordatorios
+from gestion_clinica.sedes import alias_sedes, en_sede
+
+
+class Command(BaseCommand):
+    help = 'Genera los recordatorios de las próximas citas y despacha la bandeja de salida.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia', type=int, default=4,
+            help='Cantidad de workers que despachan en paralelo.',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Recordatorios reservados y enviados por lote.',
+        )
+        parser.add_argument(
+            '--solo-generar', action='store_true',
+            help='Solo escribir los recordatorios en la bandeja de salida.',
+        )
+        parser.add_argument(
+            '--solo-despachar', action='store_true',
+            help='Solo enviar los recordatorios pendientes.',
+        )
+
+    def handle(self, *args, **options):
+        for alias in alias_sedes():
+            with en_sede(alias):
+                if not options['solo_despachar']:
+                    generados = recordatorios.generar()
+                    self.stdout.write(f'{alias}: {generados} recordatorios agregados a la bandeja de salida.')
+                if not options['solo_generar']:
+                    resultado = recordatorios.despachar(options['concurrencia'], max(1, options['lote']))
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{alias}: {resultado['enviados']} recordatorios enviados, {resultado['fallidos']} con error."
+                    ))
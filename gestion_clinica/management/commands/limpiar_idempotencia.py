@@ -0,0 +1,25 @@
+"""
+Comando para borrar las claves de idempotencia vencidas de todas las sedes.
+Uso: python manage.py limpiar_idempotencia --lote 1000
+"""
+from django.core.management.base import BaseCommand
+
+from gestion_clinica import idempotencia
+from gestion_clinica.sedes import alias_sedes, en_sede
+
+
+class Command(BaseCommand):
+    help = 'Borra por lotes las claves Idempotency-Key cuya retención venció.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=idempotencia.TAMANO_LOTE,
+            help='Filas borradas por sentencia.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in alias_sedes():
+            with en_sede(alias):
+                total += idempotencia.limpiar(max(1, options['lote']))
+        self.stdout.write(self.style.SUCCESS(f'{total} claves de idempotencia vencidas borradas.'))
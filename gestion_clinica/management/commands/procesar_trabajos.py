@@ -0,0 +1,103 @@
+"""
+Comando para ejecutar los workers de la cola de trabajos en segundo plano.
+Uso: python manage.py procesar_trabajos --concurrencia 4 --modo hilos
+"""
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from gestion_clinica import trabajos
+
+
+def _ejecutar_proceso(indice, intervalo, una_vez):
+    """
+    Punto de entrada de cada proceso hijo del pool.
+    """
+    django.setup()
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: detener.set())
+    signal.signal(signal.SIGINT, lambda *args: detener.set())
+    trabajos.trabajar(trabajos.nombre_worker(indice), detener, intervalo, una_vez)
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos pendientes de la cola con un pool de hilos o procesos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia', type=int,
+            default=getattr(settings, 'TRABAJOS_CONCURRENCIA', 2),
+            help='Cantidad de workers simultáneos.',
+        )
+        parser.add_argument(
+            '--modo', choices=['hilos', 'procesos'], default='hilos',
+            help='Ejecutar los workers como hilos o como procesos.',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando la cola está vacía.',
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Terminar cuando no queden trabajos pendientes.',
+        )
+
+    def handle(self, *args, **options):
+        concurrencia = max(1, options['concurrencia'])
+        intervalo = options['intervalo']
+        una_vez = options['una_vez']
+
+        recuperados = trabajos.recuperar_huerfanos()
+        if recuperados:
+            self.stdout.write(self.style.WARNING(f'{recuperados} trabajos huérfanos devueltos a la cola.'))
+
+        self.stdout.write(f"Iniciando {concurrencia} workers en modo {options['modo']}...")
+        if options['modo'] == 'procesos':
+            self._ejecutar_procesos(concurrencia, intervalo, una_vez)
+        else:
+            self._ejecutar_hilos(concurrencia, intervalo, una_vez)
+        self.stdout.write(self.style.SUCCESS('Workers detenidos.'))
+
+    def _ejecutar_hilos(self, concurrencia, intervalo, una_vez):
+        detener = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: detener.set())
+        signal.signal(signal.SIGINT, lambda *args: detener.set())
+        hilos = [
+            threading.Thread(
+                target=trabajos.trabajar,
+                args=(trabajos.nombre_worker(indice), detener, intervalo, una_vez),
+                daemon=True,
+            )
+            for indice in range(concurrencia)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        # join con timeout para que el hilo principal siga atendiendo señales
+        while any(hilo.is_alive() for hilo in hilos):
+            for hilo in hilos:
+                hilo.join(timeout=0.5)
+
+    def _ejecutar_procesos(self, concurrencia, intervalo, una_vez):
+        # Las conexiones abiertas no deben heredarse entre procesos
+        connections.close_all()
+        procesos = [
+            multiprocessing.Process(target=_ejecutar_proceso, args=(indice, intervalo, una_vez))
+            for indice in range(concurrencia)
+        ]
+        for proceso in procesos:
+            proceso.start()
+
+        def terminar(*args):
+            for proceso in procesos:
+                if proceso.is_alive():
+                    proceso.terminate()
+
+        signal.signal(signal.SIGTERM, terminar)
+        signal.signal(signal.SIGINT, terminar)
+        for proceso in procesos:
+            proceso.join()
@@ -0,0 +1,25 @@
+"""
+Comando para reconstruir la tabla de medicación activa por paciente.
+Uso: python manage.py reconstruir_medicacion_activa --lote 2000
+"""
+from django.core.management.base import BaseCommand
+
+from gestion_clinica import medicacion
+from gestion_clinica.sedes import alias_sedes, en_sede
+
+
+class Command(BaseCommand):
+    help = 'Regenera la tabla desnormalizada MedicacionActiva a partir de las recetas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=medicacion.TAMANO_LOTE,
+            help='Filas leídas e insertadas por lote.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in alias_sedes():
+            with en_sede(alias):
+                total += medicacion.reconstruir(max(1, options['lote']))
+        self.stdout.write(self.style.SUCCESS(f'{total} registros de medicación activa reconstruidos.'))
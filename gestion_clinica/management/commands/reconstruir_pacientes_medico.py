@@ -0,0 +1,25 @@
+"""
+Comando para reconstruir la relación paciente–médico.
+Uso: python manage.py reconstruir_pacientes_medico --lote 2000
+"""
+from django.core.management.base import BaseCommand
+
+from gestion_clinica import relaciones
+from gestion_clinica.sedes import alias_sedes, en_sede
+
+
+class Command(BaseCommand):
+    help = 'Regenera la tabla desnormalizada PacienteMedico a partir de las consultas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=relaciones.TAMANO_LOTE,
+            help='Filas insertadas por lote.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in alias_sedes():
+            with en_sede(alias):
+                total += relaciones.reconstruir(max(1, options['lote']))
+        self.stdout.write(self.style.SUCCESS(f'{total} relaciones paciente–médico reconstruidas.'))
@@ -0,0 +1,31 @@
+"""
+Comando para revisar, al arrancar el servicio, las opciones de configuración que reducen el rendimiento.
+Uso: python manage.py revisar_rendimiento --estricto
+"""
+from django.core import checks
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_clinica.checks import ETIQUETA
+
+
+class Command(BaseCommand):
+    help = 'Advierte si está activa alguna opción de configuración que reduce el rendimiento.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--estricto', action='store_true',
+            help='Termina con error si hay advertencias (para detener el despliegue).',
+        )
+
+    def handle(self, *args, **options):
+        avisos = checks.run_checks(tags=[ETIQUETA], include_deployment_checks=True)
+        if not avisos:
+            self.stdout.write(self.style.SUCCESS('Sin advertencias de rendimiento.'))
+            return
+        for aviso in avisos:
+            self.stderr.write(self.style.WARNING(f'{aviso.id}: {aviso.msg}'))
+            if aviso.hint:
+                self.stderr.write(f'    {aviso.hint}')
+        if options['estricto']:
+            raise CommandError(f'{len(avisos)} advertencias de rendimiento.')
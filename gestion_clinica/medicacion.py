@@ -0,0 +1,130 @@
+"""
+Medicación por paciente y detección de terapias duplicadas.
+Trabaja sobre la tabla desnormalizada MedicacionActiva, de modo que revisar
+si un paciente ya tiene vigente un medicamento es una sola búsqueda por el
+índice (paciente, medicamento, fecha_fin).
+
+La revisión y el guardado de la receta deben ir en una misma transacción:
+revisar_duplicado() bloquea la fila del paciente (SELECT ... FOR UPDATE), de
+modo que dos recetas simultáneas del mismo paciente se revisan una después
+de la otra y la segunda ve a la primera.
+"""
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Subquery
+from django.utils import timezone
+
+from .models import ConsultaMedica, MedicacionActiva, Paciente, RecetaMedica
+from .posologia import parsear_duracion
+from .sedes import alias_actual
+
+# Filas insertadas por lote al reconstruir la tabla
+TAMANO_LOTE = 2000
+
+
+def vigencia_receta(tratamiento, duracion):
+    """
+    Vigencia (inicio, fin) que tendría una receta con esa duración escrita,
+    con la misma regla que RecetaMedica.actualizar_posologia(). Si el
+    tratamiento aún no tiene fecha_inicio (no se ha guardado), se toma de su
+    consulta; sin consulta devuelve None.
+    """
+    inicio = tratamiento.fecha_inicio
+    if inicio is None:
+        fecha_consulta = (
+            ConsultaMedica.objects.filter(pk=tratamiento.consulta_id)
+            .values_list('fecha_consulta', flat=True)
+            .first()
+        )
+        if fecha_consulta is None:
+            return None
+        inicio = timezone.localtime(fecha_consulta).date()
+    dias = parsear_duracion(duracion)
+    if dias is None:
+        dias = max(tratamiento.duracion_dias or 0, 0)
+    return inicio, inicio + timedelta(days=max(dias - 1, 0))
+
+
+def _paciente(tratamiento):
+    return Subquery(ConsultaMedica.objects.filter(pk=tratamiento.consulta_id).values('paciente_id'))
+
+
+def recetas_superpuestas(tratamiento, medicamento, duracion, receta=None):
+    """
+    Medicación vigente del mismo paciente y medicamento que se superpone con la
+    receta propuesta. El paciente se resuelve en una subconsulta, así que todo
+    es una única consulta SQL sobre el índice.
+    """
+    vigencia = vigencia_receta(tratamiento, duracion)
+    if vigencia is None:
+        return MedicacionActiva.objects.none()
+    inicio, fin = vigencia
+    superpuestas = MedicacionActiva.objects.filter(
+        paciente_id=_paciente(tratamiento),
+        medicamento=medicamento,
+        fecha_fin__gte=inicio,
+        fecha_inicio__lte=fin,
+    )
+    if receta is not None and receta.pk is not None:
+        superpuestas = superpuestas.exclude(receta_id=receta.pk)
+    return superpuestas
+
+
+def mensaje_duplicado(tratamiento, medicamento, duracion, receta=None):
+    """
+    Devuelve el aviso de terapia duplicada, o None si no hay superposición.
+    """
+    conflictos = list(
+        recetas_superpuestas(tratamiento, medicamento, duracion, receta)
+        .order_by('fecha_inicio')
+        .values_list('receta_id', 'fecha_inicio', 'fecha_fin')[:3]
+    )
+    if not conflictos:
+        return None
+    detalle = ', '.join(
+        f"receta #{pk} del {inicio:%d/%m/%Y} al {fin:%d/%m/%Y}" for pk, inicio, fin in conflictos
+    )
+    return f"El paciente ya tiene {medicamento} vigente en esas fechas ({detalle})."
+
+
+def revisar_duplicado(tratamiento, medicamento, duracion, receta=None):
+    """
+    Como mensaje_duplicado(), pero antes bloquea al paciente hasta el fin de
+    la transacción en curso, para que la revisión y el guardado de la receta
+    no se intercalen con los de otra receta del mismo paciente.
+    """
+    alias = alias_actual()
+    if connections[alias].in_atomic_block:
+        list(Paciente.objects.using(alias).select_for_update().filter(pk=_paciente(tratamiento)).values_list('pk'))
+    return mensaje_duplicado(tratamiento, medicamento, duracion, receta)
+
+
+def reconstruir(lote=TAMANO_LOTE):
+    """
+    Regenera MedicacionActiva desde las recetas, en una sola transacción para
+    que las validaciones nunca vean la tabla a medio llenar.
+    Devuelve la cantidad de filas creadas.
+    """
+    filas = (
+        RecetaMedica.objects
+        .filter(fecha_fin__isnull=False)
+        .order_by('pk')
+        .values_list('pk', 'tratamiento__consulta__paciente_id', 'medicamento_id', 'fecha_inicio', 'fecha_fin')
+    )
+    total = 0
+    with transaction.atomic(using=alias_actual()):
+        MedicacionActiva.objects.all().delete()
+        pendientes = []
+        for receta_id, paciente_id, medicamento_id, inicio, fin in filas.iterator(chunk_size=lote):
+            pendientes.append(MedicacionActiva(
+                receta_id=receta_id, paciente_id=paciente_id, medicamento_id=medicamento_id,
+                fecha_inicio=inicio, fecha_fin=fin,
+            ))
+            if len(pendientes) >= lote:
+                MedicacionActiva.objects.bulk_create(pendientes)
+                total += len(pendientes)
+                pendientes = []
+        MedicacionActiva.objects.bulk_create(pendientes)
+        total += len(pendientes)
+    return total
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+# Índices de expresión para las búsquedas istartswith de los autocompletados.
+# Django traduce istartswith en PostgreSQL a UPPER(campo::text) LIKE UPPER('x%'),
+# que solo puede usar un índice sobre esa misma expresión con text_pattern_ops.
+INDICES_PREFIJO = [
+    ('paciente_apellido_upper_idx', 'gestion_clinica_paciente', 'apellido'),
+    ('paciente_nombre_upper_idx', 'gestion_clinica_paciente', 'nombre'),
+    ('medico_apellido_upper_idx', 'gestion_clinica_medico', 'apellido'),
+    ('medico_nombre_upper_idx', 'gestion_clinica_medico', 'nombre'),
+    ('medicamento_nombre_upper_idx', 'gestion_clinica_medicamento', 'nombre'),
+]
+
+
+def crear_indices_prefijo(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, tabla, columna in INDICES_PREFIJO:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} (UPPER({columna}::text) text_pattern_ops)'
+        )
+
+
+def eliminar_indices_prefijo(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES_PREFIJO:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0004_trabajo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultamedica',
+            index=models.Index(fields=['-fecha_consulta'], name='consulta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicamento',
+            index=models.Index(fields=['nombre'], name='medicamento_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medico',
+            index=models.Index(fields=['apellido', 'nombre'], name='medico_apellido_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['apellido', 'nombre'], name='paciente_apellido_idx'),
+        ),
+        migrations.RunPython(crear_indices_prefijo, eliminar_indices_prefijo),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:04
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Objetos de PostgreSQL para la búsqueda de texto completo. En SQLite el índice
+# equivalente (FTS5) se crea en post_migrate, ver gestion_clinica.busqueda.
+SQL_POSTGRESQL = """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION es_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION gestion_clinica_consulta_busqueda() RETURNS trigger AS $$
+BEGIN
+    NEW.busqueda :=
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.motivo, '')), 'A') ||
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.diagnostico, '')), 'B');
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER consulta_busqueda_trg
+    BEFORE INSERT OR UPDATE ON gestion_clinica_consultamedica
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_consulta_busqueda();
+
+CREATE OR REPLACE FUNCTION gestion_clinica_tratamiento_busqueda() RETURNS trigger AS $$
+BEGIN
+    NEW.busqueda := setweight(to_tsvector('es_unaccent', coalesce(NEW.descripcion, '')), 'A');
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tratamiento_busqueda_trg
+    BEFORE INSERT OR UPDATE ON gestion_clinica_tratamiento
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_tratamiento_busqueda();
+
+UPDATE gestion_clinica_consultamedica SET busqueda =
+    setweight(to_tsvector('es_unaccent', coalesce(motivo, '')), 'A') ||
+    setweight(to_tsvector('es_unaccent', coalesce(diagnostico, '')), 'B');
+UPDATE gestion_clinica_tratamiento SET busqueda =
+    setweight(to_tsvector('es_unaccent', coalesce(descripcion, '')), 'A');
+
+CREATE INDEX consulta_busqueda_gin ON gestion_clinica_consultamedica USING gin (busqueda);
+CREATE INDEX tratamiento_busqueda_gin ON gestion_clinica_tratamiento USING gin (busqueda);
+"""
+
+SQL_POSTGRESQL_REVERSA = """
+DROP INDEX IF EXISTS consulta_busqueda_gin;
+DROP INDEX IF EXISTS tratamiento_busqueda_gin;
+DROP TRIGGER IF EXISTS consulta_busqueda_trg ON gestion_clinica_consultamedica;
+DROP TRIGGER IF EXISTS tratamiento_busqueda_trg ON gestion_clinica_tratamiento;
+DROP FUNCTION IF EXISTS gestion_clinica_consulta_busqueda();
+DROP FUNCTION IF EXISTS gestion_clinica_tratamiento_busqueda();
+"""
+
+
+def crear_busqueda_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRESQL, params=None)
+
+
+def eliminar_busqueda_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRESQL_REVERSA, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0007_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultamedica',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tratamiento',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_busqueda_postgresql, eliminar_busqueda_postgresql),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0008_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recetamedica',
+            name='dosis_cantidad',
+            field=models.DecimalField(blank=True, decimal_places=3, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='recetamedica',
+            name='dosis_unidad',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='recetamedica',
+            name='duracion_dias',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recetamedica',
+            name='fecha_fin',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recetamedica',
+            name='fecha_inicio',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+from gestion_clinica.posologia import parsear_dosis, parsear_duracion
+
+# Recetas por lote: cada lote es una transacción corta, de modo que el relleno
+# no mantiene bloqueada la tabla mientras la clínica sigue operando.
+TAMANO_LOTE = 1000
+
+
+def rellenar_posologia(apps, schema_editor):
+    """
+    Rellena la posología estructurada de las recetas existentes.
+    Recorre la tabla por clave primaria y solo toma las filas sin fecha_fin,
+    por lo que si se interrumpe basta con volver a ejecutar la migración:
+    los lotes ya confirmados no se repiten.
+    """
+    RecetaMedica = apps.get_model('gestion_clinica', 'RecetaMedica')
+    alias = schema_editor.connection.alias
+    pendientes = RecetaMedica.objects.using(alias).filter(fecha_fin__isnull=True).order_by('pk')
+    ultimo = 0
+    while True:
+        lote = list(pendientes.filter(pk__gt=ultimo).values_list(
+            'pk', 'dosis', 'duracion', 'tratamiento__duracion_dias', 'tratamiento__consulta__fecha_consulta',
+        )[:TAMANO_LOTE])
+        if not lote:
+            return
+        recetas = []
+        for pk, dosis, duracion, dias_tratamiento, fecha_consulta in lote:
+            cantidad, unidad = parsear_dosis(dosis)
+            dias = parsear_duracion(duracion)
+            if dias is None:
+                dias = max(dias_tratamiento, 0)
+            inicio = timezone.localtime(fecha_consulta).date()
+            recetas.append(RecetaMedica(
+                pk=pk, dosis_cantidad=cantidad, dosis_unidad=unidad, duracion_dias=dias,
+                fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=max(dias - 1, 0)),
+            ))
+        with transaction.atomic(using=alias):
+            RecetaMedica.objects.using(alias).bulk_update(
+                recetas, ['dosis_cantidad', 'dosis_unidad', 'duracion_dias', 'fecha_inicio', 'fecha_fin'],
+            )
+        ultimo = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # Sin transacción global: cada lote confirma por separado
+    atomic = False
+
+    dependencies = [
+        ('gestion_clinica', '0009_receta_posologia'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_posologia, migrations.RunPython.noop),
+    ]
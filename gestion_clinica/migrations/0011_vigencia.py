@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0010_rellenar_posologia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tratamiento',
+            name='fecha_fin',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tratamiento',
+            name='fecha_inicio',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recetamedica',
+            index=models.Index(fields=['fecha_fin', 'fecha_inicio'], name='receta_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tratamiento',
+            index=models.Index(fields=['fecha_fin', 'fecha_inicio'], name='tratamiento_vigencia_idx'),
+        ),
+    ]
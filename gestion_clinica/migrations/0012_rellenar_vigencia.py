@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+# Tratamientos por lote; cada lote es una transacción corta
+TAMANO_LOTE = 1000
+
+
+def rellenar_vigencia(apps, schema_editor):
+    """
+    Rellena fecha_inicio y fecha_fin de los tratamientos existentes.
+    Igual que 0010_rellenar_posologia, recorre por clave primaria solo las
+    filas sin fecha_fin, de modo que se puede reanudar si se interrumpe.
+    """
+    Tratamiento = apps.get_model('gestion_clinica', 'Tratamiento')
+    alias = schema_editor.connection.alias
+    pendientes = Tratamiento.objects.using(alias).filter(fecha_fin__isnull=True).order_by('pk')
+    ultimo = 0
+    while True:
+        lote = list(pendientes.filter(pk__gt=ultimo).values_list(
+            'pk', 'duracion_dias', 'consulta__fecha_consulta',
+        )[:TAMANO_LOTE])
+        if not lote:
+            return
+        tratamientos = []
+        for pk, dias, fecha_consulta in lote:
+            inicio = timezone.localtime(fecha_consulta).date()
+            tratamientos.append(Tratamiento(
+                pk=pk, fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=max(dias - 1, 0)),
+            ))
+        with transaction.atomic(using=alias):
+            Tratamiento.objects.using(alias).bulk_update(tratamientos, ['fecha_inicio', 'fecha_fin'])
+        ultimo = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # Sin transacción global: cada lote confirma por separado
+    atomic = False
+
+    dependencies = [
+        ('gestion_clinica', '0011_vigencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_vigencia, migrations.RunPython.noop),
+    ]
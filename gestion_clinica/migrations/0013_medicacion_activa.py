@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Filas insertadas por lote al poblar la tabla
+TAMANO_LOTE = 2000
+
+
+def poblar_medicacion(apps, schema_editor):
+    """
+    Crea una fila de MedicacionActiva por cada receta existente.
+    """
+    RecetaMedica = apps.get_model('gestion_clinica', 'RecetaMedica')
+    MedicacionActiva = apps.get_model('gestion_clinica', 'MedicacionActiva')
+    alias = schema_editor.connection.alias
+    filas = (
+        RecetaMedica.objects.using(alias)
+        .filter(fecha_fin__isnull=False)
+        .order_by('pk')
+        .values_list('pk', 'tratamiento__consulta__paciente_id', 'medicamento_id', 'fecha_inicio', 'fecha_fin')
+    )
+    pendientes = []
+    for receta_id, paciente_id, medicamento_id, inicio, fin in filas.iterator(chunk_size=TAMANO_LOTE):
+        pendientes.append(MedicacionActiva(
+            receta_id=receta_id, paciente_id=paciente_id, medicamento_id=medicamento_id,
+            fecha_inicio=inicio, fecha_fin=fin,
+        ))
+        if len(pendientes) >= TAMANO_LOTE:
+            MedicacionActiva.objects.using(alias).bulk_create(pendientes)
+            pendientes = []
+    MedicacionActiva.objects.using(alias).bulk_create(pendientes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0012_rellenar_vigencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicacionActiva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('medicamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gestion_clinica.medicamento')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gestion_clinica.paciente')),
+                ('receta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='medicacion_activa', to='gestion_clinica.recetamedica')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['paciente', 'medicamento', 'fecha_fin'], name='medicacion_paciente_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_medicacion, migrations.RunPython.noop),
+    ]
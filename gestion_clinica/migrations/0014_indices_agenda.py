@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0013_medicacion_activa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['medico', 'fecha_hora'], name='cita_medico_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultamedica',
+            index=models.Index(fields=['medico', 'fecha_consulta'], name='consulta_medico_fecha_idx'),
+        ),
+    ]
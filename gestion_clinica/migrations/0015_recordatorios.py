@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0014_indices_agenda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recordatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(choices=[('CORREO', 'Correo electrónico'), ('SMS', 'SMS')], max_length=10)),
+                ('destino', models.CharField(max_length=254)),
+                ('asunto', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('reservado', models.DateTimeField(blank=True, null=True)),
+                ('enviado', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora', 'id'], name='cita_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='recordatorio',
+            name='cita',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recordatorio', to='gestion_clinica.cita'),
+        ),
+        migrations.AddIndex(
+            model_name='recordatorio',
+            index=models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['id'], name='recordatorio_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0015_recordatorios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Clinica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('codigo', models.SlugField(max_length=30, unique=True)),
+                ('direccion', models.CharField(blank=True, max_length=200)),
+                ('alias_bd', models.CharField(default='default', max_length=50)),
+                ('activa', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trabajo',
+            name='sede',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='clinica',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_clinica.clinica'),
+        ),
+        migrations.AddField(
+            model_name='consultamedica',
+            name='clinica',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_clinica.clinica'),
+        ),
+        migrations.AddField(
+            model_name='medico',
+            name='clinica',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_clinica.clinica'),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='clinica',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_clinica.clinica'),
+        ),
+    ]
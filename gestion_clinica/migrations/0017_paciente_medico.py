@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+# Filas insertadas por lote al poblar la tabla
+TAMANO_LOTE = 2000
+
+
+def poblar_relaciones(apps, schema_editor):
+    """
+    Crea una fila de PacienteMedico por cada par (paciente, médico) con consultas.
+    """
+    ConsultaMedica = apps.get_model('gestion_clinica', 'ConsultaMedica')
+    PacienteMedico = apps.get_model('gestion_clinica', 'PacienteMedico')
+    alias = schema_editor.connection.alias
+    filas = (
+        ConsultaMedica.objects.using(alias)
+        .values('paciente_id', 'medico_id')
+        .annotate(
+            primera_consulta=Min('fecha_consulta'),
+            ultima_consulta=Max('fecha_consulta'),
+            total_consultas=Count('pk'),
+        )
+        .order_by('medico_id', 'paciente_id')
+    )
+    pendientes = []
+    for fila in filas.iterator(chunk_size=TAMANO_LOTE):
+        pendientes.append(PacienteMedico(**fila))
+        if len(pendientes) >= TAMANO_LOTE:
+            PacienteMedico.objects.using(alias).bulk_create(pendientes)
+            pendientes = []
+    PacienteMedico.objects.using(alias).bulk_create(pendientes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0016_sedes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PacienteMedico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('primera_consulta', models.DateTimeField()),
+                ('ultima_consulta', models.DateTimeField()),
+                ('total_consultas', models.PositiveIntegerField(default=0)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_paciente', to='gestion_clinica.medico')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_medico', to='gestion_clinica.paciente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medico', '-ultima_consulta'], name='paciente_medico_ultima_idx')],
+                'constraints': [models.UniqueConstraint(fields=('medico', 'paciente'), name='paciente_medico_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_relaciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0017_paciente_medico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='especialidad',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='medicamento',
+            name='laboratorio_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='medicamento',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='especialidad',
+            index=models.Index(fields=['nombre_normalizado'], name='especialidad_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='medicamento',
+            index=models.Index(fields=['nombre_normalizado'], name='medicamento_nombre_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='medicamento',
+            index=models.Index(fields=['laboratorio_normalizado'], name='medicamento_lab_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations, transaction
+
+from gestion_clinica.normalizacion import normalizar
+
+# Filas por lote: cada lote es una transacción corta
+TAMANO_LOTE = 1000
+
+# Índices de trigramas para las búsquedas por contenido (LIKE '%texto%') en
+# PostgreSQL. Se crean CONCURRENTLY para no bloquear las escrituras del catálogo.
+SQL_POSTGRESQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS medicamento_nombre_trgm "
+    "ON gestion_clinica_medicamento USING gin (nombre_normalizado gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS medicamento_lab_trgm "
+    "ON gestion_clinica_medicamento USING gin (laboratorio_normalizado gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS especialidad_nombre_trgm "
+    "ON gestion_clinica_especialidad USING gin (nombre_normalizado gin_trgm_ops)",
+]
+
+SQL_POSTGRESQL_REVERSA = [
+    "DROP INDEX CONCURRENTLY IF EXISTS medicamento_nombre_trgm",
+    "DROP INDEX CONCURRENTLY IF EXISTS medicamento_lab_trgm",
+    "DROP INDEX CONCURRENTLY IF EXISTS especialidad_nombre_trgm",
+]
+
+
+def _rellenar(modelo, alias, campos):
+    """
+    Calcula las columnas normalizadas recorriendo la tabla por clave primaria.
+    Solo toma las filas aún sin normalizar, así que se puede reanudar.
+    """
+    pendientes = modelo.objects.using(alias).filter(**{campos[0][1]: ''}).order_by('pk')
+    ultimo = 0
+    while True:
+        lote = list(pendientes.filter(pk__gt=ultimo).values_list('pk', *(campo for campo, _ in campos))[:TAMANO_LOTE])
+        if not lote:
+            return
+        objetos = [
+            modelo(pk=fila[0], **{normalizado: normalizar(valor) for (_, normalizado), valor in zip(campos, fila[1:])})
+            for fila in lote
+        ]
+        with transaction.atomic(using=alias):
+            modelo.objects.using(alias).bulk_update(objetos, [normalizado for _, normalizado in campos])
+        ultimo = lote[-1][0]
+
+
+def rellenar_catalogo(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    _rellenar(apps.get_model('gestion_clinica', 'Especialidad'), alias, [('nombre', 'nombre_normalizado')])
+    _rellenar(apps.get_model('gestion_clinica', 'Medicamento'), alias, [
+        ('nombre', 'nombre_normalizado'), ('laboratorio', 'laboratorio_normalizado'),
+    ])
+
+
+def crear_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in SQL_POSTGRESQL:
+            schema_editor.execute(sql, params=None)
+
+
+def eliminar_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in SQL_POSTGRESQL_REVERSA:
+            schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    # Sin transacción global: cada lote confirma por separado y los índices
+    # se pueden crear CONCURRENTLY
+    atomic = False
+
+    dependencies = [
+        ('gestion_clinica', '0018_catalogo_normalizado'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_catalogo, migrations.RunPython.noop),
+        migrations.RunPython(crear_trigramas, eliminar_trigramas),
+    ]
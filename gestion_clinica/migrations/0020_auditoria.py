@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:34
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+# En PostgreSQL la bitácora rechaza UPDATE y DELETE también fuera del ORM
+# (TRUNCATE queda reservado al dueño de la tabla, para el archivado).
+SQL_POSTGRESQL = """
+CREATE OR REPLACE FUNCTION gestion_clinica_auditoria_inmutable() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'La bitácora de auditoría solo admite inserciones';
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER auditoria_inmutable_trg
+    BEFORE UPDATE OR DELETE ON gestion_clinica_registroauditoria
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_auditoria_inmutable();
+"""
+
+SQL_POSTGRESQL_REVERSA = """
+DROP TRIGGER IF EXISTS auditoria_inmutable_trg ON gestion_clinica_registroauditoria;
+DROP FUNCTION IF EXISTS gestion_clinica_auditoria_inmutable();
+"""
+
+
+def crear_trigger_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRESQL, params=None)
+
+
+def eliminar_trigger_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRESQL_REVERSA, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0019_rellenar_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(max_length=50)),
+                ('objeto_id', models.BigIntegerField()),
+                ('accion', models.CharField(choices=[('CREAR', 'Creación'), ('MODIFICAR', 'Modificación'), ('ELIMINAR', 'Eliminación')], max_length=10)),
+                ('cambios', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('usuario_id', models.IntegerField(blank=True, null=True)),
+                ('usuario', models.CharField(blank=True, max_length=150)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recurso', 'objeto_id', '-fecha'], name='auditoria_objeto_idx')],
+            },
+        ),
+        migrations.RunPython(crear_trigger_postgresql, eliminar_trigger_postgresql),
+    ]
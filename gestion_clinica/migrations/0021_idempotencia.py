@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:37
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0020_auditoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255)),
+                ('ruta', models.CharField(max_length=255)),
+                ('huella', models.CharField(max_length=64)),
+                ('estado', models.CharField(choices=[('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada')], default='EN_CURSO', max_length=10)),
+                ('codigo', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('respuesta', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('clave', 'ruta'), name='idempotencia_clave_unica')],
+            },
+        ),
+    ]
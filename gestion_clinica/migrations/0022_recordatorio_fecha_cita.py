@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:54
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def rellenar_fecha_cita(apps, schema_editor):
+    """
+    Los recordatorios existentes se redactaron con la fecha actual de su cita.
+    """
+    Cita = apps.get_model('gestion_clinica', 'Cita')
+    Recordatorio = apps.get_model('gestion_clinica', 'Recordatorio')
+    Recordatorio.objects.using(schema_editor.connection.alias).update(
+        fecha_cita=Subquery(Cita.objects.filter(pk=OuterRef('cita_id')).values('fecha_hora')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0021_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordatorio',
+            name='fecha_cita',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(rellenar_fecha_cita, migrations.RunPython.noop),
+    ]
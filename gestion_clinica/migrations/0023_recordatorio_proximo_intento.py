@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0022_recordatorio_fecha_cita'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordatorio',
+            name='proximo_intento',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:02
+
+from django.db import migrations
+
+# Los triggers de 0008 recalculaban el tsvector en cada UPDATE (cambios de
+# estado, updated_at...). Se separan en uno para INSERT y otro para UPDATE que
+# solo corre si cambió el texto indexado: OF limita las columnas del SET y WHEN
+# descarta los save() completos que reescriben el mismo texto.
+SQL_POSTGRESQL = """
+DROP TRIGGER IF EXISTS consulta_busqueda_trg ON gestion_clinica_consultamedica;
+DROP TRIGGER IF EXISTS tratamiento_busqueda_trg ON gestion_clinica_tratamiento;
+
+CREATE TRIGGER consulta_busqueda_ins_trg
+    BEFORE INSERT ON gestion_clinica_consultamedica
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_consulta_busqueda();
+
+CREATE TRIGGER consulta_busqueda_upd_trg
+    BEFORE UPDATE OF motivo, diagnostico ON gestion_clinica_consultamedica
+    FOR EACH ROW
+    WHEN (OLD.motivo IS DISTINCT FROM NEW.motivo OR OLD.diagnostico IS DISTINCT FROM NEW.diagnostico)
+    EXECUTE FUNCTION gestion_clinica_consulta_busqueda();
+
+CREATE TRIGGER tratamiento_busqueda_ins_trg
+    BEFORE INSERT ON gestion_clinica_tratamiento
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_tratamiento_busqueda();
+
+CREATE TRIGGER tratamiento_busqueda_upd_trg
+    BEFORE UPDATE OF descripcion ON gestion_clinica_tratamiento
+    FOR EACH ROW
+    WHEN (OLD.descripcion IS DISTINCT FROM NEW.descripcion)
+    EXECUTE FUNCTION gestion_clinica_tratamiento_busqueda();
+"""
+
+SQL_POSTGRESQL_REVERSA = """
+DROP TRIGGER IF EXISTS consulta_busqueda_ins_trg ON gestion_clinica_consultamedica;
+DROP TRIGGER IF EXISTS consulta_busqueda_upd_trg ON gestion_clinica_consultamedica;
+DROP TRIGGER IF EXISTS tratamiento_busqueda_ins_trg ON gestion_clinica_tratamiento;
+DROP TRIGGER IF EXISTS tratamiento_busqueda_upd_trg ON gestion_clinica_tratamiento;
+
+CREATE TRIGGER consulta_busqueda_trg
+    BEFORE INSERT OR UPDATE ON gestion_clinica_consultamedica
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_consulta_busqueda();
+
+CREATE TRIGGER tratamiento_busqueda_trg
+    BEFORE INSERT OR UPDATE ON gestion_clinica_tratamiento
+    FOR EACH ROW EXECUTE FUNCTION gestion_clinica_tratamiento_busqueda();
+"""
+
+
+def separar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRESQL, params=None)
+
+
+def unir_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRESQL_REVERSA, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_clinica', '0023_recordatorio_proximo_intento'),
+    ]
+
+    operations = [
+        migrations.RunPython(separar_triggers, unir_triggers),
+    ]
@@ -5,7 +5,47 @@ Incluye modelos para pacientes, médicos, consultas, tratamientos y medicamentos
 Cada modelo representa una tabla en la base de datos PostgreSQL.
 Uso de comentarios explicativos en cada módulo o clase.
 """
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+
+from .auditoria import AuditadoQuerySet, InmutableQuerySet, RegistroInmutable
+from .normalizacion import normalizar
+from .posologia import parsear_dosis, parsear_duracion
+
+class SinBusquedaManager(models.Manager):
+    """
+    Manager que difiere la columna `busqueda` (tsvector): solo la usa
+    busqueda.filtrar, que la consulta en la base sin traerla.
+    """
+    def get_queryset(self):
+        return super().get_queryset().defer('busqueda')
+
+class Clinica(models.Model):
+    """
+    Modelo para representar las clínicas (sedes) de la red Salud Vital.
+    Cada sede guarda sus datos clínicos en la base de datos indicada por
+    alias_bd (ver gestion_clinica.sedes); esta tabla vive siempre en 'default'.
+    """
+    nombre = models.CharField(max_length=100)
+    codigo = models.SlugField(max_length=30, unique=True)
+    direccion = models.CharField(max_length=200, blank=True)
+    alias_bd = models.CharField(max_length=50, default='default')
+    activa = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.nombre
+
+    def clean(self):
+        if self.alias_bd not in settings.DATABASES:
+            raise ValidationError({'alias_bd': f"La base de datos '{self.alias_bd}' no está configurada."})
 
 class Especialidad(models.Model):
     """
@@ -13,10 +53,29 @@ class Especialidad(models.Model):
     """
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
+    # Nombre sin tildes y en minúsculas, para las búsquedas indexadas
+    nombre_normalizado = models.CharField(max_length=100, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['nombre_normalizado'], name='especialidad_norm_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        self.nombre_normalizado = normalizar(self.nombre)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nombre' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nombre_normalizado'}
+        super().save(*args, **kwargs)
+
 class Paciente(models.Model):
     """
     Modelo para representar pacientes.
@@ -34,6 +93,11 @@ class Paciente(models.Model):
         ('O-', 'O negativo'),
     ]
 
+    # Campos cuyos cambios quedan en la bitácora de auditoría
+    CAMPOS_AUDITADOS = [
+        'rut', 'nombre', 'apellido', 'fecha_nacimiento', 'tipo_sangre', 'correo', 'telefono', 'direccion', 'activo',
+    ]
+
     rut = models.CharField(max_length=12, unique=True)
     nombre = models.CharField(max_length=100)
     apellido = models.CharField(max_length=100)
@@ -47,6 +111,20 @@ class Paciente(models.Model):
     telefono = models.CharField(max_length=20)
     direccion = models.CharField(max_length=200)
     activo = models.BooleanField(default=True)
+    # Sede del registro; referencia lógica porque Clinica vive en otra base de datos
+    clinica = models.ForeignKey(
+        Clinica, on_delete=models.DO_NOTHING, null=True, blank=True,
+        db_constraint=False, related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = AuditadoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['apellido', 'nombre'], name='paciente_apellido_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
@@ -62,6 +140,18 @@ class Medico(models.Model):
     telefono = models.CharField(max_length=20)
     activo = models.BooleanField(default=True)
     especialidad = models.ForeignKey(Especialidad, on_delete=models.CASCADE)
+    # Sede del registro; referencia lógica porque Clinica vive en otra base de datos
+    clinica = models.ForeignKey(
+        Clinica, on_delete=models.DO_NOTHING, null=True, blank=True,
+        db_constraint=False, related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['apellido', 'nombre'], name='medico_apellido_idx'),
+        ]
 
     def __str__(self):
         return f"Dr. {self.nombre} {self.apellido}"
@@ -80,6 +170,9 @@ class ConsultaMedica(models.Model):
         ('NO_ASISTIO', 'No Asistió'),
     ]
 
+    # Campos cuyos cambios quedan en la bitácora de auditoría
+    CAMPOS_AUDITADOS = ['diagnostico']
+
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE)
     medico = models.ForeignKey(Medico, on_delete=models.CASCADE)
     fecha_consulta = models.DateTimeField()
@@ -90,10 +183,38 @@ class ConsultaMedica(models.Model):
         choices=ESTADO_CHOICES,
         default='AGENDADA'
     )
+    # Vector de texto completo (motivo + diagnóstico), mantenido por trigger en PostgreSQL
+    busqueda = SearchVectorField(null=True, editable=False)
+    # Sede del registro; referencia lógica porque Clinica vive en otra base de datos
+    clinica = models.ForeignKey(
+        Clinica, on_delete=models.DO_NOTHING, null=True, blank=True,
+        db_constraint=False, related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = SinBusquedaManager.from_queryset(AuditadoQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-fecha_consulta'], name='consulta_fecha_idx'),
+            models.Index(fields=['medico', 'fecha_consulta'], name='consulta_medico_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Consulta de {self.paciente} con {self.medico}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Si cambió la fecha, se mueve la vigencia de sus tratamientos (y recetas)
+        fecha = timezone.localtime(self.fecha_consulta).date()
+        for tratamiento in self.tratamiento_set.exclude(fecha_inicio=fecha):
+            tratamiento.save(update_fields=['updated_at'])
+        # y si cambió el paciente, su medicación pasa al nuevo paciente
+        MedicacionActiva.objects.filter(receta__tratamiento__consulta=self).exclude(
+            paciente_id=self.paciente_id,
+        ).update(paciente_id=self.paciente_id)
+
 class Tratamiento(models.Model):
     """
     Modelo para representar tratamientos médicos.
@@ -102,10 +223,55 @@ class Tratamiento(models.Model):
     descripcion = models.TextField()
     duracion_dias = models.IntegerField()
     observaciones = models.TextField(blank=True)
+    # Vector de texto completo de la descripción, mantenido por trigger en PostgreSQL
+    busqueda = SearchVectorField(null=True, editable=False)
+    # Vigencia del tratamiento, derivada de la fecha de la consulta y la duración
+    fecha_inicio = models.DateField(null=True, blank=True, editable=False)
+    fecha_fin = models.DateField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = SinBusquedaManager()
+
+    class Meta:
+        indexes = [
+            # activo_en=<fecha> se resuelve como un rango sobre fecha_fin
+            models.Index(fields=['fecha_fin', 'fecha_inicio'], name='tratamiento_vigencia_idx'),
+        ]
 
     def __str__(self):
         return f"Tratamiento para {self.consulta.paciente}"
 
+    def actualizar_vigencia(self):
+        """
+        Calcula fecha_inicio (día de la consulta) y fecha_fin (último día, inclusive).
+        """
+        fecha_consulta = (
+            ConsultaMedica.objects.filter(pk=self.consulta_id)
+            .values_list('fecha_consulta', flat=True)
+            .get()
+        )
+        self.fecha_inicio = timezone.localtime(fecha_consulta).date()
+        self.fecha_fin = self.fecha_inicio + timedelta(days=max(self.duracion_dias - 1, 0))
+
+    def save(self, *args, **kwargs):
+        anterior = None
+        if self.pk is not None:
+            anterior = (
+                Tratamiento.objects.filter(pk=self.pk)
+                .values_list('fecha_inicio', 'duracion_dias', 'consulta_id')
+                .first()
+            )
+        self.actualizar_vigencia()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'fecha_inicio', 'fecha_fin'}
+        super().save(*args, **kwargs)
+        # Las recetas heredan el inicio, el paciente y, si no indican duración,
+        # también la del tratamiento
+        if anterior is not None and anterior != (self.fecha_inicio, self.duracion_dias, self.consulta_id):
+            for receta in self.recetamedica_set.all():
+                receta.save(update_fields=['updated_at'])
+
 class Medicamento(models.Model):
     """
     Modelo para representar medicamentos.
@@ -114,10 +280,43 @@ class Medicamento(models.Model):
     laboratorio = models.CharField(max_length=100)
     stock = models.IntegerField()
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    # Nombre y laboratorio sin tildes y en minúsculas, para las búsquedas indexadas.
+    # En PostgreSQL además tienen índices de trigramas para las búsquedas por contenido.
+    nombre_normalizado = models.CharField(max_length=100, blank=True, editable=False)
+    laboratorio_normalizado = models.CharField(max_length=100, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Campos de texto con su columna normalizada
+    CAMPOS_NORMALIZADOS = {'nombre': 'nombre_normalizado', 'laboratorio': 'laboratorio_normalizado'}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre'], name='medicamento_nombre_idx'),
+            models.Index(
+                fields=['nombre_normalizado'], name='medicamento_nombre_norm_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields=['laboratorio_normalizado'], name='medicamento_lab_norm_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        for campo, normalizado in self.CAMPOS_NORMALIZADOS.items():
+            setattr(self, normalizado, normalizar(getattr(self, campo)))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {
+                *update_fields,
+                *(n for c, n in self.CAMPOS_NORMALIZADOS.items() if c in update_fields),
+            }
+        super().save(*args, **kwargs)
+
 class RecetaMedica(models.Model):
     """
     Modelo para representar recetas médicas.
@@ -133,6 +332,11 @@ class RecetaMedica(models.Model):
         ('UNICA', 'Dosis única'),
     ]
 
+    # Campos que actualizar_posologia() recalcula en cada guardado
+    CAMPOS_POSOLOGIA = ['dosis_cantidad', 'dosis_unidad', 'duracion_dias', 'fecha_inicio', 'fecha_fin']
+    # Campos cuyos cambios quedan en la bitácora de auditoría
+    CAMPOS_AUDITADOS = ['tratamiento', 'medicamento', 'dosis', 'frecuencia', 'duracion', 'motivo']
+
     tratamiento = models.ForeignKey(Tratamiento, on_delete=models.CASCADE)
     medicamento = models.ForeignKey(Medicamento, on_delete=models.CASCADE)
     dosis = models.CharField(max_length=100)
@@ -143,10 +347,108 @@ class RecetaMedica(models.Model):
     )
     duracion = models.CharField(max_length=100)
     motivo = models.CharField(max_length=200)
+    # Posología estructurada, derivada de dosis y duracion al guardar
+    dosis_cantidad = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True, editable=False)
+    dosis_unidad = models.CharField(max_length=20, blank=True, editable=False)
+    duracion_dias = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    fecha_inicio = models.DateField(null=True, blank=True, editable=False)
+    fecha_fin = models.DateField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = AuditadoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_fin', 'fecha_inicio'], name='receta_vigencia_idx'),
+        ]
 
     def __str__(self):
         return f"Receta de {self.medicamento} para {self.tratamiento.consulta.paciente}"
 
+    def actualizar_posologia(self, fecha_consulta, dias_tratamiento):
+        """
+        Calcula los campos estructurados a partir del texto de la receta.
+        La receta comienza el día de la consulta; si la duración escrita no se
+        reconoce, se usa la duración del tratamiento. fecha_fin es el último
+        día de toma (inclusive).
+        """
+        self.dosis_cantidad, self.dosis_unidad = parsear_dosis(self.dosis)
+        self.duracion_dias = parsear_duracion(self.duracion)
+        if self.duracion_dias is None:
+            self.duracion_dias = max(dias_tratamiento, 0)
+        self.fecha_inicio = timezone.localtime(fecha_consulta).date()
+        self.fecha_fin = self.fecha_inicio + timedelta(days=max(self.duracion_dias - 1, 0))
+
+    def save(self, *args, **kwargs):
+        fecha_consulta, dias_tratamiento, paciente_id = (
+            Tratamiento.objects.filter(pk=self.tratamiento_id)
+            .values_list('consulta__fecha_consulta', 'duracion_dias', 'consulta__paciente_id')
+            .get()
+        )
+        self.actualizar_posologia(fecha_consulta, dias_tratamiento)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *self.CAMPOS_POSOLOGIA}
+        super().save(*args, **kwargs)
+        MedicacionActiva.objects.using(self._state.db).update_or_create(
+            receta=self,
+            defaults={
+                'paciente_id': paciente_id,
+                'medicamento_id': self.medicamento_id,
+                'fecha_inicio': self.fecha_inicio,
+                'fecha_fin': self.fecha_fin,
+            },
+        )
+
+class MedicacionActiva(models.Model):
+    """
+    Modelo para representar la medicación de cada paciente (índice desnormalizado).
+    Una fila por receta con el paciente, el medicamento y la vigencia, para
+    detectar terapias duplicadas con una sola búsqueda indexada en lugar de
+    recorrer Paciente -> ConsultaMedica -> Tratamiento -> RecetaMedica.
+    Se mantiene al guardar recetas, tratamientos y consultas, y se puede
+    reconstruir con `manage.py reconstruir_medicacion_activa`.
+    """
+    receta = models.OneToOneField(RecetaMedica, on_delete=models.CASCADE, related_name='medicacion_activa')
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE)
+    medicamento = models.ForeignKey(Medicamento, on_delete=models.CASCADE)
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['paciente', 'medicamento', 'fecha_fin'], name='medicacion_paciente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.medicamento} para {self.paciente} ({self.fecha_inicio} a {self.fecha_fin})"
+
+class PacienteMedico(models.Model):
+    """
+    Modelo para representar la relación entre un paciente y un médico que lo
+    ha atendido (tabla desnormalizada). Una fila por par con la primera y la
+    última consulta y la cantidad de consultas, para filtrar "pacientes del
+    médico X" y ordenarlos por última visita sin recorrer ConsultaMedica.
+    Se mantiene al guardar y eliminar consultas (ver relaciones.py) y se puede
+    reconstruir con `manage.py reconstruir_pacientes_medico`.
+    """
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='relaciones_medico')
+    medico = models.ForeignKey(Medico, on_delete=models.CASCADE, related_name='relaciones_paciente')
+    primera_consulta = models.DateTimeField()
+    ultima_consulta = models.DateTimeField()
+    total_consultas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['medico', 'paciente'], name='paciente_medico_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['medico', '-ultima_consulta'], name='paciente_medico_ultima_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.paciente} con {self.medico} ({self.total_consultas} consultas)"
+
 class Cita(models.Model):
     """
     Modelo para representar citas médicas programadas.
@@ -185,6 +487,203 @@ class Cita(models.Model):
     motivo = models.CharField(max_length=200)
     observaciones = models.TextField(blank=True)
     duracion_minutos = models.IntegerField(default=30)
+    # Sede del registro; referencia lógica porque Clinica vive en otra base de datos
+    clinica = models.ForeignKey(
+        Clinica, on_delete=models.DO_NOTHING, null=True, blank=True,
+        db_constraint=False, related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['medico', 'fecha_hora'], name='cita_medico_fecha_idx'),
+            models.Index(fields=['fecha_hora', 'id'], name='cita_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cita de {self.paciente} con {self.medico} - {self.fecha_hora}"
+
+class RegistroEliminado(models.Model):
+    """
+    Modelo para representar lápidas (tombstones) de registros eliminados.
+    Permite a los clientes sin conexión saber qué borrar en la sincronización delta.
+    """
+    recurso = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.recurso} #{self.objeto_id} eliminado el {self.deleted_at}"
+
+class RegistroAuditoria(models.Model):
+    """
+    Modelo para representar la bitácora de auditoría de los datos clínicos.
+    Cada entrada es una creación, modificación o eliminación de un registro,
+    con los campos afectados ({campo: [antes, después]}). Solo admite
+    inserciones; se escribe en lotes desde auditoria.py.
+    """
+    ACCION_CHOICES = [
+        ('CREAR', 'Creación'),
+        ('MODIFICAR', 'Modificación'),
+        ('ELIMINAR', 'Eliminación'),
+    ]
+
+    recurso = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    accion = models.CharField(max_length=10, choices=ACCION_CHOICES)
+    cambios = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Usuario que hizo el cambio; sin clave foránea porque los usuarios viven en 'default'
+    usuario_id = models.IntegerField(null=True, blank=True)
+    usuario = models.CharField(max_length=150, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    objects = InmutableQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recurso', 'objeto_id', '-fecha'], name='auditoria_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_accion_display()} de {self.recurso} #{self.objeto_id} el {self.fecha}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise RegistroInmutable("La bitácora de auditoría no admite modificaciones.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise RegistroInmutable("La bitácora de auditoría no admite eliminaciones.")
+
+class ClaveIdempotencia(models.Model):
+    """
+    Modelo para representar las claves Idempotency-Key de los POST de creación.
+    Mientras está EN_CURSO reserva la clave; COMPLETADA guarda la respuesta
+    que se devuelve a los reintentos hasta `expira` (ver idempotencia.py).
+    """
+    ESTADO_CHOICES = [
+        ('EN_CURSO', 'En curso'),
+        ('COMPLETADA', 'Completada'),
+    ]
+
+    clave = models.CharField(max_length=255)
+    ruta = models.CharField(max_length=255)
+    # SHA-256 del método, el usuario y el cuerpo de la petición original
+    huella = models.CharField(max_length=64)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='EN_CURSO')
+    codigo = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    creada = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['clave', 'ruta'], name='idempotencia_clave_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.ruta})"
+
+class Trabajo(models.Model):
+    """
+    Modelo para representar trabajos en segundo plano.
+    La cola vive en la propia base de datos: los workers reservan filas
+    pendientes con SELECT ... FOR UPDATE SKIP LOCKED, sin broker externo.
+    """
+    # Definición de CHOICES para estado del trabajo
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En Proceso'),
+        ('COMPLETADO', 'Completado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+
+    tarea = models.CharField(max_length=100)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='PENDIENTE'
+    )
+    progreso = models.PositiveSmallIntegerField(default=0)
+    mensaje = models.CharField(max_length=200, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    ejecutar_desde = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    # Alias de la sede en la que se encoló; la tarea se ejecuta contra esa base
+    sede = models.CharField(max_length=50, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Índice parcial: solo los trabajos pendientes participan del dequeue
+            models.Index(
+                fields=['ejecutar_desde', 'id'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='trabajo_pendiente_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.tarea} #{self.pk} ({self.estado})"
+
+class Recordatorio(models.Model):
+    """
+    Modelo para representar recordatorios de citas (bandeja de salida).
+    Los recordatorios se generan en bloque y luego los despachan varios
+    workers. La restricción única por cita impide recordar dos veces la
+    misma cita aunque el generador se ejecute repetidamente.
+    """
+    # Definición de CHOICES para canal de envío
+    CANAL_CHOICES = [
+        ('CORREO', 'Correo electrónico'),
+        ('SMS', 'SMS'),
+    ]
+
+    # Definición de CHOICES para estado del envío
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('ENVIANDO', 'Enviando'),
+        ('ENVIADO', 'Enviado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+
+    cita = models.OneToOneField(Cita, on_delete=models.CASCADE, related_name='recordatorio')
+    canal = models.CharField(max_length=10, choices=CANAL_CHOICES)
+    destino = models.CharField(max_length=254)
+    asunto = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    # Fecha de la cita con que se redactó el mensaje; si la cita se reagenda, el recordatorio queda obsoleto
+    fecha_cita = models.DateTimeField(null=True, blank=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='PENDIENTE'
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Tras un envío fallido, no se reintenta antes de esta fecha (espera exponencial)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    reservado = models.DateTimeField(null=True, blank=True)
+    enviado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Índice parcial: solo los pendientes participan del despacho
+            models.Index(
+                fields=['id'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='recordatorio_pendiente_idx',
+            ),
+        ]
 
     def __str__(self):
-        return f"Cita de {self.paciente} con {self.medico} - {self.fecha_hora}"
\ No newline at end of file
+        return f"Recordatorio {self.canal} de la cita #{self.cita_id} ({self.estado})"
@@ -0,0 +1,16 @@
+"""
+Normalización de texto para las búsquedas en catálogos.
+Los nombres se guardan también sin tildes y en minúsculas en columnas
+indexadas (*_normalizado), de modo que "cardiologia" encuentra "Cardiología"
+comparando directamente contra el índice, sin funciones por fila.
+"""
+import unicodedata
+
+
+def normalizar(texto):
+    """
+    Quita tildes y diacríticos, pasa a minúsculas y colapsa los espacios.
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
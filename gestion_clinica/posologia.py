@@ -0,0 +1,84 @@
+"""
+Interpretación de la posología escrita en texto libre en las recetas.
+Convierte textos como "500mg", "1,5 g" o "2 comprimidos" en cantidad y unidad,
+y "7 días", "2 semanas" o "1 mes" en días, para guardarlos en columnas
+numéricas sobre las que se puede agregar directamente en SQL.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+# Unidades reconocidas -> (unidad normalizada, factor de conversión)
+# Las masas se llevan a mg y los volúmenes a ml para poder sumarlas.
+UNIDADES = {
+    'mg': ('mg', Decimal('1')),
+    'g': ('mg', Decimal('1000')),
+    'gr': ('mg', Decimal('1000')),
+    'mcg': ('mg', Decimal('0.001')),
+    'µg': ('mg', Decimal('0.001')),
+    'ug': ('mg', Decimal('0.001')),
+    'ml': ('ml', Decimal('1')),
+    'cc': ('ml', Decimal('1')),
+    'l': ('ml', Decimal('1000')),
+    'ui': ('ui', Decimal('1')),
+    'gota': ('gota', Decimal('1')),
+    'gotas': ('gota', Decimal('1')),
+    'comprimido': ('comprimido', Decimal('1')),
+    'comprimidos': ('comprimido', Decimal('1')),
+    'tableta': ('comprimido', Decimal('1')),
+    'tabletas': ('comprimido', Decimal('1')),
+    'capsula': ('capsula', Decimal('1')),
+    'capsulas': ('capsula', Decimal('1')),
+    'cápsula': ('capsula', Decimal('1')),
+    'cápsulas': ('capsula', Decimal('1')),
+    'sobre': ('sobre', Decimal('1')),
+    'sobres': ('sobre', Decimal('1')),
+    'puff': ('puff', Decimal('1')),
+    'puffs': ('puff', Decimal('1')),
+    'inhalacion': ('puff', Decimal('1')),
+    'inhalaciones': ('puff', Decimal('1')),
+}
+
+# Unidades de tiempo -> días
+DURACIONES = {
+    'dia': 1, 'dias': 1, 'día': 1, 'días': 1, 'd': 1,
+    'semana': 7, 'semanas': 7, 'sem': 7,
+    'mes': 30, 'meses': 30,
+}
+
+PATRON_DOSIS = re.compile(r'(\d+(?:[.,]\d+)?)\s*([^\d\s]+)?', re.IGNORECASE)
+PATRON_DURACION = re.compile(r'(\d+)\s*([^\d\s.,]+)?', re.IGNORECASE)
+
+
+def parsear_dosis(texto):
+    """
+    Devuelve (cantidad, unidad) normalizadas, o (None, '') si no se reconoce.
+    Sin unidad explícita se asume una unidad de dosis ('unidad').
+    """
+    coincidencia = PATRON_DOSIS.search(texto or '')
+    if not coincidencia:
+        return None, ''
+    try:
+        cantidad = Decimal(coincidencia.group(1).replace(',', '.'))
+    except InvalidOperation:
+        return None, ''
+    unidad = (coincidencia.group(2) or '').lower()
+    if not unidad:
+        return cantidad, 'unidad'
+    if unidad not in UNIDADES:
+        return None, ''
+    normalizada, factor = UNIDADES[unidad]
+    return cantidad * factor, normalizada
+
+
+def parsear_duracion(texto):
+    """
+    Devuelve la duración en días, o None si el texto no se reconoce.
+    Un número sin unidad se interpreta como días.
+    """
+    coincidencia = PATRON_DURACION.search(texto or '')
+    if not coincidencia:
+        return None
+    unidad = (coincidencia.group(2) or 'dias').lower()
+    if unidad not in DURACIONES:
+        return None
+    return int(coincidencia.group(1)) * DURACIONES[unidad]
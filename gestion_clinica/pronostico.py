@@ -0,0 +1,151 @@
+"""
+Pronóstico de consumo de medicamentos y alertas de quiebre de stock.
+Convierte las recetas activas en dosis diarias por medicamento y proyecta
+la fecha en que el stock actual se agota. El cálculo es vectorizado con
+NumPy: una fila por receta, sin bucles de Python sobre los registros.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Medicamento, RecetaMedica
+from .sedes import alias_actual
+
+# Dosis por día según la frecuencia de la receta.
+# UNICA se trata aparte: una sola dosis el día de inicio.
+DOSIS_DIARIAS = {
+    '8H': 3.0,
+    '12H': 2.0,
+    '24H': 1.0,
+    '48H': 0.5,
+    'SEMANAL': 1.0 / 7.0,
+    'UNICA': 0.0,
+}
+
+CLAVE_CACHE = 'pronostico_medicamentos'
+
+
+def _cargar_recetas(hoy):
+    """
+    Carga en bloque las columnas necesarias de las recetas que siguen activas
+    (fecha_fin desde hoy en adelante), usando la posología estructurada.
+    Devuelve arreglos: medicamento, dosis diarias, día de inicio relativo a hoy,
+    duración en días y si es dosis única.
+    """
+    filas = (
+        RecetaMedica.objects
+        .filter(fecha_fin__gte=hoy)
+        .values_list('medicamento_id', 'frecuencia', 'fecha_inicio', 'duracion_dias')
+    )
+    filas = list(filas)
+    if not filas:
+        vacio = np.zeros(0)
+        return vacio.astype(np.int64), vacio, vacio.astype(np.int64), vacio.astype(np.int64), vacio.astype(bool)
+
+    medicamentos, frecuencias, inicios, duraciones = zip(*filas)
+    frecuencias = np.array(frecuencias)
+    dosis = np.zeros(len(filas))
+    for frecuencia, valor in DOSIS_DIARIAS.items():
+        dosis[frecuencias == frecuencia] = valor
+    inicio = (np.array(inicios, dtype='datetime64[D]') - np.datetime64(hoy, 'D')).astype(np.int64)
+    return (
+        np.array(medicamentos, dtype=np.int64),
+        dosis,
+        inicio,
+        np.array(duraciones, dtype=np.int64),
+        frecuencias == 'UNICA',
+    )
+
+
+def proyectar(medicamento, dosis, inicio, duracion, unica, ids, stock, horizonte):
+    """
+    Proyección vectorizada del consumo diario.
+
+    Cada receta suma `dosis` en los días [inicio, inicio + duracion) dentro del
+    horizonte. Se usa un arreglo de diferencias: +dosis en el día de inicio y
+    -dosis en el de término, acumulado con cumsum; np.bincount agrega todas
+    las recetas de una vez sobre la matriz (medicamento x día) aplanada.
+
+    Devuelve (consumo diario [n_medicamentos x horizonte], día de quiebre o -1).
+    """
+    n = len(ids)
+    ancho = horizonte + 1
+    fila = np.searchsorted(ids, medicamento)
+    valido = (fila < n) & (ids[np.minimum(fila, n - 1)] == medicamento) if n else np.zeros(0, dtype=bool)
+
+    desde = np.clip(inicio, 0, horizonte)
+    hasta = np.clip(inicio + duracion, 0, horizonte)
+    continua = valido & ~unica & (hasta > desde)
+    diferencias = (
+        np.bincount(fila[continua] * ancho + desde[continua], weights=dosis[continua], minlength=n * ancho)
+        - np.bincount(fila[continua] * ancho + hasta[continua], weights=dosis[continua], minlength=n * ancho)
+    )
+    consumo = np.cumsum(diferencias.reshape(n, ancho)[:, :horizonte], axis=1)
+
+    # Dosis únicas: una unidad el día de inicio, si cae dentro del horizonte
+    puntual = valido & unica & (inicio >= 0) & (inicio < horizonte)
+    consumo += np.bincount(
+        fila[puntual] * horizonte + inicio[puntual], minlength=n * horizonte,
+    ).reshape(n, horizonte)
+
+    acumulado = np.cumsum(consumo, axis=1)
+    agotado = acumulado >= stock[:, None]
+    quiebre = np.where(agotado.any(axis=1), agotado.argmax(axis=1), -1)
+    quiebre[stock <= 0] = 0
+    return consumo, quiebre
+
+
+def calcular_pronostico(horizonte=None):
+    """
+    Calcula el pronóstico para todos los medicamentos.
+    """
+    horizonte = horizonte or getattr(settings, 'PRONOSTICO_HORIZONTE_DIAS', 90)
+    hoy = timezone.localdate()
+
+    catalogo = list(Medicamento.objects.order_by('pk').values_list('pk', 'nombre', 'stock'))
+    ids = np.array([m[0] for m in catalogo], dtype=np.int64)
+    stock = np.array([m[2] for m in catalogo], dtype=np.float64)
+    consumo, quiebre = proyectar(*_cargar_recetas(hoy), ids, stock, horizonte)
+
+    consumo_hoy = consumo[:, 0] if horizonte else np.zeros(len(ids))
+    consumo_30 = consumo[:, :30].sum(axis=1)
+    resultados = []
+    for i, (pk, nombre, stock_actual) in enumerate(catalogo):
+        dia = int(quiebre[i])
+        resultados.append({
+            'medicamento': pk,
+            'nombre': nombre,
+            'stock': stock_actual,
+            'consumo_diario': round(float(consumo_hoy[i]), 2),
+            'consumo_30_dias': round(float(consumo_30[i]), 2),
+            'dias_cobertura': dia if dia >= 0 else None,
+            'fecha_quiebre': (hoy + timedelta(days=dia)).isoformat() if dia >= 0 else None,
+        })
+    return {'calculado': timezone.now().isoformat(), 'horizonte_dias': horizonte, 'medicamentos': resultados}
+
+
+def obtener_pronostico(refrescar=False):
+    """
+    Devuelve el pronóstico de la sede actual desde la cache, recalculándolo si
+    expiró o si se pide.
+    """
+    clave = f'{CLAVE_CACHE}:{alias_actual()}'
+    pronostico = None if refrescar else cache.get(clave)
+    if pronostico is None:
+        pronostico = calcular_pronostico()
+        cache.set(clave, pronostico, getattr(settings, 'PRONOSTICO_CACHE_SEGUNDOS', 900))
+    return pronostico
+
+
+def stock_bajo(dias):
+    """
+    Medicamentos cuyo stock se agota dentro de `dias` días, del más urgente al menos.
+    """
+    criticos = [
+        m for m in obtener_pronostico()['medicamentos']
+        if m['dias_cobertura'] is not None and m['dias_cobertura'] <= dias
+    ]
+    return sorted(criticos, key=lambda m: (m['dias_cobertura'], m['nombre']))
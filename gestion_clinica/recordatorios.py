@@ -0,0 +1,321 @@
+"""
+Recordatorios de citas mediante una bandeja de salida (outbox).
+
+El proceso tiene dos etapas independientes:
+1. generar(): recorre por lotes indexados las citas próximas que aún no
+   tienen recordatorio y escribe los mensajes en la tabla Recordatorio con
+   bulk_create. La restricción única por cita hace que repetir la
+   generación nunca duplique recordatorios.
+2. despachar(): varios workers reservan lotes de recordatorios pendientes
+   (SELECT ... FOR UPDATE SKIP LOCKED, como la cola de trabajos) y los
+   entregan al remitente configurado en RECORDATORIOS_REMITENTE.
+
+Cada recordatorio guarda la fecha de la cita con que se redactó. Solo se
+despachan los de citas aún por recordar (programadas o confirmadas, futuras y
+con esa misma fecha); los pendientes de citas canceladas, pasadas o
+reagendadas se descartan, y generar() vuelve a redactar los reagendados.
+
+Los remitentes reciben cada recordatorio con su clave de idempotencia
+(`recordatorio-<id>`), para que un proveedor externo descarte el reenvío de
+un lote que se recuperó tras la caída de un worker.
+"""
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Cita, Recordatorio
+from .sedes import alias_actual
+
+logger = logging.getLogger(__name__)
+
+# Citas leídas e insertadas por lote al generar
+TAMANO_LOTE = 1000
+
+# Estados de cita que deben recordarse
+ESTADOS_RECORDABLES = ['PROGRAMADA', 'CONFIRMADA']
+
+
+def clave_idempotencia(recordatorio):
+    return f'recordatorio-{recordatorio.pk}'
+
+
+class RemitenteConsola:
+    """
+    Remitente de desarrollo: escribe cada recordatorio en la salida estándar.
+    """
+    def __init__(self, salida=None):
+        self.salida = salida or sys.stdout
+        self._lock = threading.Lock()
+
+    def enviar(self, recordatorios):
+        """
+        Envía el lote y devuelve {id: error} con los que fallaron.
+        """
+        texto = ''.join(
+            f"[{r.canal}] {r.destino} ({clave_idempotencia(r)}): {r.mensaje}\n" for r in recordatorios
+        )
+        with self._lock:
+            self.salida.write(texto)
+            self.salida.flush()
+        return {}
+
+
+class RemitenteArchivo:
+    """
+    Remitente de desarrollo: agrega cada recordatorio como una línea JSON
+    al archivo RECORDATORIOS_ARCHIVO.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or settings.RECORDATORIOS_ARCHIVO
+
+    def enviar(self, recordatorios):
+        lineas = ''.join(
+            json.dumps({
+                'clave': clave_idempotencia(r),
+                'cita': r.cita_id,
+                'canal': r.canal,
+                'destino': r.destino,
+                'asunto': r.asunto,
+                'mensaje': r.mensaje,
+            }, ensure_ascii=False) + '\n'
+            for r in recordatorios
+        )
+        with self._lock, open(self.ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write(lineas)
+        return {}
+
+
+class RemitenteCorreo:
+    """
+    Remitente por correo con el backend de email de Django. Envía el lote
+    completo por una sola conexión; los recordatorios por SMS quedan fallidos.
+    """
+    def enviar(self, recordatorios):
+        errores = {r.pk: 'Este remitente no envía SMS.' for r in recordatorios if r.canal != 'CORREO'}
+        correos = [r for r in recordatorios if r.canal == 'CORREO']
+        mensajes = [
+            EmailMessage(r.asunto, r.mensaje, to=[r.destino], headers={'X-Idempotency-Key': clave_idempotencia(r)})
+            for r in correos
+        ]
+        try:
+            get_connection().send_messages(mensajes)
+        except Exception as error:
+            errores.update({r.pk: str(error) for r in correos})
+        return errores
+
+
+def obtener_remitente():
+    return import_string(getattr(settings, 'RECORDATORIOS_REMITENTE', 'gestion_clinica.recordatorios.RemitenteConsola'))()
+
+
+def _construir(cita_id, fecha_hora, nombre, correo, telefono, medico_nombre, medico_apellido):
+    """
+    Arma el recordatorio de una cita a partir de una fila de values_list.
+    Se prefiere el correo; si el paciente no lo tiene, se usa SMS.
+    """
+    local = timezone.localtime(fecha_hora)
+    return Recordatorio(
+        cita_id=cita_id,
+        fecha_cita=fecha_hora,
+        canal='CORREO' if correo else 'SMS',
+        destino=correo or telefono,
+        asunto=f"Recordatorio de cita - {local:%d/%m/%Y %H:%M}",
+        mensaje=(
+            f"Hola {nombre}, le recordamos su cita con {medico_nombre} {medico_apellido} "
+            f"el {local:%d/%m/%Y} a las {local:%H:%M}. Si no puede asistir, por favor avísenos."
+        ),
+    )
+
+
+def _vigentes(ahora):
+    """
+    Condición de los recordatorios que todavía corresponde enviar.
+    """
+    return Q(
+        cita__estado__in=ESTADOS_RECORDABLES,
+        cita__fecha_hora__gte=ahora,
+        cita__fecha_hora=F('fecha_cita'),
+    )
+
+
+def descartar(citas=None, ahora=None):
+    """
+    Borra los recordatorios pendientes que ya no corresponde enviar (cita
+    cancelada, pasada o reagendada), de todas las citas o solo de `citas`.
+    Un reagendado vuelve a generarse con la nueva fecha. Devuelve la
+    cantidad de recordatorios descartados.
+    """
+    pendientes = Recordatorio.objects.filter(estado='PENDIENTE')
+    if citas is not None:
+        pendientes = pendientes.filter(cita_id__in=citas)
+    descartados, _ = pendientes.exclude(_vigentes(ahora or timezone.now())).delete()
+    return descartados
+
+
+def generar(ahora=None, lote=TAMANO_LOTE):
+    """
+    Crea los recordatorios de las citas que ocurren dentro de las próximas
+    RECORDATORIOS_ANTICIPACION_HORAS horas. Recorre las citas por lotes con
+    paginación por clave (fecha_hora, id), sobre el índice cita_fecha_idx.
+    Antes descarta los pendientes obsoletos, de modo que las citas
+    reagendadas reciben un recordatorio con la nueva fecha.
+    Devuelve la cantidad de citas procesadas: si otro generador recordó la
+    misma cita a la vez, la restricción única omite la fila (bulk_create con
+    ignore_conflicts no informa cuántas se escribieron) y igual se cuenta.
+    """
+    ahora = ahora or timezone.now()
+    descartar(ahora=ahora)
+    hasta = ahora + timedelta(hours=getattr(settings, 'RECORDATORIOS_ANTICIPACION_HORAS', 24))
+    citas = (
+        Cita.objects
+        .filter(fecha_hora__gte=ahora, fecha_hora__lt=hasta, estado__in=ESTADOS_RECORDABLES)
+        .filter(~Exists(Recordatorio.objects.filter(cita=OuterRef('pk'))))
+        .order_by('fecha_hora', 'id')
+    )
+    total = 0
+    ultimo = None
+    while True:
+        pagina = citas
+        if ultimo is not None:
+            pagina = citas.filter(Q(fecha_hora__gt=ultimo[0]) | Q(fecha_hora=ultimo[0], id__gt=ultimo[1]))
+        filas = list(pagina.values_list(
+            'id', 'fecha_hora', 'paciente__nombre', 'paciente__correo', 'paciente__telefono',
+            'medico__nombre', 'medico__apellido',
+        )[:lote])
+        if not filas:
+            return total
+        Recordatorio.objects.bulk_create([_construir(*fila) for fila in filas], ignore_conflicts=True)
+        total += len(filas)
+        ultimo = (filas[-1][1], filas[-1][0])
+
+
+def espera_reintento(intentos):
+    """
+    Espera antes del siguiente envío tras `intentos` intentos fallidos:
+    RECORDATORIOS_ESPERA_SEGUNDOS, duplicada en cada fallo.
+    """
+    return timedelta(seconds=getattr(settings, 'RECORDATORIOS_ESPERA_SEGUNDOS', 60) * 2 ** max(intentos - 1, 0))
+
+
+def reservar_lote(worker, lote):
+    """
+    Reserva hasta `lote` recordatorios pendientes para este worker, solo de
+    citas que todavía corresponde recordar y cuya espera tras un fallo ya
+    terminó.
+    """
+    ahora = timezone.now()
+    with transaction.atomic(using=alias_actual()):
+        ids = list(
+            Recordatorio.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(_vigentes(ahora), estado='PENDIENTE', proximo_intento__lte=ahora)
+            .order_by('id')
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return []
+        Recordatorio.objects.filter(pk__in=ids, estado='PENDIENTE').update(
+            estado='ENVIANDO', worker=worker, reservado=ahora, intentos=F('intentos') + 1,
+        )
+    return list(Recordatorio.objects.filter(pk__in=ids, estado='ENVIANDO', worker=worker, reservado=ahora))
+
+
+def despachar_lote(remitente, recordatorios):
+    """
+    Entrega un lote reservado y registra el resultado con dos escrituras en bloque.
+    Los fallidos vuelven a la cola hasta agotar RECORDATORIOS_MAX_INTENTOS,
+    con una espera que se duplica en cada intento (ver espera_reintento), para
+    que una caída breve del proveedor no agote los intentos en segundos.
+    """
+    try:
+        errores = remitente.enviar(recordatorios)
+    except Exception as error:
+        logger.exception("Falló el envío de un lote de %s recordatorios", len(recordatorios))
+        errores = {r.pk: str(error) for r in recordatorios}
+
+    enviados = [r.pk for r in recordatorios if r.pk not in errores]
+    Recordatorio.objects.filter(pk__in=enviados).update(estado='ENVIADO', enviado=timezone.now(), error='')
+
+    maximo = getattr(settings, 'RECORDATORIOS_MAX_INTENTOS', 3)
+    ahora = timezone.now()
+    fallidos = [r for r in recordatorios if r.pk in errores]
+    for recordatorio in fallidos:
+        recordatorio.estado = 'PENDIENTE' if recordatorio.intentos < maximo else 'FALLIDO'
+        recordatorio.error = errores[recordatorio.pk]
+        recordatorio.proximo_intento = ahora + espera_reintento(recordatorio.intentos)
+    Recordatorio.objects.bulk_update(fallidos, ['estado', 'error', 'proximo_intento'])
+    return len(enviados), len(fallidos)
+
+
+def _worker(indice, remitente, lote):
+    worker = f"recordatorios:{indice}"
+    alias = alias_actual()
+    maximo = getattr(settings, 'RECORDATORIOS_REINTENTOS_RESERVA', 5)
+    enviados = fallidos = errores = 0
+    try:
+        while True:
+            try:
+                recordatorios = reservar_lote(worker, lote)
+            except DatabaseError:
+                # Conflicto transitorio entre workers: se reintenta con backoff
+                # y, si persiste, el worker termina y lo pendiente queda para la próxima ejecución
+                errores += 1
+                logger.exception("Error al reservar recordatorios en %s (intento %s)", worker, errores)
+                connections[alias].close()
+                if errores >= maximo:
+                    return enviados, fallidos
+                time.sleep(0.1 * 2 ** (errores - 1))
+                continue
+            errores = 0
+            if not recordatorios:
+                return enviados, fallidos
+            ok, error = despachar_lote(remitente, recordatorios)
+            enviados += ok
+            fallidos += error
+    finally:
+        # Cada hilo tiene su propia conexión a la base
+        connections[alias].close()
+
+
+def recuperar_huerfanos():
+    """
+    Devuelve a la cola los recordatorios que quedaron ENVIANDO más tiempo del
+    permitido (el worker murió a mitad del lote).
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'RECORDATORIOS_TIMEOUT', 600))
+    return Recordatorio.objects.filter(estado='ENVIANDO', reservado__lt=limite).update(estado='PENDIENTE', worker='')
+
+
+def despachar(concurrencia=4, lote=500, remitente=None):
+    """
+    Vacía la bandeja de salida de la sede actual con `concurrencia` hilos en paralelo.
+    Devuelve {'enviados': n, 'fallidos': n}.
+    """
+    remitente = remitente or obtener_remitente()
+    recuperar_huerfanos()
+    descartar()
+    concurrencia = max(1, concurrencia)
+    # Los hilos del pool no heredan la sede: cada worker corre en su propia copia del contexto
+    contextos = [contextvars.copy_context() for _ in range(concurrencia)]
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        resultados = list(pool.map(
+            lambda indice: contextos[indice].run(_worker, indice, remitente, lote),
+            range(concurrencia),
+        ))
+    return {
+        'enviados': sum(ok for ok, _ in resultados),
+        'fallidos': sum(error for _, error in resultados),
+    }
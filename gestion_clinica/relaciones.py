@@ -0,0 +1,82 @@
+"""
+Relación paciente–médico (tabla PacienteMedico).
+Cada vez que se guarda o elimina una consulta se recalcula el resumen del par
+(paciente, médico) afectado: primera y última consulta y cantidad de
+consultas. El recálculo es una agregación sobre las consultas del paciente,
+que son pocas, y se hace en la misma transacción que la escritura.
+
+Las actualizaciones masivas (QuerySet.update) no envían señales; después de
+una de ellas se debe ejecutar `manage.py reconstruir_pacientes_medico`.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Min
+
+from .models import ConsultaMedica, PacienteMedico
+from .sedes import alias_actual
+
+# Filas insertadas por lote al reconstruir la tabla
+TAMANO_LOTE = 2000
+
+
+def _resumen(alias, paciente_id, medico_id):
+    return ConsultaMedica.objects.using(alias).filter(paciente_id=paciente_id, medico_id=medico_id).aggregate(
+        primera_consulta=Min('fecha_consulta'),
+        ultima_consulta=Max('fecha_consulta'),
+        total_consultas=Count('pk'),
+    )
+
+
+def actualizar(alias, paciente_id, medico_id):
+    """
+    Recalcula la fila del par (paciente, médico). La fila se bloquea antes de
+    agregar, así dos consultas simultáneas del mismo par no se pisan el conteo.
+    """
+    relaciones = PacienteMedico.objects.using(alias).filter(paciente_id=paciente_id, medico_id=medico_id)
+    with transaction.atomic(using=alias):
+        relacion = relaciones.select_for_update().first()
+        resumen = _resumen(alias, paciente_id, medico_id)
+        if relacion is None:
+            if not resumen['total_consultas']:
+                return
+            try:
+                with transaction.atomic(using=alias):
+                    PacienteMedico.objects.using(alias).create(paciente_id=paciente_id, medico_id=medico_id, **resumen)
+                return
+            except IntegrityError:
+                # Otra transacción creó el par: se bloquea su fila y se vuelve a agregar
+                relacion = relaciones.select_for_update().get()
+                resumen = _resumen(alias, paciente_id, medico_id)
+        if not resumen['total_consultas']:
+            relacion.delete()
+            return
+        relaciones.update(**resumen)
+
+
+def reconstruir(lote=TAMANO_LOTE):
+    """
+    Regenera PacienteMedico desde las consultas con una agregación por par,
+    en una sola transacción. Devuelve la cantidad de filas creadas.
+    """
+    filas = (
+        ConsultaMedica.objects
+        .values('paciente_id', 'medico_id')
+        .annotate(
+            primera_consulta=Min('fecha_consulta'),
+            ultima_consulta=Max('fecha_consulta'),
+            total_consultas=Count('pk'),
+        )
+        .order_by('medico_id', 'paciente_id')
+    )
+    total = 0
+    with transaction.atomic(using=alias_actual()):
+        PacienteMedico.objects.all().delete()
+        pendientes = []
+        for fila in filas.iterator(chunk_size=lote):
+            pendientes.append(PacienteMedico(**fila))
+            if len(pendientes) >= lote:
+                PacienteMedico.objects.bulk_create(pendientes)
+                total += len(pendientes)
+                pendientes = []
+        PacienteMedico.objects.bulk_create(pendientes)
+        total += len(pendientes)
+    return total
@@ -0,0 +1,240 @@
+"""
+Soporte multi-clínica (sedes) con una base de datos por sede.
+
+- Cada Clinica indica el alias de DATABASES donde viven sus datos.
+- ClinicaMiddleware identifica la clínica de la petición (cabecera
+  X-Clinica, parámetro ?clinica= o la sesión) y la deja en una variable de
+  contexto, válida tanto en vistas síncronas como asíncronas.
+- RouterSedes envía los modelos clínicos a la base de la clínica actual;
+  Clinica y Trabajo (catálogo de sedes y cola de trabajos) son globales y
+  viven siempre en 'default'. Sin clínica en contexto todo va a 'default',
+  como en una instalación de una sola sede.
+- consultar_en_sedes() ejecuta una misma lectura en todas las sedes en
+  paralelo, para los reportes centrales.
+
+Especialidad y Medicamento se replican por sede: así ninguna clave foránea
+cruza bases de datos y el stock de medicamentos es propio de cada clínica.
+"""
+import contextvars
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponseBadRequest
+
+# Modelos que no se reparten por sede
+MODELOS_GLOBALES = {'clinica', 'trabajo'}
+
+APP = 'gestion_clinica'
+
+_alias_actual = contextvars.ContextVar('sede_alias', default=None)
+_clinica_actual = contextvars.ContextVar('sede_clinica', default=None)
+
+
+def alias_actual():
+    """
+    Alias de base de datos de la sede en contexto ('default' si no hay).
+    """
+    return _alias_actual.get() or 'default'
+
+
+def clinica_actual():
+    """
+    Id de la clínica en contexto, o None.
+    """
+    return _clinica_actual.get()
+
+
+@contextmanager
+def en_sede(alias, clinica_id=None):
+    """
+    Ejecuta el bloque con las lecturas y escrituras dirigidas a la sede indicada.
+    """
+    token_alias = _alias_actual.set(alias or None)
+    token_clinica = _clinica_actual.set(clinica_id)
+    try:
+        yield
+    finally:
+        _alias_actual.reset(token_alias)
+        _clinica_actual.reset(token_clinica)
+
+
+def _es_global(modelo):
+    return modelo._meta.app_label != APP or modelo._meta.model_name in MODELOS_GLOBALES
+
+
+class RouterSedes:
+    """
+    Router de base de datos por sede.
+    """
+    def _alias(self, modelo, **hints):
+        if _es_global(modelo):
+            return 'default'
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            # Las relaciones de un objeto se leen en la misma base que el objeto
+            return instancia._state.db
+        return alias_actual()
+
+    def db_for_read(self, modelo, **hints):
+        return self._alias(modelo, **hints)
+
+    def db_for_write(self, modelo, **hints):
+        return self._alias(modelo, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La referencia a Clinica es lógica (sin restricción en la base)
+        if 'clinica' in (obj1._meta.model_name, obj2._meta.model_name):
+            return True
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label != APP:
+            return db == 'default'
+        if model_name in MODELOS_GLOBALES:
+            return db == 'default'
+        return True
+
+
+def obtener_clinica(codigo):
+    """
+    Devuelve (id, alias) de la clínica activa con ese código, o None.
+    Se cachea porque se consulta en cada petición.
+    """
+    from .models import Clinica
+
+    clave = f'sedes:clinica:{codigo}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = (
+            Clinica.objects.filter(codigo=codigo, activa=True)
+            .values_list('pk', 'alias_bd')
+            .first()
+        ) or ()
+        cache.set(clave, datos, 300)
+    return tuple(datos) or None
+
+
+def olvidar_clinica(codigo):
+    cache.delete(f'sedes:clinica:{codigo}')
+
+
+class ClinicaMiddleware:
+    """
+    Fija la sede de la petición. La clínica se toma, en orden, de la cabecera
+    X-Clinica, del parámetro ?clinica= (que además queda en la sesión para la
+    interfaz web, solo si es válido) o de la sesión. Un código desconocido en
+    la cabecera o el parámetro es un 400; uno guardado en la sesión que dejó
+    de ser válido se olvida.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sesion = getattr(request, 'session', None)
+        codigo = request.headers.get('X-Clinica') or request.GET.get('clinica')
+        if codigo:
+            clinica = obtener_clinica(codigo)
+            if clinica is None:
+                return HttpResponseBadRequest(f"Clínica desconocida: {codigo}")
+            if codigo == request.GET.get('clinica') and sesion is not None:
+                sesion['clinica'] = codigo
+        elif sesion is not None and sesion.get('clinica'):
+            clinica = obtener_clinica(sesion['clinica'])
+            if clinica is None:
+                sesion.pop('clinica')
+        else:
+            clinica = None
+        if clinica is None:
+            return self.get_response(request)
+
+        clinica_id, alias = clinica
+        request.clinica_id = clinica_id
+        with en_sede(alias, clinica_id):
+            return self.get_response(request)
+
+
+def contexto(request):
+    """
+    Procesador de contexto: expone la sede actual a los templates, que la
+    usan en las claves de los fragmentos cacheados.
+    """
+    return {'sede': alias_actual()}
+
+
+def alias_sedes():
+    """
+    Alias distintos de las clínicas activas.
+    """
+    from .models import Clinica
+
+    alias = set(Clinica.objects.filter(activa=True).values_list('alias_bd', flat=True))
+    return sorted(a for a in alias if a in settings.DATABASES) or ['default']
+
+
+def _en_hilo(alias, funcion):
+    with en_sede(alias):
+        try:
+            return funcion(alias)
+        finally:
+            # Cada hilo abre su propia conexión: se cierra al terminar
+            connections[alias].close()
+
+
+def consultar_en_sedes(funcion, aliases=None):
+    """
+    Ejecuta funcion(alias) en todas las sedes a la vez y devuelve {alias: resultado}.
+    Cada sede se consulta en su propio hilo y con su propia conexión, de modo
+    que el tiempo total es el de la sede más lenta y no la suma.
+    """
+    aliases = list(aliases or alias_sedes())
+    with ThreadPoolExecutor(max_workers=max(1, len(aliases))) as pool:
+        resultados = pool.map(lambda alias: _en_hilo(alias, funcion), aliases)
+        return dict(zip(aliases, resultados))
+
+
+def fusionar(listas, clave, limite=None, descendente=False):
+    """
+    Mezcla listas ya ordenadas por `clave` (una por sede) en una sola lista ordenada.
+    """
+    fusion = heapq.merge(*listas, key=clave, reverse=descendente)
+    return [fila for _, fila in zip(range(limite), fusion)] if limite else list(fusion)
+
+
+def reporte_central(desde, hasta, limite=20):
+    """
+    Reporte consolidado de todas las sedes para el período [desde, hasta):
+    totales por sede y las últimas consultas de la red, consultando cada
+    base de datos en paralelo.
+    """
+    from .models import Cita, ConsultaMedica, Medico, Paciente
+
+    def resumen(alias):
+        consultas = ConsultaMedica.objects.using(alias).filter(fecha_consulta__gte=desde, fecha_consulta__lt=hasta)
+        return {
+            'pacientes': Paciente.objects.using(alias).count(),
+            'medicos': Medico.objects.using(alias).filter(activo=True).count(),
+            'consultas': consultas.count(),
+            'citas': Cita.objects.using(alias).filter(fecha_hora__gte=desde, fecha_hora__lt=hasta).count(),
+            'ultimas': [
+                dict(fila, sede=alias)
+                for fila in consultas.order_by('-fecha_consulta', '-id').values(
+                    'id', 'fecha_consulta', 'estado', 'paciente__nombre', 'paciente__apellido',
+                    'medico__nombre', 'medico__apellido',
+                )[:limite]
+            ],
+        }
+
+    resultados = consultar_en_sedes(resumen)
+    ultimas = fusionar(
+        [r.pop('ultimas') for r in resultados.values()],
+        clave=lambda fila: fila['fecha_consulta'], limite=limite, descendente=True,
+    )
+    totales = {
+        campo: sum(r[campo] for r in resultados.values())
+        for campo in ('pacientes', 'medicos', 'consultas', 'citas')
+    }
+    return {'sedes': resultados, 'totales': totales, 'ultimas_consultas': ultimas}
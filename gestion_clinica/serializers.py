@@ -6,7 +6,11 @@ Facilita la comunicación con aplicaciones cliente (web, móvil, etc.).
 Uso de comentarios explicativos en cada módulo o clase.
 """
 from rest_framework import serializers
-from .models import Especialidad, Paciente, Medico, ConsultaMedica, Tratamiento, Medicamento, RecetaMedica, Cita
+from django.db import transaction
+
+from .medicacion import revisar_duplicado
+from .sedes import alias_actual
+from .models import Especialidad, Paciente, Medico, ConsultaMedica, Tratamiento, Medicamento, RecetaMedica, Cita, Trabajo, RegistroAuditoria
 
 class EspecialidadSerializer(serializers.ModelSerializer):
     """
@@ -14,18 +18,31 @@ class EspecialidadSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Especialidad
-        fields = '__all__'
+        # La columna normalizada es interna de las búsquedas
+        exclude = ['nombre_normalizado']
 
 # Serializador para el modelo Paciente
 class PacienteSerializer(serializers.ModelSerializer):
     """
     Serializador para el modelo Paciente.
     Incluye todos los campos del modelo y sus validaciones.
+    Al filtrar u ordenar por médico agrega la última visita y el total de consultas.
     """
     class Meta:
         model = Paciente
         fields = '__all__'
 
+    def to_representation(self, instance):
+        datos = super().to_representation(instance)
+        if hasattr(instance, 'ultima_visita'):
+            datos['ultima_visita'] = (
+                serializers.DateTimeField().to_representation(instance.ultima_visita)
+                if instance.ultima_visita else None
+            )
+        if hasattr(instance, 'total_consultas'):
+            datos['total_consultas'] = instance.total_consultas
+        return datos
+
 # Serializador para el modelo Medico
 class MedicoSerializer(serializers.ModelSerializer):
     """
@@ -43,7 +60,7 @@ class ConsultaMedicaSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = ConsultaMedica
-        fields = '__all__'
+        exclude = ['busqueda']
 
 # Serializador para el modelo Tratamiento
 class TratamientoSerializer(serializers.ModelSerializer):
@@ -53,7 +70,7 @@ class TratamientoSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Tratamiento
-        fields = '__all__'
+        exclude = ['busqueda']
 
 # Serializador para el modelo Medicamento
 class MedicamentoSerializer(serializers.ModelSerializer):
@@ -62,18 +79,42 @@ class MedicamentoSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Medicamento
-        fields = '__all__'
+        # Las columnas normalizadas son internas de las búsquedas
+        exclude = ['nombre_normalizado', 'laboratorio_normalizado']
 
 # Serializador para el modelo RecetaMedica
 class RecetaMedicaSerializer(serializers.ModelSerializer):
     """
     Serializador para el modelo RecetaMedica.
     Incluye las relaciones con Tratamiento y Medicamento.
+    Rechaza terapias duplicadas salvo que se envíe confirmar_duplicado=true;
+    la revisión se hace al guardar, en la misma transacción que el INSERT y
+    con el paciente bloqueado.
     """
+    confirmar_duplicado = serializers.BooleanField(write_only=True, required=False, default=False)
+
     class Meta:
         model = RecetaMedica
         fields = '__all__'
 
+    def _guardar(self, guardar, attrs):
+        confirmar = attrs.pop('confirmar_duplicado', False)
+        tratamiento = attrs.get('tratamiento', getattr(self.instance, 'tratamiento', None))
+        medicamento = attrs.get('medicamento', getattr(self.instance, 'medicamento', None))
+        duracion = attrs.get('duracion', getattr(self.instance, 'duracion', ''))
+        with transaction.atomic(using=alias_actual()):
+            if tratamiento and medicamento and not confirmar:
+                aviso = revisar_duplicado(tratamiento, medicamento, duracion, self.instance)
+                if aviso:
+                    raise serializers.ValidationError({'confirmar_duplicado': aviso}, code='terapia_duplicada')
+            return guardar(attrs)
+
+    def create(self, validated_data):
+        return self._guardar(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self._guardar(lambda datos: super(RecetaMedicaSerializer, self).update(instance, datos), validated_data)
+
 # Serializador para el modelo Cita
 class CitaSerializer(serializers.ModelSerializer):
     """
@@ -82,4 +123,28 @@ class CitaSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Cita
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+# Serializador para el modelo Trabajo
+class TrabajoSerializer(serializers.ModelSerializer):
+    """
+    Serializador de solo lectura para consultar el estado y avance
+    de los trabajos en segundo plano.
+    """
+    class Meta:
+        model = Trabajo
+        fields = [
+            'id', 'tarea', 'parametros', 'estado', 'progreso', 'mensaje', 'resultado',
+            'error', 'intentos', 'max_intentos', 'ejecutar_desde', 'creado', 'iniciado', 'finalizado',
+        ]
+        read_only_fields = fields
+
+# Serializador para el modelo RegistroAuditoria
+class RegistroAuditoriaSerializer(serializers.ModelSerializer):
+    """
+    Serializador de solo lectura para el historial de auditoría de un registro.
+    """
+    class Meta:
+        model = RegistroAuditoria
+        fields = ['id', 'recurso', 'objeto_id', 'accion', 'cambios', 'usuario_id', 'usuario', 'fecha']
+        read_only_fields = fields
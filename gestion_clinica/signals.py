@@ -0,0 +1,172 @@
+"""
+Receptores de señales de la app gestion_clinica.
+Se conectan en GestionClinicaConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+from . import agenda, auditoria, relaciones
+from .coalescencia import invalidar_modelo
+from .eventos import publicar_cambio
+from .models import Cita, Clinica, ConsultaMedica, Medico, Paciente, RecetaMedica, RegistroEliminado
+from .sedes import clinica_actual, olvidar_clinica
+from .sincronizacion import RECURSO_POR_MODELO
+
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    """
+    Deja una lápida por cada registro eliminado, incluidos los borrados en
+    cascada, para que la sincronización delta pueda informarlos.
+    """
+    RegistroEliminado.objects.using(kwargs.get('using') or 'default').create(
+        recurso=RECURSO_POR_MODELO[sender],
+        objeto_id=instance.pk,
+    )
+
+
+for modelo in RECURSO_POR_MODELO:
+    post_delete.connect(registrar_eliminacion, sender=modelo, dispatch_uid=f'lapida_{modelo.__name__}')
+
+
+def anunciar_guardado(sender, instance, created, **kwargs):
+    """
+    Publica en vivo la creación o modificación de citas y consultas.
+    """
+    publicar_cambio(instance, 'creada' if created else 'actualizada')
+
+
+def anunciar_eliminacion(sender, instance, **kwargs):
+    """
+    Publica en vivo la eliminación de citas y consultas.
+    """
+    publicar_cambio(instance, 'eliminada')
+
+
+for modelo in (Cita, ConsultaMedica):
+    post_save.connect(anunciar_guardado, sender=modelo, dispatch_uid=f'evento_guardado_{modelo.__name__}')
+    post_delete.connect(anunciar_eliminacion, sender=modelo, dispatch_uid=f'evento_eliminacion_{modelo.__name__}')
+
+
+def recordar_dia_agenda(sender, instance, **kwargs):
+    """
+    Guarda el médico, día y paciente que tenía el registro antes de
+    modificarse, para invalidar también la agenda de origen cuando se
+    reprograma y actualizar la relación paciente–médico anterior.
+    """
+    instance._agenda_anterior = None
+    if instance.pk is not None:
+        instance._agenda_anterior = (
+            sender.objects.using(kwargs['using']).filter(pk=instance.pk)
+            .values_list('medico_id', agenda.CAMPO_FECHA[sender], 'paciente_id')
+            .first()
+        )
+
+
+def invalidar_agenda(sender, instance, **kwargs):
+    """
+    Invalida la agenda del día actual del registro y, si cambió, la del anterior.
+    """
+    dias = {(instance.medico_id, agenda.dia_local(getattr(instance, agenda.CAMPO_FECHA[sender])))}
+    anterior = getattr(instance, '_agenda_anterior', None)
+    if anterior is not None:
+        dias.add((anterior[0], agenda.dia_local(anterior[1])))
+    agenda.invalidar(dias, kwargs['using'])
+
+
+def recordar_cambio_paciente(sender, instance, update_fields=None, **kwargs):
+    """
+    Anota si el guardado cambia algún dato del paciente que muestra la agenda,
+    comparando con los valores que la auditoría tomó al cargarlo.
+    """
+    originales = getattr(instance, '_auditoria_original', {})
+    datos = instance.__dict__
+    instance._agenda_cambio = any(
+        campo not in originales or originales[campo] != datos[campo]
+        for campo in agenda.CAMPOS_PACIENTE
+        if campo != 'id' and campo in datos and (update_fields is None or campo in update_fields)
+    )
+
+
+def invalidar_agenda_paciente(sender, instance, created, **kwargs):
+    """
+    Invalida los días de agenda donde aparece el resumen del paciente modificado.
+    """
+    if not created and getattr(instance, '_agenda_cambio', True):
+        agenda.invalidar_paciente(instance.pk, kwargs['using'])
+
+
+for modelo in agenda.CAMPO_FECHA:
+    pre_save.connect(recordar_dia_agenda, sender=modelo, dispatch_uid=f'agenda_anterior_{modelo.__name__}')
+    post_save.connect(invalidar_agenda, sender=modelo, dispatch_uid=f'agenda_guardado_{modelo.__name__}')
+    post_delete.connect(invalidar_agenda, sender=modelo, dispatch_uid=f'agenda_eliminacion_{modelo.__name__}')
+post_save.connect(invalidar_agenda_paciente, sender=Paciente, dispatch_uid='agenda_paciente')
+
+
+def actualizar_relacion_guardado(sender, instance, **kwargs):
+    """
+    Recalcula la relación paciente–médico de la consulta y, si cambió de
+    paciente o de médico, también la del par anterior.
+    """
+    alias = kwargs['using']
+    actual = (instance.medico_id, instance.fecha_consulta, instance.paciente_id)
+    anterior = getattr(instance, '_agenda_anterior', None)
+    if anterior == actual:
+        return
+    relaciones.actualizar(alias, instance.paciente_id, instance.medico_id)
+    if anterior is not None and (anterior[2], anterior[0]) != (instance.paciente_id, instance.medico_id):
+        relaciones.actualizar(alias, anterior[2], anterior[0])
+
+
+def actualizar_relacion_eliminacion(sender, instance, **kwargs):
+    relaciones.actualizar(kwargs['using'], instance.paciente_id, instance.medico_id)
+
+
+post_save.connect(actualizar_relacion_guardado, sender=ConsultaMedica, dispatch_uid='relacion_guardado')
+post_delete.connect(actualizar_relacion_eliminacion, sender=ConsultaMedica, dispatch_uid='relacion_eliminacion')
+
+
+def invalidar_coalescencia(sender, **kwargs):
+    """
+    Cambia la versión del modelo para que no se compartan resultados previos a la escritura.
+    """
+    invalidar_modelo(sender, kwargs['using'])
+
+
+for modelo in RECURSO_POR_MODELO:
+    post_save.connect(invalidar_coalescencia, sender=modelo, dispatch_uid=f'coalescencia_guardado_{modelo.__name__}')
+    post_delete.connect(invalidar_coalescencia, sender=modelo, dispatch_uid=f'coalescencia_eliminacion_{modelo.__name__}')
+
+
+def asignar_clinica(sender, instance, **kwargs):
+    """
+    Marca los registros nuevos con la clínica de la petición en curso.
+    """
+    if instance.clinica_id is None:
+        instance.clinica_id = clinica_actual()
+
+
+for modelo in (Paciente, Medico, ConsultaMedica, Cita):
+    pre_save.connect(asignar_clinica, sender=modelo, dispatch_uid=f'clinica_{modelo.__name__}')
+
+
+def olvidar_clinica_cacheada(sender, instance, **kwargs):
+    """
+    Descarta la clínica cacheada por el middleware al modificarla o eliminarla.
+    """
+    olvidar_clinica(instance.codigo)
+
+
+post_save.connect(olvidar_clinica_cacheada, sender=Clinica, dispatch_uid='clinica_guardado')
+post_delete.connect(olvidar_clinica_cacheada, sender=Clinica, dispatch_uid='clinica_eliminacion')
+
+
+# Bitácora de auditoría: valores cargados, diferencias al guardar y eliminaciones
+for modelo in (Paciente, ConsultaMedica, RecetaMedica):
+    post_init.connect(auditoria.capturar_originales, sender=modelo, dispatch_uid=f'auditoria_inicio_{modelo.__name__}')
+    pre_save.connect(auditoria.completar_originales, sender=modelo, dispatch_uid=f'auditoria_previo_{modelo.__name__}')
+    post_save.connect(auditoria.registrar_guardado, sender=modelo, dispatch_uid=f'auditoria_guardado_{modelo.__name__}')
+    post_delete.connect(
+        auditoria.registrar_eliminacion, sender=modelo, dispatch_uid=f'auditoria_eliminacion_{modelo.__name__}',
+    )
+
+# Después de auditoria.completar_originales, que lee de la base los valores no cargados
+pre_save.connect(recordar_cambio_paciente, sender=Paciente, dispatch_uid='agenda_cambio_paciente')
@@ -0,0 +1,133 @@
+"""
+Sincronización delta para clientes sin conexión (tablets).
+Responde "qué cambió desde T" recorriendo cada recurso por (updated_at, id)
+y las lápidas de RegistroEliminado por id, en páginas enlazadas con un
+token de continuación opaco. El costo es proporcional a los cambios,
+no al tamaño de las tablas.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Especialidad, Paciente, Medico, ConsultaMedica, Tratamiento, Medicamento, RecetaMedica, Cita, RegistroEliminado
+from .serializers import (
+    EspecialidadSerializer, PacienteSerializer, MedicoSerializer, ConsultaMedicaSerializer,
+    TratamientoSerializer, MedicamentoSerializer, RecetaMedicaSerializer, CitaSerializer,
+)
+
+# Recursos sincronizados, en orden de dependencia (los padres antes que los hijos)
+RECURSOS = [
+    ('especialidades', Especialidad, EspecialidadSerializer),
+    ('pacientes', Paciente, PacienteSerializer),
+    ('medicos', Medico, MedicoSerializer),
+    ('medicamentos', Medicamento, MedicamentoSerializer),
+    ('consultas', ConsultaMedica, ConsultaMedicaSerializer),
+    ('citas', Cita, CitaSerializer),
+    ('tratamientos', Tratamiento, TratamientoSerializer),
+    ('recetas', RecetaMedica, RecetaMedicaSerializer),
+]
+
+# Nombre de recurso para cada modelo, usado al registrar lápidas
+RECURSO_POR_MODELO = {modelo: nombre for nombre, modelo, _ in RECURSOS}
+
+INICIO = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class TokenInvalido(ValueError):
+    """
+    El token de sincronización recibido no se pudo decodificar.
+    """
+
+
+def codificar_token(cursores, eliminados, hasta=None):
+    """
+    Serializa los cursores como JSON en base64 url-safe.
+    `hasta` solo se incluye mientras hay páginas pendientes del mismo recorrido.
+    """
+    datos = {
+        'r': {nombre: [fecha.isoformat(), pk] for nombre, (fecha, pk) in cursores.items()},
+        'e': eliminados,
+    }
+    if hasta is not None:
+        datos['h'] = hasta.isoformat()
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    """
+    Devuelve (cursores, último id de lápida, hasta) a partir de un token.
+    Un token vacío equivale a una sincronización completa.
+    """
+    cursores = {nombre: (INICIO, 0) for nombre, _, _ in RECURSOS}
+    if not token:
+        return cursores, 0, None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno))
+        for nombre, (fecha, pk) in datos.get('r', {}).items():
+            if nombre in cursores:
+                cursores[nombre] = (parse_datetime(fecha), int(pk))
+        eliminados = int(datos.get('e', 0))
+        hasta = parse_datetime(datos['h']) if 'h' in datos else None
+    except (binascii.Error, ValueError, TypeError, AttributeError, KeyError) as error:
+        raise TokenInvalido('Token de sincronización inválido.') from error
+    if any(fecha is None for fecha, _ in cursores.values()):
+        raise TokenInvalido('Token de sincronización inválido.')
+    return cursores, eliminados, hasta
+
+
+def pagina_cambios(token, limite):
+    """
+    Arma una página de la sincronización delta con hasta `limite` registros.
+    Los registros modificados en los últimos SINCRONIZACION_MARGEN_SEGUNDOS se
+    dejan para la próxima sincronización, para no saltarse transacciones que
+    aún no confirmaban con una marca de tiempo anterior.
+    """
+    cursores, ultimo_eliminado, hasta = decodificar_token(token)
+    if hasta is None:
+        hasta = timezone.now() - timedelta(seconds=getattr(settings, 'SINCRONIZACION_MARGEN_SEGUNDOS', 5))
+
+    restante = limite
+    cambios = {}
+    for nombre, modelo, serializador in RECURSOS:
+        if restante <= 0:
+            break
+        fecha, pk = cursores[nombre]
+        registros = list(
+            modelo.objects
+            .filter(Q(updated_at__gt=fecha) | Q(updated_at=fecha, pk__gt=pk), updated_at__lte=hasta)
+            .order_by('updated_at', 'pk')[:restante]
+        )
+        if registros:
+            cambios[nombre] = serializador(registros, many=True).data
+            cursores[nombre] = (registros[-1].updated_at, registros[-1].pk)
+            restante -= len(registros)
+
+    eliminados = {}
+    if restante > 0:
+        lapidas = list(
+            RegistroEliminado.objects
+            .filter(pk__gt=ultimo_eliminado, deleted_at__lte=hasta)
+            .order_by('pk')
+            .values_list('pk', 'recurso', 'objeto_id')[:restante]
+        )
+        for pk, recurso, objeto_id in lapidas:
+            eliminados.setdefault(recurso, []).append(objeto_id)
+        if lapidas:
+            ultimo_eliminado = lapidas[-1][0]
+        restante -= len(lapidas)
+
+    # Si la página no se llenó, el recorrido terminó y el token sirve como próximo "since"
+    completo = restante > 0
+    return {
+        'cambios': cambios,
+        'eliminados': eliminados,
+        'siguiente': codificar_token(cursores, ultimo_eliminado, None if completo else hasta),
+        'completo': completo,
+    }
@@ -0,0 +1,144 @@
+"""
+Tareas en segundo plano de la app gestion_clinica.
+Cada función registrada con @tarea puede encolarse desde las vistas
+y es ejecutada por los workers de `manage.py procesar_trabajos`.
+"""
+import csv
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .auditoria import auditando
+from .filters import ConsultaMedicaFilter
+from .models import Cita, ConsultaMedica, Especialidad, Medico, Paciente, RecetaMedica, Tratamiento
+from .pronostico import obtener_pronostico
+from .recordatorios import despachar, generar
+from .sedes import alias_sedes, en_sede
+from .trabajos import tarea
+
+# Tamaño de lote para las eliminaciones masivas
+TAMANO_LOTE = 500
+
+# Orden de eliminación de los registros dependientes, de las hojas hacia la raíz.
+# Borrar por lotes evita que el Collector de Django cargue todo el historial en memoria
+# y mantiene cada transacción corta.
+PLANES_ELIMINACION = {
+    'Paciente': (
+        Paciente,
+        [
+            (RecetaMedica, 'tratamiento__consulta__paciente'),
+            (Tratamiento, 'consulta__paciente'),
+            (ConsultaMedica, 'paciente'),
+            (Cita, 'paciente'),
+        ],
+    ),
+    'Medico': (
+        Medico,
+        [
+            (RecetaMedica, 'tratamiento__consulta__medico'),
+            (Tratamiento, 'consulta__medico'),
+            (ConsultaMedica, 'medico'),
+            (Cita, 'medico'),
+        ],
+    ),
+    'Especialidad': (
+        Especialidad,
+        [
+            (RecetaMedica, 'tratamiento__consulta__medico__especialidad'),
+            (Tratamiento, 'consulta__medico__especialidad'),
+            (ConsultaMedica, 'medico__especialidad'),
+            (Cita, 'medico__especialidad'),
+            (Medico, 'especialidad'),
+        ],
+    ),
+}
+
+
+def _eliminar_por_lotes(queryset):
+    """
+    Elimina los registros del queryset en lotes de TAMANO_LOTE.
+    Devuelve la cantidad de filas principales eliminadas.
+    """
+    total = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:TAMANO_LOTE])
+        if not ids:
+            return total
+        queryset.model.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+
+
+@tarea('eliminar_registro')
+def eliminar_registro(contexto, modelo, pk, usuario_id=None):
+    """
+    Elimina un paciente, médico o especialidad junto con todo su historial,
+    borrando primero los registros dependientes por lotes. Los borrados
+    quedan en la bitácora de auditoría a nombre de quien los solicitó.
+    """
+    Modelo, dependientes = PLANES_ELIMINACION[modelo]
+    usuario = get_user_model()._default_manager.filter(pk=usuario_id).first() if usuario_id else None
+    eliminados = {}
+    with auditando(usuario):
+        for paso, (Dependiente, campo) in enumerate(dependientes):
+            contexto.progreso(
+                paso * 100 / (len(dependientes) + 1), f"Eliminando {Dependiente._meta.verbose_name_plural}",
+            )
+            eliminados[Dependiente.__name__] = _eliminar_por_lotes(Dependiente.objects.filter(**{campo: pk}))
+        eliminados[modelo], _ = Modelo.objects.filter(pk=pk).delete()
+    return {'eliminados': eliminados}
+
+
+@tarea('exportar_consultas_csv')
+def exportar_consultas_csv(contexto, filtros=None):
+    """
+    Exporta a CSV las consultas que cumplen los filtros de ConsultaMedicaFilter.
+    El archivo queda en EXPORTACIONES_DIR y se descarga desde la API de trabajos.
+    """
+    queryset = ConsultaMedicaFilter(filtros or {}, queryset=ConsultaMedica.objects.all()).qs
+    total = queryset.count()
+    directorio = Path(settings.EXPORTACIONES_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    nombre = f"consultas_{contexto.trabajo_id}.csv"
+
+    filas = queryset.order_by('pk').values_list(
+        'id', 'fecha_consulta', 'paciente__rut', 'paciente__nombre', 'paciente__apellido',
+        'medico__nombre', 'medico__apellido', 'motivo', 'diagnostico', 'estado',
+    )
+    with open(directorio / nombre, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow([
+            'id', 'fecha_consulta', 'rut_paciente', 'nombre_paciente', 'apellido_paciente',
+            'nombre_medico', 'apellido_medico', 'motivo', 'diagnostico', 'estado',
+        ])
+        for numero, fila in enumerate(filas.iterator(chunk_size=2000), start=1):
+            escritor.writerow(fila)
+            if numero % 5000 == 0:
+                contexto.progreso(numero * 100 / total, f"{numero} de {total} consultas")
+    return {'archivo': nombre, 'filas': total}
+
+
+@tarea('recalcular_pronostico')
+def recalcular_pronostico(contexto):
+    """
+    Recalcula el pronóstico de consumo de medicamentos y lo deja en la cache.
+    """
+    pronostico = obtener_pronostico(refrescar=True)
+    return {'medicamentos': len(pronostico['medicamentos']), 'calculado': pronostico['calculado']}
+
+
+@tarea('enviar_recordatorios')
+def enviar_recordatorios(contexto, concurrencia=4):
+    """
+    Genera los recordatorios de las próximas citas y despacha la bandeja de
+    salida, en cada una de las sedes.
+    """
+    resultado = {'generados': 0, 'enviados': 0, 'fallidos': 0}
+    sedes = alias_sedes()
+    for indice, alias in enumerate(sedes):
+        with en_sede(alias):
+            resultado['generados'] += generar()
+            for clave, valor in despachar(concurrencia).items():
+                resultado[clave] += valor
+        contexto.progreso((indice + 1) * 100 / len(sedes), f"Sede {alias} procesada")
+    return resultado
@@ -1,3 +1,1888 @@
-from django.test import TestCase
+"""
+Pruebas de la app gestion_clinica.
+Se ejecutan con `python manage.py test gestion_clinica`.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    admin, agenda, analitica, auditoria, busqueda, calendario, checks, coalescencia, conteo, eventos, idempotencia,
+    instantaneas, medicacion, pronostico, recordatorios, relaciones, sedes,
+)
+from .eventos import BrokerMemoria, Suscripcion, obtener_broker
+from .models import (
+    Cita, ClaveIdempotencia, Clinica, ConsultaMedica, Especialidad, MedicacionActiva, Medicamento, Medico, Paciente,
+    RecetaMedica, PacienteMedico, Recordatorio, RegistroAuditoria, Trabajo, Tratamiento,
+)
+from .normalizacion import normalizar
+from .posologia import parsear_dosis, parsear_duracion
+from .trabajos import ContextoTrabajo, ejecutar, encolar, recuperar_huerfanos, reservar, tarea
+
+
+# Datos mínimos para las pruebas
+
+def crear_especialidad(nombre='Cardiología'):
+    return Especialidad.objects.create(nombre=nombre, descripcion=f'Especialidad de {nombre}')
+
+
+def crear_paciente(rut='11111111-1', nombre='Ana', apellido='Pérez', **campos):
+    datos = {
+        'fecha_nacimiento': date(1990, 5, 20),
+        'tipo_sangre': 'O+',
+        'correo': 'ana@example.com',
+        'telefono': '+56911111111',
+        'direccion': 'Av. Siempre Viva 123',
+    }
+    datos.update(campos)
+    return Paciente.objects.create(rut=rut, nombre=nombre, apellido=apellido, **datos)
+
+
+def crear_medico(especialidad, rut='22222222-2', nombre='Luis', apellido='Soto', **campos):
+    datos = {'correo': 'luis@example.com', 'telefono': '+56922222222'}
+    datos.update(campos)
+    return Medico.objects.create(rut=rut, nombre=nombre, apellido=apellido, especialidad=especialidad, **datos)
+
+
+def crear_consulta(paciente, medico, fecha=None, **campos):
+    datos = {'motivo': 'Control', 'diagnostico': 'Sin hallazgos', 'estado': 'COMPLETADA'}
+    datos.update(campos)
+    return ConsultaMedica.objects.create(
+        paciente=paciente, medico=medico, fecha_consulta=fecha or timezone.now(), **datos,
+    )
+
+
+def crear_cita(paciente, medico, fecha_hora=None, **campos):
+    datos = {'motivo': 'Control', 'estado': 'PROGRAMADA'}
+    datos.update(campos)
+    return Cita.objects.create(
+        paciente=paciente, medico=medico, fecha_hora=fecha_hora or timezone.now() + timedelta(days=1), **datos,
+    )
+
+
+def crear_tratamiento(consulta, duracion_dias=7, descripcion='Reposo e hidratación'):
+    return Tratamiento.objects.create(consulta=consulta, descripcion=descripcion, duracion_dias=duracion_dias)
+
+
+def crear_medicamento(nombre='Paracetamol', stock=100, **campos):
+    datos = {'laboratorio': 'Chile', 'precio_unitario': Decimal('1500')}
+    datos.update(campos)
+    return Medicamento.objects.create(nombre=nombre, stock=stock, **datos)
+
+
+def crear_receta(tratamiento, medicamento, dosis='500mg', duracion='7 días', **campos):
+    datos = {'frecuencia': '8H', 'motivo': 'Dolor'}
+    datos.update(campos)
+    return RecetaMedica.objects.create(
+        tratamiento=tratamiento, medicamento=medicamento, dosis=dosis, duracion=duracion, **datos,
+    )
+
+
+# Tareas registradas solo para las pruebas de la cola
+
+@tarea('prueba_sumar')
+def prueba_sumar(contexto, a, b):
+    contexto.progreso(50, 'sumando')
+    return {'suma': a + b}
+
+
+@tarea('prueba_fallar', max_intentos=2)
+def prueba_fallar(contexto):
+    raise RuntimeError('falla de prueba')
+
+
+class TrabajosTests(TestCase):
+    """
+    Cola de trabajos en segundo plano (gestion_clinica.trabajos).
+    """
+
+    def test_encolar_tarea_desconocida(self):
+        with self.assertRaises(ValueError):
+            encolar('no_existe')
+
+    def test_reservar_y_ejecutar(self):
+        trabajo = encolar('prueba_sumar', {'a': 2, 'b': 3})
+        reservado = reservar('prueba:1')
+        self.assertEqual(reservado.pk, trabajo.pk)
+        self.assertEqual(reservado.estado, 'EN_PROCESO')
+        self.assertEqual(reservado.intentos, 1)
+        self.assertIsNone(reservar('prueba:2'))
+
+        ejecutar(reservado)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'COMPLETADO')
+        self.assertEqual(trabajo.progreso, 100)
+        self.assertEqual(trabajo.resultado, {'suma': 5})
+
+    def test_trabajo_diferido_no_se_reserva(self):
+        encolar('prueba_sumar', {'a': 1, 'b': 1}, retraso=600)
+        self.assertIsNone(reservar('prueba:1'))
+
+    def test_progreso_se_acota(self):
+        trabajo = encolar('prueba_sumar', {'a': 1, 'b': 1})
+        ContextoTrabajo(trabajo).progreso(150, 'x' * 300)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.progreso, 100)
+        self.assertEqual(len(trabajo.mensaje), 200)
+
+    def test_fallo_reintenta_y_luego_queda_fallido(self):
+        trabajo = encolar('prueba_fallar')
+        with self.assertLogs('gestion_clinica.trabajos', 'ERROR'):
+            ejecutar(reservar('prueba:1'))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'PENDIENTE')
+        self.assertEqual(trabajo.error, 'RuntimeError: falla de prueba')
+        self.assertGreater(trabajo.ejecutar_desde, timezone.now())
+
+        Trabajo.objects.filter(pk=trabajo.pk).update(ejecutar_desde=timezone.now())
+        with self.assertLogs('gestion_clinica.trabajos', 'ERROR'):
+            ejecutar(reservar('prueba:1'))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'FALLIDO')
+        self.assertIsNotNone(trabajo.finalizado)
+
+    def test_tarea_no_registrada_queda_fallida(self):
+        trabajo = Trabajo.objects.create(tarea='desaparecida')
+        ejecutar(reservar('prueba:1'))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'FALLIDO')
+
+    @override_settings(TRABAJOS_TIMEOUT=60)
+    def test_recuperar_huerfanos(self):
+        hace_rato = timezone.now() - timedelta(minutes=5)
+        reintentable = Trabajo.objects.create(
+            tarea='prueba_sumar', estado='EN_PROCESO', worker='caido', iniciado=hace_rato, intentos=1,
+        )
+        agotado = Trabajo.objects.create(
+            tarea='prueba_sumar', estado='EN_PROCESO', worker='caido', iniciado=hace_rato,
+            intentos=3, max_intentos=3,
+        )
+        reciente = Trabajo.objects.create(
+            tarea='prueba_sumar', estado='EN_PROCESO', worker='vivo', iniciado=timezone.now(), intentos=1,
+        )
+
+        with self.assertLogs('gestion_clinica.trabajos', 'WARNING'):
+            self.assertEqual(recuperar_huerfanos(), 1)
+        for trabajo in (reintentable, agotado, reciente):
+            trabajo.refresh_from_db()
+        self.assertEqual(reintentable.estado, 'PENDIENTE')
+        self.assertEqual(agotado.estado, 'FALLIDO')
+        self.assertEqual(reciente.estado, 'EN_PROCESO')
+
+    def test_eliminar_paciente_se_encola(self):
+        especialidad = crear_especialidad()
+        paciente = crear_paciente()
+        crear_consulta(paciente, crear_medico(especialidad))
+
+        respuesta = self.client.post(reverse('paciente-delete', args=[paciente.pk]))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertTrue(Paciente.objects.filter(pk=paciente.pk).exists())
+        trabajo = Trabajo.objects.get(tarea='eliminar_registro')
+        self.assertEqual(trabajo.parametros['pk'], paciente.pk)
+
+        ejecutar(reservar('prueba:1'))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'COMPLETADO')
+        self.assertFalse(Paciente.objects.filter(pk=paciente.pk).exists())
+        self.assertFalse(ConsultaMedica.objects.exists())
+
+    def test_consultar_trabajo(self):
+        trabajo = encolar('prueba_sumar', {'a': 1, 'b': 2})
+        respuesta = self.client.get(reverse('trabajo-detail', args=[trabajo.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['estado'], 'PENDIENTE')
+        self.assertEqual(self.client.get(reverse('trabajo-detail', args=[trabajo.pk + 1])).status_code, 404)
+
+    def test_error_sin_traceback(self):
+        trabajo = encolar('prueba_fallar')
+        with self.assertLogs('gestion_clinica.trabajos', 'ERROR') as registros:
+            ejecutar(reservar('prueba:1'))
+        self.assertIn('Traceback', registros.output[0])
+        error = self.client.get(reverse('trabajo-detail', args=[trabajo.pk])).json()['error']
+        self.assertEqual(error, 'RuntimeError: falla de prueba')
+
+
+class AutocompletarTests(TestCase):
+    """
+    Búsquedas remotas de los widgets de autocompletado (gestion_clinica.autocompletar).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = crear_paciente('11111111-1', 'Ana', 'Peña')
+        cls.bruno = crear_paciente('12222222-2', 'Bruno', 'Pereira')
+        cls.carla = crear_paciente('23333333-3', 'Carla', 'Rojas')
+
+    def buscar(self, recurso, **parametros):
+        return self.client.get(reverse('autocompletar', args=[recurso]), parametros)
+
+    def test_busqueda_por_prefijo(self):
+        datos = self.buscar('pacientes', q='pe').json()
+        self.assertCountEqual([r['id'] for r in datos['resultados']], [self.bruno.pk, self.ana.pk])
+        self.assertFalse(datos['hay_mas'])
+
+    def test_cada_palabra_debe_coincidir(self):
+        datos = self.buscar('pacientes', q='ana pe').json()
+        self.assertEqual([r['id'] for r in datos['resultados']], [self.ana.pk])
+        self.assertIn('11111111-1', datos['resultados'][0]['texto'])
+
+    def test_paginacion_sin_conteo(self):
+        for numero in range(25):
+            crear_paciente(f'3{numero:07}-0', f'Nombre{numero}', 'Zúñiga')
+        primera = self.buscar('pacientes', q='zú').json()
+        segunda = self.buscar('pacientes', q='zú', pagina=2).json()
+        self.assertEqual(len(primera['resultados']), 20)
+        self.assertTrue(primera['hay_mas'])
+        self.assertEqual(len(segunda['resultados']), 5)
+        self.assertFalse(segunda['hay_mas'])
+        # Una página inválida se trata como la primera
+        self.assertEqual(self.buscar('pacientes', q='zú', pagina='x').json(), primera)
+
+    def test_medicamentos_sin_tildes(self):
+        crear_medicamento('Ácido fólico')
+        datos = self.buscar('medicamentos', q='ACIDO').json()
+        self.assertEqual([r['texto'] for r in datos['resultados']], ['Ácido fólico'])
+
+    def test_recurso_desconocido(self):
+        self.assertEqual(self.buscar('usuarios', q='a').status_code, 404)
+
+    def test_formulario_solo_dibuja_la_opcion_elegida(self):
+        from .forms import ConsultaMedicaForm
+
+        html = ConsultaMedicaForm(initial={'paciente': self.ana.pk}).as_p()
+        self.assertIn(f'value="{self.ana.pk}" selected', html)
+        self.assertNotIn('Bruno', html)
+        self.assertIn(reverse('autocompletar', args=['pacientes']), html)
+
+
+class FragmentosListadoTests(TestCase):
+    """
+    Filas de los listados web cacheadas por fecha de modificación.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.paciente = crear_paciente()
+        self.medico = crear_medico(crear_especialidad())
+        self.consulta = crear_consulta(self.paciente, self.medico)
+
+    def test_la_fila_se_reutiliza_mientras_no_cambie(self):
+        self.client.get(reverse('paciente-list'))
+        # Un UPDATE que no toca updated_at no invalida la fila cacheada
+        Paciente.objects.filter(pk=self.paciente.pk).update(nombre='Cambiado')
+        self.assertNotContains(self.client.get(reverse('paciente-list')), 'Cambiado')
+
+    def test_editar_renderiza_de_nuevo_la_fila(self):
+        self.client.get(reverse('paciente-list'))
+        self.paciente.nombre = 'Andrea'
+        self.paciente.save()
+        self.assertContains(self.client.get(reverse('paciente-list')), 'Andrea')
+
+    def test_editar_un_relacionado_renderiza_sus_filas(self):
+        self.client.get(reverse('consulta-list'))
+        self.paciente.nombre = 'Andrea'
+        self.paciente.save()
+        self.assertContains(self.client.get(reverse('consulta-list')), 'Andrea')
+
+
+@override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=0)
+class SincronizacionTests(TestCase):
+    """
+    Sincronización delta con lápidas (gestion_clinica.sincronizacion).
+    """
+
+    def sincronizar(self, since='', **parametros):
+        respuesta = self.client.get(reverse('sincronizacion'), {'since': since, **parametros})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_sincronizacion_completa_y_delta(self):
+        paciente = crear_paciente()
+        crear_especialidad()
+        primera = self.sincronizar()
+        self.assertTrue(primera['completo'])
+        self.assertEqual([p['id'] for p in primera['cambios']['pacientes']], [paciente.pk])
+        self.assertEqual(len(primera['cambios']['especialidades']), 1)
+
+        self.assertEqual(self.sincronizar(primera['siguiente'])['cambios'], {})
+
+        paciente.nombre = 'Andrea'
+        paciente.save()
+        delta = self.sincronizar(primera['siguiente'])
+        self.assertEqual(list(delta['cambios']), ['pacientes'])
+        self.assertEqual(delta['cambios']['pacientes'][0]['nombre'], 'Andrea')
+
+    def test_paginas_enlazadas(self):
+        crear_paciente('11111111-1')
+        crear_paciente('22222222-2')
+        primera = self.sincronizar(limite=1)
+        self.assertFalse(primera['completo'])
+        segunda = self.sincronizar(primera['siguiente'], limite=1)
+        ids = [p['id'] for p in primera['cambios']['pacientes'] + segunda['cambios']['pacientes']]
+        self.assertEqual(len(set(ids)), 2)
+
+    def test_eliminados_como_lapidas(self):
+        paciente = crear_paciente()
+        token = self.sincronizar()['siguiente']
+        pk = paciente.pk
+        paciente.delete()
+        delta = self.sincronizar(token)
+        self.assertEqual(delta['eliminados'], {'pacientes': [pk]})
+
+    def test_parametros_invalidos(self):
+        url = reverse('sincronizacion')
+        self.assertEqual(self.client.get(url, {'since': 'no-es-un-token'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limite': 'diez'}).status_code, 400)
+
+
+class EventosTests(TestCase):
+    """
+    Publicación en vivo de los cambios de citas y consultas (gestion_clinica.eventos).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.paciente = crear_paciente()
+        cls.medico = crear_medico(crear_especialidad())
+
+    def test_se_publica_al_confirmar(self):
+        with mock.patch.object(obtener_broker(), 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                cita = crear_cita(self.paciente, self.medico)
+                publicar.assert_not_called()
+        evento = publicar.call_args.args[0]
+        self.assertEqual(evento['tipo'], 'cita')
+        self.assertEqual(evento['accion'], 'creada')
+        self.assertEqual(evento['objeto_id'], cita.pk)
+        self.assertEqual(evento['medico'], self.medico.pk)
+
+    def test_no_se_publica_si_la_transaccion_no_confirma(self):
+        with mock.patch.object(obtener_broker(), 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    crear_consulta(self.paciente, self.medico)
+                    raise RuntimeError('rollback')
+        publicar.assert_not_called()
+
+    def test_filtros_de_la_suscripcion(self):
+        evento = {'sede': 'default', 'medico': 7, 'dia': '2025-01-15'}
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertTrue(Suscripcion(loop).acepta(evento))
+        self.assertTrue(Suscripcion(loop, medico=7, fecha='2025-01-15').acepta(evento))
+        self.assertFalse(Suscripcion(loop, medico=8).acepta(evento))
+        self.assertFalse(Suscripcion(loop, fecha='2025-01-16').acepta(evento))
+        self.assertFalse(Suscripcion(loop, sede='norte').acepta(evento))
+
+    def test_cola_llena_descarta_el_mas_antiguo(self):
+        async def probar():
+            broker = BrokerMemoria()
+            suscripcion = broker.suscribir()
+            suscripcion.cola = asyncio.Queue(maxsize=2)
+            for numero in range(3):
+                broker.publicar({'sede': 'default', 'medico': 1, 'dia': '2025-01-15', 'n': numero})
+            await asyncio.sleep(0)
+            return [suscripcion.cola.get_nowait()['n'] for _ in range(suscripcion.cola.qsize())]
+
+        self.assertEqual(asyncio.run(probar()), [1, 2])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(reverse('eventos'), {'medico': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('eventos'), {'fecha': '15/01/2025'}).status_code, 400)
+
+
+class BusquedaTextoTests(TestCase):
+    """
+    Búsqueda de texto completo en consultas y tratamientos (gestion_clinica.busqueda).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        paciente = crear_paciente()
+        medico = crear_medico(crear_especialidad())
+        cls.gripe = crear_consulta(
+            paciente, medico, motivo='Fiebre alta', diagnostico='Gripe estacional <script>alert(1)</script>',
+        )
+        cls.fractura = crear_consulta(paciente, medico, motivo='Caída', diagnostico='Fractura de muñeca')
+
+    def buscar(self, **parametros):
+        return self.client.get(reverse('busqueda-texto'), parametros)
+
+    def test_busca_por_motivo_y_diagnostico(self):
+        for texto in ('gripe', 'fiebre', 'MUNECA'):
+            with self.subTest(texto=texto):
+                ids = [r['id'] for r in self.buscar(q=texto).json()['resultados']]
+                esperado = self.fractura.pk if texto == 'MUNECA' else self.gripe.pk
+                self.assertEqual(ids, [esperado])
+
+    def test_se_actualiza_al_editar(self):
+        ConsultaMedica.objects.filter(pk=self.fractura.pk).update(diagnostico='Esguince de tobillo')
+        self.assertEqual(self.buscar(q='fractura').json()['resultados'], [])
+        self.assertEqual(len(self.buscar(q='esguince').json()['resultados']), 1)
+
+    def test_fragmento_escapado(self):
+        fragmento = self.buscar(q='gripe').json()['resultados'][0]['fragmento']
+        self.assertIn('<mark>Gripe</mark>', fragmento)
+        self.assertIn('&lt;script&gt;', fragmento)
+        self.assertNotIn('<script>', fragmento)
+
+    def test_fragmento_html_balancea_las_marcas(self):
+        m, f = busqueda.MARCA_INICIO, busqueda.MARCA_FIN
+        self.assertEqual(busqueda.fragmento_html(f'{m}a{m} & b{f}{f}'), '<mark>a &amp; b</mark>')
+        self.assertEqual(busqueda.fragmento_html(f'{m}a'), '<mark>a</mark>')
+        self.assertEqual(busqueda.fragmento_html(None), '')
+
+    def test_no_trae_el_vector(self):
+        consulta = ConsultaMedica.objects.get(pk=self.gripe.pk)
+        self.assertEqual(consulta.get_deferred_fields(), {'busqueda'})
+        self.assertNotIn('busqueda', str(Tratamiento.objects.all().query))
+        # y guardarla no reescribe la columna que mantiene el trigger
+        consulta.motivo = 'Fiebre y tos'
+        consulta.save()
+        self.assertEqual(len(self.buscar(q='tos').json()['resultados']), 1)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.buscar(q='').status_code, 400)
+        self.assertEqual(self.buscar(q='gripe', tipo='recetas').status_code, 400)
+        self.assertEqual(self.buscar(q='gripe', limite='x').status_code, 400)
+
+
+class PronosticoTests(TestCase):
+    """
+    Pronóstico de consumo y quiebre de stock (gestion_clinica.pronostico).
+    """
+
+    def setUp(self):
+        cache.clear()
+        consulta = crear_consulta(crear_paciente(), crear_medico(crear_especialidad()))
+        self.tratamiento = crear_tratamiento(consulta)
+
+    def test_proyectar(self):
+        ids = np.array([1, 2, 3])
+        consumo, quiebre = pronostico.proyectar(
+            medicamento=np.array([1, 2, 9]),
+            dosis=np.array([3.0, 0.0, 1.0]),
+            inicio=np.array([0, 1, 0]),
+            duracion=np.array([7, 1, 7]),
+            unica=np.array([False, True, False]),
+            ids=ids,
+            stock=np.array([10.0, 5.0, 0.0]),
+            horizonte=10,
+        )
+        self.assertEqual(consumo[0].tolist(), [3.0] * 7 + [0.0] * 3)
+        self.assertEqual(consumo[1].tolist(), [0.0, 1.0] + [0.0] * 8)
+        # La receta de un medicamento fuera del catálogo se ignora
+        self.assertEqual(consumo[2].sum(), 0)
+        self.assertEqual(quiebre.tolist(), [3, -1, 0])
+
+    def test_calcular_pronostico(self):
+        paracetamol = crear_medicamento('Paracetamol', stock=10)
+        crear_medicamento('Ibuprofeno', stock=50)
+        crear_receta(self.tratamiento, paracetamol, frecuencia='8H', duracion='7 días')
+
+        resultado = {m['nombre']: m for m in pronostico.calcular_pronostico(horizonte=30)['medicamentos']}
+        self.assertEqual(resultado['Paracetamol']['consumo_diario'], 3.0)
+        self.assertEqual(resultado['Paracetamol']['dias_cobertura'], 3)
+        self.assertEqual(
+            resultado['Paracetamol']['fecha_quiebre'], (timezone.localdate() + timedelta(days=3)).isoformat(),
+        )
+        self.assertIsNone(resultado['Ibuprofeno']['dias_cobertura'])
+
+    def test_stock_bajo(self):
+        paracetamol = crear_medicamento('Paracetamol', stock=10)
+        crear_receta(self.tratamiento, paracetamol, frecuencia='8H', duracion='7 días')
+        url = reverse('medicamento-stock-bajo')
+        medicamentos = self.client.get(url, {'dias': 5}).json()['medicamentos']
+        self.assertEqual([m['nombre'] for m in medicamentos], ['Paracetamol'])
+        self.assertEqual(self.client.get(url, {'dias': 2}).json()['medicamentos'], [])
+        self.assertEqual(self.client.get(url, {'dias': 'x'}).status_code, 400)
+
+    def test_refrescar_encola_el_recalculo(self):
+        respuesta = self.client.get(reverse('medicamento-pronostico'), {'refrescar': 1})
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertTrue(Trabajo.objects.filter(tarea='recalcular_pronostico').exists())
+
+
+class PosologiaTests(TestCase):
+    """
+    Posología estructurada de las recetas (gestion_clinica.posologia).
+    """
+
+    def test_parsear_dosis(self):
+        casos = {
+            '500mg': (Decimal('500'), 'mg'),
+            '1,5 g': (Decimal('1500.0'), 'mg'),
+            '2 comprimidos': (Decimal('2'), 'comprimido'),
+            '10 ml': (Decimal('10'), 'ml'),
+            '1': (Decimal('1'), 'unidad'),
+            '3 cucharadas': (None, ''),
+            'según indicación': (None, ''),
+            '': (None, ''),
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(parsear_dosis(texto), esperado)
+
+    def test_parsear_duracion(self):
+        casos = {'7 días': 7, '2 semanas': 14, '1 mes': 30, '10': 10, '3 años': None, 'crónico': None, None: None}
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(parsear_duracion(texto), esperado)
+
+    def test_guardar_calcula_los_campos(self):
+        consulta = crear_consulta(crear_paciente(), crear_medico(crear_especialidad()))
+        tratamiento = crear_tratamiento(consulta, duracion_dias=5)
+        medicamento = crear_medicamento()
+        inicio = timezone.localtime(consulta.fecha_consulta).date()
+
+        receta = crear_receta(tratamiento, medicamento, dosis='1 g', duracion='2 semanas')
+        self.assertEqual((receta.dosis_cantidad, receta.dosis_unidad), (Decimal('1000'), 'mg'))
+        self.assertEqual((receta.fecha_inicio, receta.fecha_fin), (inicio, inicio + timedelta(days=13)))
+
+        # Una duración no reconocida toma la del tratamiento
+        receta = crear_receta(tratamiento, medicamento, duracion='hasta nuevo aviso')
+        self.assertEqual(receta.duracion_dias, 5)
+        self.assertEqual(receta.fecha_fin, inicio + timedelta(days=4))
+
+    def test_relleno_por_lotes(self):
+        consulta = crear_consulta(crear_paciente(), crear_medico(crear_especialidad()))
+        tratamiento = crear_tratamiento(consulta)
+        medicamento = crear_medicamento()
+        recetas = [crear_receta(tratamiento, medicamento, dosis=f'{n} mg', duracion='3 días') for n in (1, 2, 3)]
+        RecetaMedica.objects.update(dosis_cantidad=None, dosis_unidad='', duracion_dias=None, fecha_fin=None)
+
+        migracion = import_module('gestion_clinica.migrations.0010_rellenar_posologia')
+        with mock.patch.object(migracion, 'TAMANO_LOTE', 2):
+            migracion.rellenar_posologia(apps, SimpleNamespace(connection=connection))
+        for numero, receta in enumerate(recetas, start=1):
+            receta.refresh_from_db()
+            self.assertEqual(receta.dosis_cantidad, numero)
+            self.assertEqual(receta.duracion_dias, 3)
+            self.assertEqual(receta.fecha_fin, receta.fecha_inicio + timedelta(days=2))
+
+
+class VigenciaTests(TestCase):
+    """
+    Vigencia indexada de tratamientos y recetas (filtro activo_en).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        paciente = crear_paciente()
+        medico = crear_medico(crear_especialidad())
+        fecha = timezone.make_aware(datetime(2025, 1, 15, 10, 0))
+        cls.corto = crear_tratamiento(crear_consulta(paciente, medico, fecha), duracion_dias=3)
+        cls.largo = crear_tratamiento(crear_consulta(paciente, medico, fecha), duracion_dias=30)
+        cls.receta = crear_receta(cls.corto, crear_medicamento(), duracion='indefinida')
+
+    def ids(self, url, fecha):
+        respuesta = self.client.get(url, {'activo_en': fecha})
+        self.assertEqual(respuesta.status_code, 200)
+        return [fila['id'] for fila in respuesta.json()['results']]
+
+    def test_fechas_calculadas(self):
+        self.assertEqual((self.corto.fecha_inicio, self.corto.fecha_fin), (date(2025, 1, 15), date(2025, 1, 17)))
+
+    def test_filtro_activo_en(self):
+        url = reverse('tratamiento-list-create')
+        self.assertEqual(self.ids(url, '2025-01-14'), [])
+        self.assertCountEqual(self.ids(url, '2025-01-17'), [self.corto.pk, self.largo.pk])
+        self.assertEqual(self.ids(url, '2025-01-18'), [self.largo.pk])
+        self.assertEqual(self.ids(reverse('receta-list-create'), '2025-01-17'), [self.receta.pk])
+        self.assertEqual(self.ids(reverse('receta-list-create'), '2025-01-18'), [])
+
+    def test_cambiar_duracion_actualiza_las_recetas(self):
+        self.corto.duracion_dias = 10
+        self.corto.save()
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.fecha_fin, date(2025, 1, 24))
+
+    def test_fecha_invalida(self):
+        respuesta = self.client.get(reverse('tratamiento-list-create'), {'activo_en': 'mañana'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class MedicacionActivaTests(TestCase):
+    """
+    Índice de medicación activa y aviso de terapia duplicada (gestion_clinica.medicacion).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.paciente = crear_paciente()
+        medico = crear_medico(crear_especialidad())
+        fecha = timezone.make_aware(datetime(2025, 1, 15, 10, 0))
+        cls.consulta = crear_consulta(cls.paciente, medico, fecha)
+        cls.tratamiento = crear_tratamiento(cls.consulta, duracion_dias=7)
+        cls.paracetamol = crear_medicamento('Paracetamol')
+        cls.ibuprofeno = crear_medicamento('Ibuprofeno')
+        cls.receta = crear_receta(cls.tratamiento, cls.paracetamol, duracion='7 días')
+
+    def datos(self, **campos):
+        datos = {
+            'tratamiento': self.tratamiento.pk, 'medicamento': self.paracetamol.pk, 'dosis': '500mg',
+            'frecuencia': '8H', 'duracion': '3 días', 'motivo': 'Dolor',
+        }
+        datos.update(campos)
+        return datos
+
+    def test_la_receta_mantiene_su_fila(self):
+        activa = MedicacionActiva.objects.get(receta=self.receta)
+        self.assertEqual(activa.paciente_id, self.paciente.pk)
+        self.assertEqual((activa.fecha_inicio, activa.fecha_fin), (date(2025, 1, 15), date(2025, 1, 21)))
+        self.receta.delete()
+        self.assertFalse(MedicacionActiva.objects.exists())
+
+    def test_mensaje_duplicado(self):
+        aviso = medicacion.mensaje_duplicado(self.tratamiento, self.paracetamol, '3 días')
+        self.assertIn(f'receta #{self.receta.pk}', aviso)
+        self.assertIsNone(medicacion.mensaje_duplicado(self.tratamiento, self.ibuprofeno, '3 días'))
+        # Al editar, la receta no choca consigo misma
+        self.assertIsNone(medicacion.mensaje_duplicado(self.tratamiento, self.paracetamol, '3 días', self.receta))
+
+    def test_sin_superposicion_en_fechas(self):
+        fecha = self.consulta.fecha_consulta + timedelta(days=7)
+        posterior = crear_tratamiento(crear_consulta(self.paciente, self.consulta.medico, fecha))
+        self.assertIsNone(medicacion.mensaje_duplicado(posterior, self.paracetamol, '3 días'))
+
+    def test_tratamiento_sin_guardar(self):
+        nuevo = Tratamiento(consulta=self.consulta, descripcion='Nuevo', duracion_dias=3)
+        self.assertEqual(medicacion.vigencia_receta(nuevo, '2 días'), (date(2025, 1, 15), date(2025, 1, 16)))
+        self.assertIsNotNone(medicacion.mensaje_duplicado(nuevo, self.paracetamol, ''))
+        self.assertIsNone(medicacion.vigencia_receta(Tratamiento(duracion_dias=3), '2 días'))
+
+    def test_revisar_duplicado_en_transaccion(self):
+        with transaction.atomic():
+            self.assertIsNotNone(medicacion.revisar_duplicado(self.tratamiento, self.paracetamol, '3 días'))
+
+    def test_api_rechaza_duplicados_sin_confirmar(self):
+        url = reverse('receta-list-create')
+        respuesta = self.client.post(url, self.datos(), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('confirmar_duplicado', respuesta.json())
+        respuesta = self.client.post(url, self.datos(confirmar_duplicado=True), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 201)
+        respuesta = self.client.post(url, self.datos(medicamento=self.ibuprofeno.pk), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 201)
+
+    def test_formulario_rechaza_duplicados_sin_confirmar(self):
+        respuesta = self.client.post(reverse('receta-create'), self.datos())
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'vigente en esas fechas')
+        self.assertEqual(RecetaMedica.objects.count(), 1)
+        respuesta = self.client.post(reverse('receta-create'), self.datos(confirmar_duplicado='on'))
+        self.assertRedirects(respuesta, reverse('receta-list'), fetch_redirect_response=False)
+        self.assertEqual(RecetaMedica.objects.count(), 2)
+
+    def test_reconstruir(self):
+        MedicacionActiva.objects.all().delete()
+        call_command('reconstruir_medicacion_activa', lote=1, stdout=StringIO())
+        self.assertEqual(list(MedicacionActiva.objects.values_list('receta_id', flat=True)), [self.receta.pk])
+
+
+class AgendaTests(TestCase):
+    """
+    Agenda diaria y semanal por médico con cache versionada (gestion_clinica.agenda).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.paciente = crear_paciente()
+        cls.medico = crear_medico(crear_especialidad())
+        cls.dia = timezone.localdate() + timedelta(days=1)
+        cls.cita = crear_cita(cls.paciente, cls.medico, cls.hora(11))
+        cls.consulta = crear_consulta(cls.paciente, cls.medico, cls.hora(9, 30))
+
+    @classmethod
+    def hora(cls, hora, minuto=0, dia=None):
+        inicio = datetime.combine(dia or cls.dia, datetime.min.time())
+        return timezone.make_aware(inicio + timedelta(hours=hora, minutes=minuto))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_entradas_del_dia(self):
+        entradas = agenda.agenda_dia(self.medico.pk, self.dia)
+        self.assertEqual(
+            [(e['tipo'], e['id']) for e in entradas], [('consulta', self.consulta.pk), ('cita', self.cita.pk)],
+        )
+        self.assertEqual(entradas[1]['paciente']['rut'], self.paciente.rut)
+        self.assertEqual(agenda.agenda_dia(self.medico.pk, self.dia + timedelta(days=1)), [])
+
+    def test_segunda_lectura_desde_la_cache(self):
+        agenda.agenda_dia(self.medico.pk, self.dia)
+        with self.assertNumQueries(0):
+            agenda.agenda_dia(self.medico.pk, self.dia)
+
+    def test_cambios_confirmados_invalidan_el_dia(self):
+        agenda.agenda_dia(self.medico.pk, self.dia)
+        with self.captureOnCommitCallbacks(execute=True):
+            nueva = crear_cita(self.paciente, self.medico, self.hora(16))
+        self.assertIn(nueva.pk, [e['id'] for e in agenda.agenda_dia(self.medico.pk, self.dia)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.telefono = '+56999999999'
+            self.paciente.save()
+        entradas = agenda.agenda_dia(self.medico.pk, self.dia)
+        self.assertEqual({e['paciente']['telefono'] for e in entradas}, {'+56999999999'})
+
+    def test_datos_del_paciente_que_no_muestra_la_agenda(self):
+        with mock.patch.object(agenda, 'invalidar_paciente') as invalidar:
+            self.paciente.correo = 'otra@example.com'
+            self.paciente.direccion = 'Otra calle 123'
+            self.paciente.save()
+            invalidar.assert_not_called()
+            self.paciente.nombre = 'Andrea'
+            self.paciente.save(update_fields=['nombre'])
+            invalidar.assert_called_once()
+            # Un paciente cargado sin el campo también se compara contra la base
+            paciente = Paciente.objects.only('pk').get(pk=self.paciente.pk)
+            paciente.apellido = 'Rojas'
+            paciente.save(update_fields=['apellido'])
+            self.assertEqual(invalidar.call_count, 2)
+
+    def test_fuera_de_la_ventana_no_se_cachea(self):
+        antiguo = self.dia - timedelta(days=400)
+        crear_cita(self.paciente, self.medico, self.hora(10, dia=antiguo))
+        self.assertEqual(len(agenda.agenda_dia(self.medico.pk, antiguo)), 1)
+        self.assertFalse(cache.get(agenda.clave_version(self.medico.pk, antiguo)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.nombre = 'Andrea'
+            self.paciente.save()
+        # Se arma en cada lectura, así que siempre refleja el cambio
+        self.assertEqual(agenda.agenda_dia(self.medico.pk, antiguo)[0]['paciente']['nombre'], 'Andrea')
+
+    def test_invalidar_paciente_solo_recorre_la_ventana(self):
+        crear_cita(self.paciente, self.medico, self.hora(10, dia=self.dia - timedelta(days=400)))
+        with mock.patch.object(agenda, 'invalidar') as invalidar:
+            agenda.invalidar_paciente(self.paciente.pk, 'default')
+        self.assertEqual(invalidar.call_args.args[0], {(self.medico.pk, self.dia)})
+
+    def test_lectura_atrasada_no_pisa_la_version_vigente(self):
+        version = agenda.versiones(self.medico.pk, [self.dia])[self.dia]
+        with self.captureOnCommitCallbacks(execute=True):
+            agenda.invalidar([(self.medico.pk, self.dia)], 'default')
+        # Una lectura que empezó antes del cambio guarda bajo la versión anterior
+        cache.set(agenda.clave_dia(self.medico.pk, self.dia, version), [{'id': 'viejo'}])
+        self.assertNotIn('viejo', [e['id'] for e in agenda.agenda_dia(self.medico.pk, self.dia)])
+
+    def test_api(self):
+        url = reverse('medico-agenda', args=[self.medico.pk])
+        dia = self.client.get(url, {'fecha': self.dia.isoformat()}).json()
+        self.assertEqual(len(dia['entradas']), 2)
+        semana = self.client.get(url, {'fecha': self.dia.isoformat(), 'vista': 'semana'}).json()
+        lunes = self.dia - timedelta(days=self.dia.weekday())
+        domingo = lunes + timedelta(days=6)
+        self.assertEqual((semana['desde'], semana['hasta']), (lunes.isoformat(), domingo.isoformat()))
+        self.assertEqual(
+            [len(d['entradas']) for d in semana['dias']], [2 if n == self.dia.weekday() else 0 for n in range(7)],
+        )
+
+    def test_api_parametros_invalidos(self):
+        url = reverse('medico-agenda', args=[self.medico.pk])
+        self.assertEqual(self.client.get(url, {'fecha': '15-01-2025'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'vista': 'mes'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('medico-agenda', args=[self.medico.pk + 1])).status_code, 404)
+
+
+class CalendarioTests(TestCase):
+    """
+    Feeds iCalendar por médico y especialidad (gestion_clinica.calendario).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = crear_especialidad()
+        cls.medico = crear_medico(cls.especialidad)
+        cls.paciente = crear_paciente()
+        cls.cita = crear_cita(cls.paciente, cls.medico, motivo='Control, presión; arterial', estado='CONFIRMADA')
+        cls.antigua = crear_cita(cls.paciente, cls.medico, timezone.now() - timedelta(days=365))
+
+    def feed(self, **cabeceras):
+        return self.client.get(reverse('medico-calendario', args=[self.medico.pk]), headers=cabeceras)
+
+    def test_feed_del_medico(self):
+        respuesta = self.feed()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/calendar; charset=utf-8')
+        contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertTrue(contenido.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:cita-{self.cita.pk}@saludvital', contenido)
+        self.assertNotIn(f'UID:cita-{self.antigua.pk}@', contenido)
+        self.assertIn('DESCRIPTION:Control\\, presión\\; arterial', contenido)
+        self.assertIn('STATUS:CONFIRMED', contenido)
+
+    def test_feed_de_la_especialidad(self):
+        respuesta = self.client.get(reverse('especialidad-calendario', args=[self.especialidad.pk]))
+        self.assertIn(f'UID:cita-{self.cita.pk}@saludvital', b''.join(respuesta.streaming_content).decode())
+
+    def test_etag(self):
+        etag = self.feed()['ETag']
+        self.assertEqual(self.feed(if_none_match=etag).status_code, 304)
+        self.cita.estado = 'CANCELADA'
+        self.cita.save()
+        respuesta = self.feed(if_none_match=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_etag_cambia_con_el_medico(self):
+        etag = self.feed()['ETag']
+        self.medico.correo = 'soto@example.com'
+        self.medico.save()
+        respuesta = self.feed(if_none_match=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'soto@example.com')
+
+    def test_lineas_plegadas(self):
+        plegada = calendario._plegar('SUMMARY:' + 'ñ' * 80)
+        lineas = plegada.split('\r\n')[:-1]
+        self.assertTrue(all(len(linea.encode()) <= 75 for linea in lineas))
+        self.assertEqual(''.join(linea.lstrip(' ') for linea in lineas), 'SUMMARY:' + 'ñ' * 80)
+
+    def test_medico_inexistente(self):
+        self.assertEqual(self.client.get(reverse('medico-calendario', args=[self.medico.pk + 1])).status_code, 404)
+
+
+class RemitentePrueba:
+    """
+    Remitente que guarda lo enviado y hace fallar los destinos indicados.
+    """
+    def __init__(self, fallar=()):
+        self.enviados = []
+        self.fallar = set(fallar)
+
+    def enviar(self, lote):
+        self.enviados.extend(lote)
+        return {r.pk: 'rechazado' for r in lote if r.destino in self.fallar}
+
+
+class RecordatoriosTests(TestCase):
+    """
+    Recordatorios de citas a través de la bandeja de salida (gestion_clinica.recordatorios).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = crear_medico(crear_especialidad())
+        cls.ana = crear_paciente('11111111-1', 'Ana', correo='ana@example.com')
+        cls.bruno = crear_paciente('22222222-2', 'Bruno', correo='', telefono='+56933333333')
+
+    def setUp(self):
+        self.ahora = timezone.now()
+
+    def cita(self, paciente, horas=2, **campos):
+        return crear_cita(paciente, self.medico, self.ahora + timedelta(hours=horas), **campos)
+
+    def test_generar(self):
+        correo = self.cita(self.ana)
+        sms = self.cita(self.bruno)
+        self.cita(self.ana, horas=48)
+        self.cita(self.ana, estado='CANCELADA')
+
+        self.assertEqual(recordatorios.generar(self.ahora, lote=1), 2)
+        self.assertEqual(recordatorios.generar(self.ahora), 0)
+        self.assertEqual(
+            dict(Recordatorio.objects.values_list('cita_id', 'canal')), {correo.pk: 'CORREO', sms.pk: 'SMS'},
+        )
+        self.assertEqual(Recordatorio.objects.get(cita=sms).destino, '+56933333333')
+
+    def test_despachar_lote(self):
+        self.cita(self.ana)
+        self.cita(self.bruno)
+        recordatorios.generar(self.ahora)
+        remitente = RemitentePrueba(fallar={'+56933333333'})
+
+        lote = recordatorios.reservar_lote('prueba', 10)
+        self.assertEqual(len(lote), 2)
+        self.assertEqual(recordatorios.reservar_lote('otro', 10), [])
+        self.assertEqual(recordatorios.despachar_lote(remitente, lote), (1, 1))
+        self.assertEqual(
+            dict(Recordatorio.objects.values_list('destino', 'estado')),
+            {'ana@example.com': 'ENVIADO', '+56933333333': 'PENDIENTE'},
+        )
+
+    @override_settings(RECORDATORIOS_ESPERA_SEGUNDOS=30)
+    def test_reintento_con_espera(self):
+        self.assertEqual(
+            [recordatorios.espera_reintento(n).total_seconds() for n in (1, 2, 3)], [30, 60, 120],
+        )
+        self.cita(self.bruno)
+        recordatorios.generar(self.ahora)
+        remitente = RemitentePrueba(fallar={'+56933333333'})
+        recordatorios.despachar_lote(remitente, recordatorios.reservar_lote('prueba', 10))
+        recordatorio = Recordatorio.objects.get()
+        self.assertEqual((recordatorio.estado, recordatorio.intentos), ('PENDIENTE', 1))
+        self.assertGreater(recordatorio.proximo_intento, timezone.now() + timedelta(seconds=25))
+        # Un fallo no se reintenta de inmediato: el worker no lo vuelve a tomar
+        self.assertEqual(recordatorios.reservar_lote('prueba', 10), [])
+        Recordatorio.objects.update(proximo_intento=timezone.now())
+        self.assertEqual(len(recordatorios.reservar_lote('prueba', 10)), 1)
+
+    @override_settings(RECORDATORIOS_MAX_INTENTOS=1)
+    def test_sin_intentos_queda_fallido(self):
+        self.cita(self.bruno)
+        recordatorios.generar(self.ahora)
+        lote = recordatorios.reservar_lote('prueba', 10)
+        recordatorios.despachar_lote(RemitentePrueba(fallar={'+56933333333'}), lote)
+        recordatorio = Recordatorio.objects.get()
+        self.assertEqual((recordatorio.estado, recordatorio.error), ('FALLIDO', 'rechazado'))
+
+    def test_citas_canceladas_o_reagendadas(self):
+        cancelada = self.cita(self.ana)
+        reagendada = self.cita(self.bruno)
+        recordatorios.generar(self.ahora)
+        Cita.objects.filter(pk=cancelada.pk).update(estado='CANCELADA')
+        Cita.objects.filter(pk=reagendada.pk).update(fecha_hora=self.ahora + timedelta(hours=5))
+
+        self.assertEqual(recordatorios.reservar_lote('prueba', 10), [])
+        self.assertEqual(recordatorios.generar(self.ahora), 1)
+        recordatorio = Recordatorio.objects.get()
+        self.assertEqual(recordatorio.cita_id, reagendada.pk)
+        self.assertEqual(recordatorio.fecha_cita, self.ahora + timedelta(hours=5))
+
+    @override_settings(RECORDATORIOS_REINTENTOS_RESERVA=3)
+    def test_worker_se_detiene_tras_errores_seguidos(self):
+        with mock.patch.object(recordatorios, 'reservar_lote', side_effect=DatabaseError) as reservar, \
+                mock.patch.object(recordatorios, 'connections'), mock.patch.object(recordatorios.time, 'sleep'), \
+                self.assertLogs('gestion_clinica.recordatorios', 'ERROR'):
+            self.assertEqual(recordatorios._worker(0, RemitentePrueba(), 10), (0, 0))
+        self.assertEqual(reservar.call_count, 3)
+
+
+class CoalescenciaTests(TestCase):
+    """
+    Coalescencia de peticiones GET idénticas (gestion_clinica.coalescencia).
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_peticiones_simultaneas_calculan_una_vez(self):
+        llamadas = []
+        liberar = threading.Event()
+
+        def calcular():
+            llamadas.append(1)
+            liberar.wait(5)
+            return 'resultado'
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(coalescencia.compartir('clave', calcular)))
+            for _ in range(4)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        while not llamadas:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(resultados, ['resultado'] * 4)
+        self.assertEqual(len(llamadas), 1)
+
+    def test_si_el_lider_falla_cada_uno_calcula(self):
+        def fallar():
+            raise RuntimeError('falla')
+
+        with self.assertRaises(RuntimeError):
+            coalescencia.compartir('clave', fallar)
+        self.assertEqual(coalescencia.compartir('clave', lambda: 'ok'), 'ok')
+
+    def test_el_candado_ajeno_no_se_borra(self):
+        clave_candado = 'coalescencia:clave:candado'
+
+        def calcular():
+            # El candado vence y otro proceso lo toma mientras se calcula
+            cache.set(clave_candado, 'de-otro-proceso')
+            return 'resultado'
+
+        self.assertEqual(coalescencia._entre_procesos('clave', calcular), 'resultado')
+        self.assertEqual(cache.get(clave_candado), 'de-otro-proceso')
+
+    def test_clave_de_la_peticion(self):
+        fabrica = RequestFactory()
+
+        def clave(url):
+            peticion = fabrica.get(url)
+            peticion.user = mock.Mock(is_authenticated=False)
+            return coalescencia.clave_peticion(peticion, Medico)
+
+        self.assertEqual(clave('/api/medicos/?a=1&b=2'), clave('/api/medicos/?b=2&a=1'))
+        self.assertNotEqual(clave('/api/medicos/?a=1'), clave('/api/medicos/?a=2'))
+        anterior = clave('/api/medicos/')
+        with self.captureOnCommitCallbacks(execute=True):
+            coalescencia.invalidar_modelo(Medico, 'default')
+        self.assertNotEqual(clave('/api/medicos/'), anterior)
+
+    def test_el_listado_refleja_las_escrituras(self):
+        especialidad = crear_especialidad()
+        url = reverse('medico-list-create')
+        self.assertEqual(self.client.get(url).json()['results'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_medico(especialidad)
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+
+
+def consultar_en_orden(funcion, aliases=None):
+    """
+    consultar_en_sedes() sin hilos: dentro de una prueba los datos solo son
+    visibles para la conexión de la propia prueba.
+    """
+    return {alias: funcion(alias) for alias in aliases or sedes.alias_sedes()}
+
+
+class SedesTests(TestCase):
+    """
+    Selección de la sede por petición y reportes centrales (gestion_clinica.sedes).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.centro = Clinica.objects.create(nombre='Centro', codigo='centro', alias_bd='default')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parametro_clinica_queda_en_la_sesion(self):
+        respuesta = self.client.get(reverse('paciente-list'), {'clinica': 'centro'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.client.session['clinica'], 'centro')
+
+    def test_clinica_desconocida(self):
+        respuesta = self.client.get(reverse('paciente-list'), {'clinica': 'nada'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertNotIn('clinica', self.client.session)
+        respuesta = self.client.get(reverse('paciente-list-create'), headers={'X-Clinica': 'nada'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_clinica_inactiva_se_olvida_de_la_sesion(self):
+        self.client.get(reverse('paciente-list'), {'clinica': 'centro'})
+        self.centro.activa = False
+        self.centro.save()
+        self.assertEqual(self.client.get(reverse('paciente-list')).status_code, 200)
+        self.assertNotIn('clinica', self.client.session)
+
+    def test_en_sede_y_router(self):
+        router = sedes.RouterSedes()
+        self.assertEqual(sedes.alias_actual(), 'default')
+        with sedes.en_sede('norte', 7):
+            self.assertEqual((sedes.alias_actual(), sedes.clinica_actual()), ('norte', 7))
+            self.assertEqual(router.db_for_read(Paciente), 'norte')
+            # Clinica y Trabajo son globales
+            self.assertEqual(router.db_for_write(Clinica), 'default')
+            self.assertEqual(router.db_for_write(Trabajo), 'default')
+        self.assertEqual(sedes.alias_actual(), 'default')
+        self.assertFalse(router.allow_migrate('norte', 'gestion_clinica', 'trabajo'))
+        self.assertTrue(router.allow_migrate('norte', 'gestion_clinica', 'paciente'))
+
+    def test_trabajos_de_otra_sede(self):
+        propio = encolar('prueba_sumar', {'a': 1, 'b': 2})
+        with sedes.en_sede('norte'):
+            ajeno = encolar('prueba_sumar', {'a': 3, 'b': 4})
+        Trabajo.objects.filter(pk=ajeno.pk).update(estado='COMPLETADO', resultado={'archivo': 'consultas.csv'})
+        self.assertEqual(ajeno.sede, 'norte')
+        datos = self.client.get(reverse('trabajo-list')).json()
+        self.assertEqual([t['id'] for t in datos['results']], [propio.pk])
+        self.assertEqual(self.client.get(reverse('trabajo-detail', args=[ajeno.pk])).status_code, 404)
+        with tempfile.TemporaryDirectory() as directorio, override_settings(EXPORTACIONES_DIR=directorio):
+            Path(directorio, 'consultas.csv').write_text('rut\n')
+            self.assertEqual(self.client.get(reverse('trabajo-descarga', args=[ajeno.pk])).status_code, 404)
+
+    def test_alias_sedes(self):
+        Clinica.objects.create(nombre='Sin base', codigo='sin-base', alias_bd='no-configurada')
+        self.assertEqual(sedes.alias_sedes(), ['default'])
+
+    def test_fusionar(self):
+        fusion = sedes.fusionar([[5, 3, 1], [4, 2]], clave=lambda x: x, limite=4, descendente=True)
+        self.assertEqual(fusion, [5, 4, 3, 2])
+
+    def test_reporte_central(self):
+        paciente = crear_paciente()
+        medico = crear_medico(crear_especialidad())
+        crear_consulta(paciente, medico)
+        with mock.patch.object(sedes, 'consultar_en_sedes', consultar_en_orden):
+            respuesta = self.client.get(reverse('reporte-sedes'))
+        datos = respuesta.json()
+        self.assertEqual(datos['totales'], {'pacientes': 1, 'medicos': 1, 'consultas': 1, 'citas': 0})
+        self.assertEqual(datos['ultimas_consultas'][0]['sede'], 'default')
+        self.assertEqual(self.client.get(reverse('reporte-sedes'), {'desde': 'ayer'}).status_code, 400)
+
+
+@skipUnless('norte' in settings.DATABASES, "Requiere la sede 'norte' (SALUDVITAL_SEDES=norte).")
+class SedesVariasBasesTests(TestCase):
+    """
+    Datos repartidos en dos bases de datos.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Clinica.objects.create(nombre='Centro', codigo='centro', alias_bd='default')
+        Clinica.objects.create(nombre='Norte', codigo='norte', alias_bd='norte')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cada_sede_ve_sus_datos(self):
+        with sedes.en_sede('norte'):
+            paciente = crear_paciente()
+        self.assertEqual(paciente._state.db, 'norte')
+        self.assertFalse(Paciente.objects.exists())
+        respuesta = self.client.get(reverse('paciente-list-create'), headers={'X-Clinica': 'norte'})
+        self.assertEqual([p['id'] for p in respuesta.json()['results']], [paciente.pk])
+
+    def test_trabajos_por_sede(self):
+        propio = encolar('prueba_sumar', {'a': 1, 'b': 2})
+        with sedes.en_sede('norte'):
+            ajeno = encolar('prueba_sumar', {'a': 3, 'b': 4})
+        for clinica, visible, oculto in (('centro', propio, ajeno), ('norte', ajeno, propio)):
+            cabeceras = {'X-Clinica': clinica}
+            datos = self.client.get(reverse('trabajo-list'), headers=cabeceras).json()
+            self.assertEqual([t['id'] for t in datos['results']], [visible.pk])
+            respuesta = self.client.get(reverse('trabajo-detail', args=[oculto.pk]), headers=cabeceras)
+            self.assertEqual(respuesta.status_code, 404)
+
+    def test_comandos_recorren_todas_las_sedes(self):
+        for alias in ('default', 'norte'):
+            with sedes.en_sede(alias):
+                crear_consulta(crear_paciente(), crear_medico(crear_especialidad()))
+                PacienteMedico.objects.all().delete()
+        call_command('reconstruir_pacientes_medico', stdout=StringIO())
+        self.assertEqual(PacienteMedico.objects.using('default').count(), 1)
+        self.assertEqual(PacienteMedico.objects.using('norte').count(), 1)
+
+
+class PacienteMedicoTests(TestCase):
+    """
+    Relación paciente–médico y filtro de pacientes por médico (gestion_clinica.relaciones).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = crear_especialidad()
+        cls.luis = crear_medico(especialidad, '22222222-2')
+        cls.marta = crear_medico(especialidad, '33333333-3', 'Marta')
+        cls.ana = crear_paciente('11111111-1', 'Ana')
+        cls.bruno = crear_paciente('44444444-4', 'Bruno')
+        cls.inicio = timezone.make_aware(datetime(2025, 1, 10, 9, 0))
+        cls.consultas = [crear_consulta(cls.ana, cls.luis, cls.inicio + timedelta(days=n)) for n in range(3)]
+        crear_consulta(cls.bruno, cls.luis, cls.inicio + timedelta(days=10))
+        crear_consulta(cls.bruno, cls.marta, cls.inicio)
+
+    def test_resumen_del_par(self):
+        relacion = PacienteMedico.objects.get(paciente=self.ana, medico=self.luis)
+        self.assertEqual(relacion.total_consultas, 3)
+        self.assertEqual(relacion.primera_consulta, self.inicio)
+        self.assertEqual(relacion.ultima_consulta, self.inicio + timedelta(days=2))
+
+    def test_eliminar_consultas_actualiza_el_par(self):
+        self.consultas[2].delete()
+        relacion = PacienteMedico.objects.get(paciente=self.ana, medico=self.luis)
+        self.assertEqual((relacion.total_consultas, relacion.ultima_consulta), (2, self.inicio + timedelta(days=1)))
+        for consulta in self.consultas[:2]:
+            consulta.delete()
+        self.assertFalse(PacienteMedico.objects.filter(paciente=self.ana, medico=self.luis).exists())
+
+    def test_filtro_por_medico_sin_duplicados(self):
+        url = reverse('paciente-list-create')
+        respuesta = self.client.get(url, {'medico': self.luis.pk, 'orden': '-ultima_visita'})
+        self.assertEqual([p['id'] for p in respuesta.json()['results']], [self.bruno.pk, self.ana.pk])
+        respuesta = self.client.get(url, {'medico': self.marta.pk})
+        self.assertEqual([p['id'] for p in respuesta.json()['results']], [self.bruno.pk])
+        self.assertEqual(self.client.get(url, {'medico': 'x'}).status_code, 400)
+
+    def test_orden_por_ultima_visita_con_cualquier_medico(self):
+        sin_consultas = crear_paciente('55555555-5', 'Carla')
+        respuesta = self.client.get(reverse('paciente-list-create'), {'orden': 'ultima_visita'})
+        ids = [p['id'] for p in respuesta.json()['results']]
+        self.assertEqual(ids, [self.ana.pk, self.bruno.pk, sin_consultas.pk])
+
+    def test_reconstruir(self):
+        PacienteMedico.objects.all().delete()
+        self.assertEqual(relaciones.reconstruir(lote=1), 3)
+        self.assertEqual(PacienteMedico.objects.get(paciente=self.ana, medico=self.luis).total_consultas, 3)
+
+
+class CatalogoTests(TestCase):
+    """
+    Filtros de catálogo sin tildes ni mayúsculas sobre columnas normalizadas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.amoxicilina = crear_medicamento('Amoxicilina', laboratorio='Laboratorio Chile')
+        cls.acido = crear_medicamento('Ácido Acetilsalicílico', laboratorio='Bayer')
+        cls.clavulanico = crear_medicamento('Amoxicilina con Ácido Clavulánico', laboratorio='Saval')
+        cls.cardiologia = crear_especialidad('Cardiología')
+        crear_medico(cls.cardiologia)
+        crear_medico(crear_especialidad('Pediatría'), '33333333-3')
+
+    def ids(self, url, **parametros):
+        respuesta = self.client.get(url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [fila['id'] for fila in respuesta.json()['results']]
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar('  Ácido   CLAVULÁNICO '), 'acido clavulanico')
+        self.assertEqual(normalizar(None), '')
+
+    def test_columnas_normalizadas_al_guardar(self):
+        self.assertEqual(self.acido.nombre_normalizado, 'acido acetilsalicilico')
+        self.acido.nombre = 'Ácido Fólico'
+        self.acido.save()
+        self.assertEqual(Medicamento.objects.get(pk=self.acido.pk).nombre_normalizado, 'acido folico')
+
+    def test_prefijo_primero(self):
+        url = reverse('medicamento-list-create')
+        self.assertEqual(self.ids(url, nombre='ACIDO'), [self.acido.pk, self.clavulanico.pk])
+        self.assertEqual(self.ids(url, nombre='amoxi'), [self.amoxicilina.pk, self.clavulanico.pk])
+        self.assertEqual(self.ids(url, laboratorio='chile'), [self.amoxicilina.pk])
+        self.assertEqual(self.ids(url, nombre='   '), [self.amoxicilina.pk, self.acido.pk, self.clavulanico.pk])
+
+    def test_especialidad_del_medico(self):
+        medicos = self.ids(reverse('medico-list-create'), especialidad_nombre='cardiologia')
+        self.assertEqual(Medico.objects.filter(pk__in=medicos).get().especialidad, self.cardiologia)
+
+
+class ConteoTests(TestCase):
+    """
+    Conteos aproximados en los listados paginados (gestion_clinica.conteo).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for numero in range(5):
+            crear_especialidad(f'Especialidad {numero}')
+
+    def test_sin_estimacion_cuenta_exacto(self):
+        self.assertEqual(conteo.contar(Especialidad.objects.all()), (5, True))
+
+    def test_estimacion_sobre_el_umbral(self):
+        with mock.patch.object(conteo, 'estimar', return_value=50000):
+            self.assertEqual(conteo.contar(Especialidad.objects.all(), umbral=100), (50000, False))
+
+    def test_estimacion_baja_cuenta_acotado(self):
+        with mock.patch.object(conteo, 'estimar', return_value=1):
+            self.assertEqual(conteo.contar(Especialidad.objects.all(), umbral=10), (5, True))
+            self.assertEqual(conteo.contar(Especialidad.objects.all(), umbral=3), (4, False))
+
+    def test_paginas_con_total_aproximado(self):
+        paginador = conteo.PaginadorEstimado(Especialidad.objects.order_by('pk'), 2)
+        with mock.patch.object(conteo, 'contar', return_value=(3, False)):
+            self.assertTrue(paginador.page(2).has_next())
+            # Con un total aproximado se aceptan páginas más allá de la calculada
+            pagina = paginador.page(3)
+        self.assertEqual(len(pagina), 1)
+        self.assertFalse(pagina.has_next())
+
+    def test_api(self):
+        datos = self.client.get(reverse('especialidad-list-create'), {'page_size': 2}).json()
+        self.assertEqual((datos['count'], datos['conteo_exacto'], len(datos['results'])), (5, True, 2))
+        with mock.patch.object(conteo, 'estimar', return_value=50000):
+            datos = self.client.get(reverse('especialidad-list-create')).json()
+        self.assertEqual((datos['count'], datos['conteo_exacto']), (50000, False))
+
+    @override_settings(PAGINA_TAMANO_WEB=2)
+    def test_vista_web(self):
+        cache.clear()
+        with mock.patch.object(conteo, 'estimar', return_value=50000):
+            respuesta = self.client.get(reverse('especialidad-list'), {'pagina': 2, 'buscar': 'x'})
+        self.assertContains(respuesta, 'aproximadamente 50000')
+        # Los enlaces conservan el resto de parámetros
+        self.assertContains(respuesta, 'href="?pagina=1&amp;buscar=x"')
+        self.assertContains(respuesta, 'href="?pagina=3&amp;buscar=x"')
+        self.assertEqual(self.client.get(reverse('especialidad-list'), {'pagina': 'x'}).status_code, 200)
+
+
+class AdminTests(TestCase):
+    """
+    Administración de los modelos clínicos y sus acciones masivas (gestion_clinica.admin).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.paciente = crear_paciente(correo='ana@example.com')
+        cls.medico = crear_medico(crear_especialidad())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_actualizar_en_bloque(self):
+        cita = crear_cita(self.paciente, self.medico, timezone.now() + timedelta(hours=2))
+        recordatorios.generar()
+        antes = Cita.objects.get(pk=cita.pk).updated_at
+        with mock.patch.object(obtener_broker(), 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                total = admin.actualizar_en_bloque(Cita.objects.filter(pk=cita.pk), estado='CANCELADA')
+        self.assertEqual(total, 1)
+        cita.refresh_from_db()
+        self.assertEqual(cita.estado, 'CANCELADA')
+        self.assertGreater(cita.updated_at, antes)
+        self.assertEqual(publicar.call_args.args[0]['objeto_id'], cita.pk)
+        self.assertFalse(Recordatorio.objects.exists())
+
+    def test_actualizar_en_bloque_por_lotes(self):
+        manana = timezone.now() + timedelta(days=1)
+        citas = [crear_cita(self.paciente, self.medico, manana + timedelta(hours=h)) for h in range(3)]
+        dia = agenda.dia_local(citas[0].fecha_hora)
+        version = agenda.versiones(self.medico.pk, [dia])
+        with mock.patch.object(obtener_broker(), 'publicar') as publicar, \
+                mock.patch.object(admin, 'TAMANO_LOTE', 2), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                CaptureQueriesContext(connection) as consultas:
+            # El filtro deja de coincidir tras el UPDATE
+            total = admin.actualizar_en_bloque(Cita.objects.filter(estado='PROGRAMADA'), estado='CONFIRMADA')
+        self.assertEqual(total, 3)
+        self.assertEqual(sorted(c.args[0]['objeto_id'] for c in publicar.call_args_list), [c.pk for c in citas])
+        self.assertEqual({c.args[0]['estado'] for c in publicar.call_args_list}, {'CONFIRMADA'})
+        # Un callback por lote de eventos, no uno por cita
+        lotes = [c for c in callbacks if getattr(c, 'func', None) is eventos._publicar_todos]
+        self.assertEqual([len(c.args[1]) for c in lotes], [2, 1])
+        self.assertNotEqual(agenda.versiones(self.medico.pk, [dia]), version)
+        update = next(c['sql'] for c in consultas if c['sql'].startswith('UPDATE'))
+        self.assertNotIn(' IN (', update)
+
+    def test_accion_solo_cambia_los_estados_validos(self):
+        programada = crear_cita(self.paciente, self.medico)
+        completada = crear_cita(self.paciente, self.medico, estado='COMPLETADA')
+        respuesta = self.client.post(
+            reverse('admin:gestion_clinica_cita_changelist'),
+            {'action': 'confirmar', '_selected_action': [programada.pk, completada.pk]}, follow=True,
+        )
+        self.assertContains(respuesta, '1 citas confirmadas.')
+        self.assertEqual(
+            dict(Cita.objects.values_list('pk', 'estado')), {programada.pk: 'CONFIRMADA', completada.pk: 'COMPLETADA'},
+        )
+
+    def test_listados(self):
+        crear_consulta(self.paciente, self.medico)
+        for modelo in ('paciente', 'medico', 'consultamedica', 'cita', 'especialidad', 'registroauditoria'):
+            respuesta = self.client.get(reverse(f'admin:gestion_clinica_{modelo}_changelist'), {'q': 'ana'})
+            self.assertEqual(respuesta.status_code, 200, modelo)
+
+    def test_auditoria_de_solo_lectura(self):
+        self.assertEqual(self.client.get(reverse('admin:gestion_clinica_registroauditoria_add')).status_code, 403)
+
+
+class AuditoriaTests(TestCase):
+    """
+    Bitácora de auditoría de los datos clínicos (gestion_clinica.auditoria).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user('recepcion', password='clave')
+
+    def entradas(self, objeto):
+        return list(
+            auditoria.historial(type(objeto), objeto.pk).order_by('id').values_list('accion', 'cambios', 'usuario')
+        )
+
+    def test_crear_y_modificar(self):
+        with auditoria.auditando(self.usuario), self.captureOnCommitCallbacks(execute=True):
+            paciente = crear_paciente(nombre='Ana')
+            paciente.nombre = 'Andrea'
+            paciente.save()
+            # Las entradas se escriben al confirmar la transacción
+            self.assertFalse(RegistroAuditoria.objects.exists())
+        creada, modificada = self.entradas(paciente)
+        self.assertEqual((creada[0], creada[1]['nombre'], creada[2]), ('CREAR', [None, 'Ana'], 'recepcion'))
+        self.assertEqual(modificada, ('MODIFICAR', {'nombre': ['Ana', 'Andrea']}, 'recepcion'))
+
+    def test_savepoint_revertido_descarta_sus_entradas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            paciente = crear_paciente()
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Paciente.objects.filter(pk=paciente.pk).update(telefono='+56999999999')
+                raise RuntimeError('rollback')
+            paciente.direccion = 'Otra calle 123'
+            paciente.save(update_fields=['direccion'])
+        entradas = [cambios for accion, cambios, _ in self.entradas(paciente) if accion == 'MODIFICAR']
+        self.assertEqual(list(entradas[0]), ['direccion'])
+        self.assertEqual(len(entradas), 1)
+
+    def test_caminos_masivos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            paciente = crear_paciente()
+            Paciente.objects.filter(pk=paciente.pk).update(activo=False, nombre='Ana')
+            paciente.telefono = '+56922222222'
+            Paciente.objects.bulk_update([paciente], ['telefono'])
+        cambios = [cambios for accion, cambios, _ in self.entradas(paciente) if accion == 'MODIFICAR']
+        self.assertEqual(cambios, [{'activo': [True, False]}, {'telefono': ['+56911111111', '+56922222222']}])
+
+    def test_registro_inmutable(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_paciente()
+        registro = RegistroAuditoria.objects.get()
+        with self.assertRaises(auditoria.RegistroInmutable):
+            registro.save()
+        with self.assertRaises(auditoria.RegistroInmutable):
+            registro.delete()
+        # También los caminos masivos, con o sin el trigger de PostgreSQL
+        for operacion in (
+            lambda: RegistroAuditoria.objects.all().delete(),
+            lambda: RegistroAuditoria.objects.update(usuario='otro'),
+            lambda: RegistroAuditoria.objects.bulk_update([registro], ['usuario']),
+        ):
+            with self.assertRaises(auditoria.RegistroInmutable):
+                operacion()
+        self.assertEqual(RegistroAuditoria.objects.count(), 1)
+
+    def test_la_peticion_escribe_un_lote_por_base(self):
+        def vista(request):
+            # Dos escrituras confirmadas por separado dentro de la misma petición
+            for rut in ('11111111-1', '22222222-2'):
+                with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                    crear_paciente(rut)
+            self.assertFalse(RegistroAuditoria.objects.exists())
+            return 'respuesta'
+
+        request = RequestFactory().post('/')
+        request.user = self.usuario
+        with mock.patch.object(auditoria, '_insertar', wraps=auditoria._insertar) as insertar:
+            self.assertEqual(auditoria.AuditoriaMiddleware(vista)(request), 'respuesta')
+        insertar.assert_called_once()
+        self.assertEqual(list(RegistroAuditoria.objects.values_list('usuario', flat=True)), ['recepcion'] * 2)
+
+    def test_eliminacion_en_segundo_plano_a_nombre_del_usuario(self):
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            paciente = crear_paciente()
+            self.client.post(reverse('paciente-delete', args=[paciente.pk]))
+            ejecutar(reservar('prueba:1'))
+        accion, cambios, usuario = self.entradas(paciente)[-1]
+        self.assertEqual((accion, usuario, cambios['rut'][1]), ('ELIMINAR', 'recepcion', None))
+
+    def test_api_historial(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            paciente = crear_paciente()
+        datos = self.client.get(reverse('auditoria-historial', args=['pacientes', paciente.pk])).json()
+        self.assertEqual([r['accion'] for r in datos['results']], ['CREAR'])
+        self.assertEqual(
+            self.client.get(reverse('auditoria-historial', args=['medicos', paciente.pk])).status_code, 404,
+        )
+
+
+class IdempotenciaTests(TestCase):
+    """
+    Claves Idempotency-Key en los POST de creación (gestion_clinica.idempotencia).
+    """
+
+    def crear(self, clave='clave-1', nombre='Cardiología'):
+        return self.client.post(
+            reverse('especialidad-list-create'), {'nombre': nombre, 'descripcion': 'Corazón'},
+            content_type='application/json', headers={'Idempotency-Key': clave},
+        )
+
+    def test_reintento_devuelve_la_respuesta_original(self):
+        primera = self.crear()
+        segunda = self.crear()
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual((segunda.status_code, segunda.json()), (201, primera.json()))
+        self.assertEqual(segunda.headers['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', primera.headers)
+        self.assertEqual(Especialidad.objects.count(), 1)
+        # Otra clave crea otro registro
+        self.assertEqual(self.crear('clave-2').status_code, 201)
+        self.assertEqual(Especialidad.objects.count(), 2)
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self.crear()
+        self.assertEqual(self.crear(nombre='Pediatría').status_code, 422)
+        self.assertEqual(Especialidad.objects.count(), 1)
+
+    def test_duplicado_en_curso(self):
+        self.crear()
+        ClaveIdempotencia.objects.update(estado='EN_CURSO')
+        respuesta = self.crear()
+        self.assertEqual((respuesta.status_code, respuesta.headers['Retry-After']), (409, '1'))
+        # Una reserva vencida se libera y la petición se procesa de nuevo
+        ClaveIdempotencia.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.crear().status_code, 201)
+        self.assertEqual(Especialidad.objects.count(), 2)
+
+    def test_error_libera_la_clave(self):
+        respuesta = self.client.post(
+            reverse('especialidad-list-create'), {'nombre': 'Cardiología'},
+            content_type='application/json', headers={'Idempotency-Key': 'clave-1'},
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        self.assertEqual(self.crear().status_code, 201)
+
+    def test_clave_demasiado_larga(self):
+        respuesta = self.crear('x' * 256)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Idempotency-Key', respuesta.json())
+        self.assertFalse(Especialidad.objects.exists())
+
+    def test_limpiar(self):
+        self.crear()
+        self.crear('clave-2')
+        ClaveIdempotencia.objects.filter(clave='clave-1').update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(idempotencia.limpiar(lote=1), 1)
+        self.assertEqual(list(ClaveIdempotencia.objects.values_list('clave', flat=True)), ['clave-2'])
+
+
+class LecturasPorLotesTests(TestCase):
+    """
+    Filtro ?ids= y lecturas por lotes en /api/batch/ (gestion_clinica.lotes).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = crear_paciente('11111111-1', 'Ana')
+        cls.bruno = crear_paciente('22222222-2', 'Bruno')
+        crear_paciente('33333333-3', 'Carla')
+
+    def lote(self, peticiones):
+        return self.client.post(reverse('lote'), {'peticiones': peticiones}, content_type='application/json')
+
+    def test_filtro_ids(self):
+        datos = self.client.get(reverse('paciente-list-create'), {'ids': f'{self.ana.pk},{self.bruno.pk},'}).json()
+        self.assertCountEqual([p['id'] for p in datos['results']], [self.ana.pk, self.bruno.pk])
+        # El detalle no se filtra: su registro ya va en la URL
+        detalle = self.client.get(reverse('paciente-detail', args=[self.ana.pk]), {'ids': self.bruno.pk})
+        self.assertEqual(detalle.json()['id'], self.ana.pk)
+
+    @override_settings(PAGINA_TAMANO_MAXIMO=2)
+    def test_filtro_ids_invalido(self):
+        url = reverse('paciente-list-create')
+        self.assertIn('ids', self.client.get(url, {'ids': '1,x'}).json())
+        self.assertEqual(self.client.get(url, {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1,1,2'}).status_code, 200)
+
+    def test_lote(self):
+        detalle_ana = reverse('paciente-detail', args=[self.ana.pk])
+        with self.assertNumQueries(1):
+            respuesta = self.lote([
+                {'id': 'a', 'url': detalle_ana},
+                {'id': 'b', 'url': reverse('paciente-detail', args=[self.bruno.pk])},
+                {'id': 'c', 'url': detalle_ana},
+                {'id': 'd', 'url': reverse('paciente-detail', args=[999999])},
+            ])
+        self.assertEqual(respuesta.status_code, 200)
+        respuestas = respuesta.json()['respuestas']
+        self.assertEqual([r['id'] for r in respuestas], ['a', 'b', 'c', 'd'])
+        self.assertEqual([r['status'] for r in respuestas], [200, 200, 200, 404])
+        self.assertEqual(respuestas[1]['body']['nombre'], 'Bruno')
+        self.assertEqual(respuestas[0]['body'], respuestas[2]['body'])
+
+    def test_lote_con_listados_y_rutas_no_admitidas(self):
+        respuestas = self.lote([
+            f"{reverse('paciente-list-create')}?ids={self.ana.pk}",
+            reverse('lote'),
+            '/api/no-existe/',
+        ]).json()['respuestas']
+        self.assertEqual([r['status'] for r in respuestas], [200, 400, 404])
+        self.assertEqual([p['id'] for p in respuestas[0]['body']['results']], [self.ana.pk])
+
+    @override_settings(LOTE_PETICIONES_MAXIMO=2)
+    def test_lote_invalido(self):
+        url = reverse('paciente-detail', args=[self.ana.pk])
+        for peticiones in ([], [url] * 3, [{'url': 'http://otro/'}], 'x'):
+            respuesta = self.lote(peticiones)
+            self.assertEqual(respuesta.status_code, 400, peticiones)
+            self.assertIn('peticiones', respuesta.json())
+
+
+class AnaliticaTests(TestCase):
+    """
+    Ocupación de los médicos y asistencia por especialidad (gestion_clinica.analitica).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = crear_especialidad()
+        cls.medico = crear_medico(cls.especialidad)
+        cls.otro = crear_medico(crear_especialidad('Pediatría'), '33333333-3', 'Marta')
+        cls.paciente = crear_paciente()
+        hoy = timezone.localdate()
+        cls.lunes = hoy - timedelta(days=hoy.weekday() + 7)
+
+    def setUp(self):
+        cache.clear()
+
+    def cita(self, hora, minutos=30, estado='REALIZADA', anticipacion=2, medico=None):
+        fecha_hora = timezone.make_aware(datetime.combine(self.lunes, datetime.min.time()) + timedelta(hours=hora))
+        cita = crear_cita(self.paciente, medico or self.medico, fecha_hora, estado=estado, duracion_minutos=minutos)
+        Cita.objects.filter(pk=cita.pk).update(created_at=fecha_hora - timedelta(days=anticipacion))
+        return cita
+
+    def test_grilla_ocupacion(self):
+        # Lunes 09:30 por 90 minutos y domingo 23:30 por 60 (vuelve al lunes)
+        minutos = analitica.grilla_ocupacion(
+            np.array([0, 0]), np.array([9 * 60 + 30, 167 * 60 + 30]), np.array([90, 60]), 1,
+        )
+        self.assertEqual(minutos.shape, (1, analitica.HORAS_SEMANA))
+        self.assertEqual((minutos[0, 9], minutos[0, 10], minutos[0, 167], minutos[0, 0]), (30, 60, 30, 30))
+        self.assertEqual(minutos.sum(), 150)
+
+    def test_horas_disponibles(self):
+        horas = analitica.horas_disponibles(self.lunes, self.lunes + timedelta(days=7))
+        self.assertEqual((horas[0], horas[24], len(horas)), (2, 1, analitica.HORAS_SEMANA))
+
+    def test_calcular(self):
+        self.cita(9, minutos=60)
+        self.cita(10, estado='NO_ASISTIO', anticipacion=10)
+        self.cita(11, estado='CANCELADA')
+        resultado = analitica.calcular(self.lunes, self.lunes + timedelta(days=6))
+
+        medico = next(m for m in resultado['medicos'] if m['medico'] == self.medico.pk)
+        self.assertEqual(medico['minutos_reservados'], 90)
+        self.assertEqual(medico['ocupacion'][0][9:12], [1, 0.5, 0])
+        especialidad = next(e for e in resultado['especialidades'] if e['especialidad'] == self.especialidad.pk)
+        self.assertEqual((especialidad['citas'], especialidad['canceladas']), (3, 1))
+        self.assertEqual((especialidad['tasa_cancelacion'], especialidad['tasa_inasistencia']), (0.333, 0.5))
+        self.assertEqual(especialidad['anticipacion_dias']['tramos'], {
+            '0-1': 0, '1-3': 2, '3-7': 0, '7-14': 1, '14-30': 0, '30+': 0,
+        })
+        # Sin citas las tasas quedan vacías en vez de dividir por cero
+        vacia = next(e for e in resultado['especialidades'] if e['nombre'] == 'Pediatría')
+        self.assertEqual(vacia['citas'], 0)
+        self.assertIsNone(vacia['tasa_cancelacion'])
+        self.assertIsNone(vacia['anticipacion_dias']['mediana'])
+
+    def test_cache_del_periodo(self):
+        self.cita(9)
+        parametros = {'desde': self.lunes.isoformat(), 'hasta': (self.lunes + timedelta(days=6)).isoformat()}
+        url = reverse('analitica-especialidades')
+        primera = self.client.get(url, parametros).json()
+        # Un período cerrado no se recalcula con cada cita nueva
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita(10)
+        with mock.patch.object(analitica, 'calcular') as calcular:
+            self.assertEqual(self.client.get(url, parametros).json(), primera)
+        calcular.assert_not_called()
+
+    @override_settings(ANALITICA_CACHE_SEGUNDOS=900, ANALITICA_CACHE_ABIERTO_SEGUNDOS=60)
+    def test_duracion_de_la_cache(self):
+        hoy = timezone.localdate()
+        with mock.patch.object(analitica.cache, 'set') as guardar:
+            analitica.obtener_analitica(self.lunes, self.lunes + timedelta(days=6))
+            analitica.obtener_analitica(self.lunes, hoy)
+        self.assertEqual([llamada.args[2] for llamada in guardar.call_args_list], [900, 60])
+
+    def test_api_ocupacion(self):
+        self.cita(9, medico=self.otro)
+        url = reverse('analitica-ocupacion')
+        datos = self.client.get(url, {'desde': self.lunes.isoformat(), 'medico': self.otro.pk}).json()
+        self.assertEqual([m['medico'] for m in datos['medicos']], [self.otro.pk])
+        self.assertEqual(len(datos['medicos'][0]['ocupacion']), 7)
+        datos = self.client.get(url, {'desde': self.lunes.isoformat(), 'especialidad': self.especialidad.pk}).json()
+        self.assertEqual([m['medico'] for m in datos['medicos']], [self.medico.pk])
+
+    @override_settings(ANALITICA_DIAS_MAXIMO=10)
+    def test_api_parametros_invalidos(self):
+        for parametros in (
+            {'desde': '2024-13-01'},
+            {'desde': '2024-05-10', 'hasta': '2024-05-01'},
+            {'desde': '2024-05-01', 'hasta': '2024-05-20'},
+            {'desde': '2024-05-01', 'hasta': '2024-05-02', 'medico': 'x'},
+        ):
+            self.assertEqual(self.client.get(reverse('analitica-ocupacion'), parametros).status_code, 400, parametros)
+
+
+class InstantaneasTests(TestCase):
+    """
+    Instantáneas columnares para análisis (gestion_clinica.instantaneas).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = crear_medico(crear_especialidad())
+        cls.paciente = crear_paciente()
+        cls.fecha = timezone.make_aware(datetime(2025, 3, 10, 9, 30))
+        cls.realizada = crear_cita(cls.paciente, cls.medico, cls.fecha, estado='REALIZADA', duracion_minutos=45)
+        cls.ausente = crear_cita(cls.paciente, cls.medico, cls.fecha + timedelta(days=1), estado='NO_ASISTIO')
+        crear_receta(crear_tratamiento(crear_consulta(cls.paciente, cls.medico)), crear_medicamento())
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(INSTANTANEAS_DIR=Path(directorio.name))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def crear(self, segundos=0, **opciones):
+        with mock.patch.object(instantaneas.timezone, 'now', return_value=self.fecha + timedelta(seconds=segundos)):
+            return instantaneas.crear(**opciones)
+
+    def test_exportar_y_consultar(self):
+        self.crear(lote=1)
+        instantanea = instantaneas.Instantanea.abrir()
+        self.assertEqual(instantanea.creada, self.fecha)
+        self.assertIn('recetas', instantanea.tablas)
+        citas = instantanea['citas']
+        self.assertEqual(len(citas), 2)
+        self.assertEqual(list(citas['id']), [self.realizada.pk, self.ausente.pk])
+        self.assertEqual(list(citas['duracion_minutos']), [45, 30])
+        self.assertEqual(list(citas.decodificar('estado')), ['REALIZADA', 'NO_ASISTIO'])
+
+        mascara = citas.filtrar(estado__in=['NO_ASISTIO', 'CANCELADA'], fecha_hora__gte=date(2025, 3, 11))
+        self.assertEqual(list(mascara), [False, True])
+        self.assertEqual(citas.agrupar('estado'), {'REALIZADA': 1, 'NO_ASISTIO': 1})
+        self.assertEqual(citas.agrupar('medico_id', mascara, sumar='duracion_minutos'), {self.medico.pk: 30.0})
+        apellidos, encontradas = citas.unir('medico_id', instantanea['medicos'], 'apellido')
+        self.assertEqual(list(apellidos), ['Soto', 'Soto'])
+        self.assertTrue(encontradas.all())
+
+    def test_unir_sin_correspondencia(self):
+        # unir solo indexa la tabla por columna: basta un dict de arreglos
+        citas = {'medico_id': np.array([5, 3, 9, 1])}
+        medicos = {'id': np.array([2, 5]), 'apellido': np.array(['Soto', 'Rojas']), 'valor': np.array([1.5, 2.5])}
+        apellidos, encontradas = instantaneas.TablaInstantanea.unir(citas, 'medico_id', medicos, 'apellido')
+        self.assertEqual(list(apellidos), ['Rojas', '', '', ''])
+        self.assertEqual(list(encontradas), [True, False, False, False])
+        valores, _ = instantaneas.TablaInstantanea.unir(citas, 'medico_id', medicos, 'valor')
+        self.assertEqual(np.isnan(valores).tolist(), [False, True, True, True])
+
+    def test_condiciones_invalidas(self):
+        self.crear()
+        citas = instantaneas.Instantanea.abrir()['citas']
+        with self.assertRaises(KeyError):
+            citas.filtrar(estado='PERDIDA')
+        with self.assertRaises(ValueError):
+            citas.filtrar(duracion_minutos__contains=3)
+        with self.assertRaises(KeyError):
+            citas['paciente']
+
+    def test_sin_instantanea(self):
+        with self.assertRaises(instantaneas.InstantaneaNoDisponible):
+            instantaneas.Instantanea.abrir()
+
+    def test_publicar_y_podar(self):
+        for segundos in range(3):
+            ultima = self.crear(segundos, conservar=2)
+        raiz = instantaneas.directorio_sede()
+        self.assertEqual(len([ruta for ruta in raiz.iterdir() if ruta.is_dir()]), 2)
+        self.assertEqual(instantaneas.Instantanea.abrir().ruta, ultima)
+
+    def test_error_conserva_la_vigente(self):
+        vigente = self.crear()
+        with mock.patch.object(instantaneas, '_exportar_tabla', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.crear(1)
+        raiz = instantaneas.directorio_sede()
+        self.assertEqual([ruta for ruta in raiz.iterdir() if ruta.is_dir()], [vigente])
+        self.assertEqual(instantaneas.Instantanea.abrir().ruta, vigente)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('crear_instantanea', sede=['default'], lote=0, stdout=salida)
+        self.assertIn('Instantánea de default publicada', salida.getvalue())
+        self.assertEqual(len(instantaneas.Instantanea.abrir('default')['recetas']), 1)
+
+
+
+def cargar_produccion(**entorno):
+    """
+    Ejecuta saludvital.settings_produccion sobre una copia nueva de
+    saludvital.settings, sin tocar la configuración en uso. Las variables
+    con valor None se quitan del entorno.
+    """
+    import saludvital
+
+    entorno = {'SECRET_KEY': 'secreta', 'ALLOWED_HOSTS': 'a.cl,b.cl', 'DB_PASSWORD': 'clave', **entorno}
+    with mock.patch.dict(sys.modules), mock.patch.dict(vars(saludvital)), mock.patch.dict(os.environ):
+        for variable, valor in entorno.items():
+            if valor is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = valor
+        for modulo in ('saludvital.settings', 'saludvital.settings_produccion'):
+            sys.modules.pop(modulo, None)
+        return import_module('saludvital.settings_produccion')
+
+
+class RendimientoConfiguracionTests(TestCase):
+    """
+    Perfil de producción y revisiones de rendimiento de la configuración (gestion_clinica.checks).
+    """
+
+    def setUp(self):
+        self.produccion = cargar_produccion()
+
+    def configuracion(self, **cambios):
+        nombres = ('DEBUG', 'DATABASES', 'CACHES', 'SESSION_ENGINE', 'TEMPLATES')
+        valores = {nombre: getattr(self.produccion, nombre) for nombre in nombres}
+        return mock.patch.object(checks, 'settings', SimpleNamespace(**dict(valores, **cambios)))
+
+    def avisos(self):
+        return [aviso.id for aviso in run_checks(tags=[checks.ETIQUETA], include_deployment_checks=True)]
+
+    def test_perfil_de_produccion(self):
+        self.assertFalse(self.produccion.DEBUG)
+        self.assertEqual(self.produccion.ALLOWED_HOSTS, ['a.cl', 'b.cl'])
+        base = self.produccion.DATABASES['default']
+        self.assertEqual((base['PASSWORD'], base['CONN_MAX_AGE'], base['CONN_HEALTH_CHECKS']), ('clave', 600, True))
+        self.assertEqual(self.produccion.CACHES['default']['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+        redis = cargar_produccion(REDIS_URL='redis://localhost:6379/1')
+        self.assertEqual(redis.CACHES['default']['LOCATION'], 'redis://localhost:6379/1')
+        # La configuración en uso no cambia
+        self.assertNotIn('loaders', settings.TEMPLATES[0]['OPTIONS'])
+        with self.configuracion():
+            self.assertEqual(self.avisos(), [])
+
+    def test_sin_secretos_no_arranca(self):
+        from decouple import UndefinedValueError
+
+        for variable in ('SECRET_KEY', 'DB_PASSWORD'):
+            with self.assertRaises(UndefinedValueError):
+                cargar_produccion(**{variable: None})
+
+    def test_advertencias(self):
+        bases = {
+            'default': {'CONN_MAX_AGE': 0},
+            'norte': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False},
+        }
+        plantillas = [{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {'debug': True, 'loaders': [('django.template.loaders.filesystem.Loader', [])]},
+        }]
+        cache_local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.configuracion(
+            DEBUG=True, DATABASES=bases, CACHES=cache_local,
+            SESSION_ENGINE='django.contrib.sessions.backends.db', TEMPLATES=plantillas,
+        ):
+            self.assertCountEqual(self.avisos(), [f'gestion_clinica.W10{numero}' for numero in range(1, 8)])
+
+    def test_comando(self):
+        with self.configuracion():
+            salida = StringIO()
+            call_command('revisar_rendimiento', '--estricto', stdout=salida)
+            self.assertIn('Sin advertencias', salida.getvalue())
+        with self.configuracion(DEBUG=True):
+            errores = StringIO()
+            call_command('revisar_rendimiento', stderr=errores)
+            self.assertIn('gestion_clinica.W101', errores.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('revisar_rendimiento', '--estricto', stderr=StringIO())
@@ -0,0 +1,255 @@
+"""
+Cola de trabajos en segundo plano para la app gestion_clinica.
+Permite sacar del ciclo request/response las operaciones pesadas
+(exportaciones, recálculos, importaciones y eliminaciones masivas).
+La cola se almacena en la tabla Trabajo y se consume con el comando
+`manage.py procesar_trabajos`, sin depender de un broker externo.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Trabajo
+from .sedes import alias_actual, en_sede
+
+logger = logging.getLogger(__name__)
+
+# Largo máximo del error que se guarda en el trabajo
+LARGO_ERROR = 200
+
+# Registro de tareas disponibles: nombre -> (función, máximo de intentos)
+_TAREAS = {}
+
+
+def tarea(nombre=None, max_intentos=3):
+    """
+    Decorador que registra una función como tarea ejecutable por los workers.
+    La función recibe un ContextoTrabajo y los parámetros del trabajo como kwargs.
+    """
+    def decorador(funcion):
+        _TAREAS[nombre or funcion.__name__] = (funcion, max_intentos)
+        return funcion
+    return decorador
+
+
+def sede_actual():
+    """
+    Valor de Trabajo.sede para la sede en contexto ('' para la base principal).
+    """
+    alias = alias_actual()
+    return '' if alias == 'default' else alias
+
+
+def encolar(nombre, parametros=None, retraso=0):
+    """
+    Crea un trabajo pendiente para la tarea indicada y lo devuelve.
+    `retraso` permite diferir la ejecución algunos segundos. El trabajo
+    recuerda la sede en contexto para ejecutarse contra su base de datos.
+    """
+    if nombre not in _TAREAS:
+        raise ValueError(f"La tarea '{nombre}' no está registrada.")
+    _, max_intentos = _TAREAS[nombre]
+    return Trabajo.objects.create(
+        tarea=nombre,
+        parametros=parametros or {},
+        max_intentos=max_intentos,
+        ejecutar_desde=timezone.now() + timedelta(seconds=retraso),
+        sede=sede_actual(),
+    )
+
+
+class ContextoTrabajo:
+    """
+    Contexto entregado a cada tarea para reportar su avance.
+    """
+    def __init__(self, trabajo):
+        self.trabajo = trabajo
+
+    @property
+    def trabajo_id(self):
+        return self.trabajo.pk
+
+    def progreso(self, porcentaje, mensaje=''):
+        """
+        Actualiza el porcentaje de avance con un UPDATE directo,
+        sin volver a guardar el resto de la fila.
+        """
+        porcentaje = max(0, min(100, int(porcentaje)))
+        Trabajo.objects.filter(pk=self.trabajo.pk).update(progreso=porcentaje, mensaje=mensaje[:200])
+
+
+def nombre_worker(indice=0):
+    """
+    Identificador legible del worker: host, pid e índice dentro del pool.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{indice}"
+
+
+def reservar(worker):
+    """
+    Reserva el siguiente trabajo pendiente para este worker.
+    Usa SELECT ... FOR UPDATE SKIP LOCKED para que varios workers no compitan
+    por la misma fila, y confirma la reserva con un UPDATE condicional para
+    que sea segura también en motores sin bloqueo de filas (SQLite).
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        candidato = (
+            Trabajo.objects.select_for_update(skip_locked=True)
+            .filter(estado='PENDIENTE', ejecutar_desde__lte=ahora)
+            .order_by('ejecutar_desde', 'id')
+            .only('id')
+            .first()
+        )
+        if candidato is None:
+            return None
+        tomado = Trabajo.objects.filter(pk=candidato.pk, estado='PENDIENTE').update(
+            estado='EN_PROCESO',
+            worker=worker,
+            iniciado=ahora,
+            intentos=F('intentos') + 1,
+        )
+    if not tomado:
+        return None
+    return Trabajo.objects.get(pk=candidato.pk)
+
+
+def calcular_espera(intentos):
+    """
+    Backoff exponencial con jitter para los reintentos de un trabajo fallido.
+    """
+    base = getattr(settings, 'TRABAJOS_BACKOFF_BASE', 10)
+    maximo = getattr(settings, 'TRABAJOS_BACKOFF_MAX', 3600)
+    espera = min(maximo, base * (2 ** max(0, intentos - 1)))
+    return espera * random.uniform(0.8, 1.2)
+
+
+def resumen_error(error):
+    """
+    Mensaje corto de una excepción (tipo y texto), sin traceback.
+    """
+    return f'{type(error).__name__}: {error}'[:LARGO_ERROR]
+
+
+def ejecutar(trabajo):
+    """
+    Ejecuta un trabajo ya reservado y registra su resultado.
+    Si la tarea falla y quedan intentos, se vuelve a encolar con backoff.
+    """
+    registro = _TAREAS.get(trabajo.tarea)
+    if registro is None:
+        Trabajo.objects.filter(pk=trabajo.pk).update(
+            estado='FALLIDO',
+            error=f"La tarea '{trabajo.tarea}' no está registrada.",
+            finalizado=timezone.now(),
+        )
+        return
+
+    funcion, _ = registro
+    try:
+        # La tarea lee y escribe en la sede desde la que se encoló
+        with en_sede(trabajo.sede):
+            resultado = funcion(ContextoTrabajo(trabajo), **trabajo.parametros)
+    except Exception as error:
+        # El traceback queda solo en el log; el trabajo guarda un resumen visible por la API
+        logger.exception("Falló el trabajo %s (intento %s)", trabajo.pk, trabajo.intentos)
+        detalle = resumen_error(error)
+        if trabajo.intentos < trabajo.max_intentos:
+            Trabajo.objects.filter(pk=trabajo.pk).update(
+                estado='PENDIENTE',
+                error=detalle,
+                ejecutar_desde=timezone.now() + timedelta(seconds=calcular_espera(trabajo.intentos)),
+            )
+        else:
+            Trabajo.objects.filter(pk=trabajo.pk).update(
+                estado='FALLIDO',
+                error=detalle,
+                finalizado=timezone.now(),
+            )
+        return
+
+    Trabajo.objects.filter(pk=trabajo.pk).update(
+        estado='COMPLETADO',
+        progreso=100,
+        resultado=resultado,
+        error='',
+        finalizado=timezone.now(),
+    )
+
+
+def recuperar_huerfanos():
+    """
+    Recupera los trabajos que quedaron EN_PROCESO más tiempo del permitido
+    (por ejemplo, si el worker murió a mitad de la ejecución): vuelven a la
+    cola si les quedan intentos y, si no, quedan FALLIDO, para que un
+    trabajo que derriba a su worker no se reintente para siempre.
+    Devuelve la cantidad de trabajos devueltos a la cola.
+    """
+    ahora = timezone.now()
+    limite = ahora - timedelta(seconds=getattr(settings, 'TRABAJOS_TIMEOUT', 3600))
+    huerfanos = Trabajo.objects.filter(estado='EN_PROCESO', iniciado__lt=limite)
+    agotados = huerfanos.filter(intentos__gte=F('max_intentos')).update(
+        estado='FALLIDO',
+        worker='',
+        error='El worker se detuvo sin terminar el trabajo y no quedan intentos.',
+        finalizado=ahora,
+    )
+    if agotados:
+        logger.warning("%s trabajos huérfanos sin intentos restantes marcados como fallidos", agotados)
+    return huerfanos.filter(intentos__lt=F('max_intentos')).update(
+        estado='PENDIENTE',
+        worker='',
+    )
+
+
+def trabajar(worker, detener=None, intervalo=2.0, una_vez=False):
+    """
+    Bucle principal de un worker: reserva y ejecuta trabajos hasta que se
+    active `detener`. Con `una_vez` termina cuando la cola queda vacía.
+    Cada TRABAJOS_REVISION_HUERFANOS segundos recupera los trabajos de
+    workers caídos, aunque el resto de los workers siga funcionando.
+    """
+    detener = detener or threading.Event()
+    procesados = 0
+    revision = getattr(settings, 'TRABAJOS_REVISION_HUERFANOS', 60)
+    proxima_revision = time.monotonic() + revision
+    try:
+        while not detener.is_set():
+            close_old_connections()
+            if time.monotonic() >= proxima_revision:
+                proxima_revision = time.monotonic() + revision
+                try:
+                    recuperados = recuperar_huerfanos()
+                except DatabaseError:
+                    logger.exception("Error al recuperar trabajos huérfanos en %s", worker)
+                    connection.close()
+                else:
+                    if recuperados:
+                        logger.warning("%s trabajos huérfanos devueltos a la cola por %s", recuperados, worker)
+            try:
+                trabajo = reservar(worker)
+            except DatabaseError:
+                # Un error transitorio de la base no debe detener al worker
+                logger.exception("Error al reservar un trabajo en %s", worker)
+                connection.close()
+                detener.wait(intervalo)
+                continue
+            if trabajo is None:
+                if una_vez:
+                    break
+                detener.wait(intervalo)
+                continue
+            ejecutar(trabajo)
+            procesados += 1
+    finally:
+        connection.close()
+    return procesados
@@ -9,11 +9,17 @@ from django.urls import path
 from .views import (
     EspecialidadListCreateView, EspecialidadRetrieveUpdateDestroyView,
     PacienteListCreateView, PacienteRetrieveUpdateDestroyView,
-    MedicoListCreateView, MedicoRetrieveUpdateDestroyView,
+    MedicoListCreateView, MedicoRetrieveUpdateDestroyView, MedicoAgendaView,
     ConsultaMedicaListCreateView, ConsultaMedicaRetrieveUpdateDestroyView,
     TratamientoListCreateView, TratamientoRetrieveUpdateDestroyView,
     MedicamentoListCreateView, MedicamentoRetrieveUpdateDestroyView,
     RecetaMedicaListCreateView, RecetaMedicaRetrieveUpdateDestroyView,
+    CitaListCreateView, CitaRetrieveUpdateDestroyView,
+    ConsultaMedicaExportarView, TrabajoListView, TrabajoRetrieveView, TrabajoDescargaView,
+    SincronizacionView, BusquedaTextoView, ReporteSedesView, AuditoriaHistorialView, LoteView,
+    AnaliticaOcupacionView, AnaliticaEspecialidadesView,
+    MedicamentoPronosticoView, MedicamentoStockBajoView,
+    autocompletar_view, eventos_view, calendario_medico_view, calendario_especialidad_view,
     home, paciente_list_view, medico_list_view, consulta_list_view,
     especialidad_list_view, tratamiento_list_view, medicamento_list_view, receta_list_view,
     # Vistas CRUD para formularios HTML
@@ -75,6 +81,9 @@ urlpatterns = [
     path('web/recetas/editar/<int:id>/', receta_edit_view, name='receta-edit'),
     path('web/recetas/eliminar/<int:id>/', receta_delete_view, name='receta-delete'),
     
+    # Búsqueda paginada para los widgets de autocompletado de los formularios
+    path('autocompletar/<str:recurso>/', autocompletar_view, name='autocompletar'),
+
     # Endpoints API REST para especialidades
     path('especialidades/', EspecialidadListCreateView.as_view(), name='especialidad-list-create'),
     path('especialidades/<int:pk>/', EspecialidadRetrieveUpdateDestroyView.as_view(), name='especialidad-detail'),
@@ -86,10 +95,12 @@ urlpatterns = [
     # Endpoints API REST para médicos
     path('medicos/', MedicoListCreateView.as_view(), name='medico-list-create'),
     path('medicos/<int:pk>/', MedicoRetrieveUpdateDestroyView.as_view(), name='medico-detail'),
+    path('medicos/<int:pk>/agenda/', MedicoAgendaView.as_view(), name='medico-agenda'),
 
     # Endpoints API REST para consultas médicas
     path('consultas/', ConsultaMedicaListCreateView.as_view(), name='consulta-list-create'),
     path('consultas/<int:pk>/', ConsultaMedicaRetrieveUpdateDestroyView.as_view(), name='consulta-detail'),
+    path('consultas/exportar/', ConsultaMedicaExportarView.as_view(), name='consulta-exportar'),
 
     # Endpoints API REST para tratamientos
     path('tratamientos/', TratamientoListCreateView.as_view(), name='tratamiento-list-create'),
@@ -98,9 +109,46 @@ urlpatterns = [
     # Endpoints API REST para medicamentos
     path('medicamentos/', MedicamentoListCreateView.as_view(), name='medicamento-list-create'),
     path('medicamentos/<int:pk>/', MedicamentoRetrieveUpdateDestroyView.as_view(), name='medicamento-detail'),
+    path('medicamentos/pronostico/', MedicamentoPronosticoView.as_view(), name='medicamento-pronostico'),
+    path('medicamentos/stock-bajo/', MedicamentoStockBajoView.as_view(), name='medicamento-stock-bajo'),
     
     # Endpoints API REST para recetas médicas
     path('recetas/', RecetaMedicaListCreateView.as_view(), name='receta-list-create'),
     path('recetas/<int:pk>/', RecetaMedicaRetrieveUpdateDestroyView.as_view(), name='receta-detail'),
+
+    # Endpoints API REST para citas
+    path('citas/', CitaListCreateView.as_view(), name='cita-list-create'),
+    path('citas/<int:pk>/', CitaRetrieveUpdateDestroyView.as_view(), name='cita-detail'),
+
+    # Endpoints API REST para trabajos en segundo plano
+    path('trabajos/', TrabajoListView.as_view(), name='trabajo-list'),
+    path('trabajos/<int:pk>/', TrabajoRetrieveView.as_view(), name='trabajo-detail'),
+    path('trabajos/<int:pk>/descarga/', TrabajoDescargaView.as_view(), name='trabajo-descarga'),
+
+    # Endpoint de sincronización delta para clientes sin conexión
+    path('sync/', SincronizacionView.as_view(), name='sincronizacion'),
+
+    # Búsqueda de texto completo en consultas y tratamientos
+    path('busqueda/', BusquedaTextoView.as_view(), name='busqueda-texto'),
+
+    # Canal Server-Sent Events con cambios de citas y consultas (requiere ASGI)
+    path('eventos/', eventos_view, name='eventos'),
+
+    # Feeds iCalendar de citas para aplicaciones de calendario
+    path('medicos/<int:pk>/calendario.ics', calendario_medico_view, name='medico-calendario'),
+    path('especialidades/<int:pk>/calendario.ics', calendario_especialidad_view, name='especialidad-calendario'),
+
+    # Reporte central consolidado de todas las sedes
+    path('reportes/sedes/', ReporteSedesView.as_view(), name='reporte-sedes'),
+
+    # Analítica de ocupación de médicos y asistencia por especialidad
+    path('analitica/ocupacion/', AnaliticaOcupacionView.as_view(), name='analitica-ocupacion'),
+    path('analitica/especialidades/', AnaliticaEspecialidadesView.as_view(), name='analitica-especialidades'),
+
+    # Varias lecturas GET de la API en una sola petición
+    path('batch/', LoteView.as_view(), name='lote'),
+
+    # Historial de auditoría de pacientes, consultas y recetas
+    path('auditoria/<str:recurso>/<int:pk>/', AuditoriaHistorialView.as_view(), name='auditoria-historial'),
 ]
 
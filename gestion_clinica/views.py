@@ -12,10 +12,21 @@ from django_filters import rest_framework as filters
 # Importación de filtros para la funcionalidad de búsqueda y filtrado
 from .filters import (
     MedicoFilter, PacienteFilter, ConsultaMedicaFilter,
-    TratamientoFilter, RecetaMedicaFilter, MedicamentoFilter
+    TratamientoFilter, RecetaMedicaFilter, MedicamentoFilter, CitaFilter
 )
-from django.http import HttpResponse   
-from rest_framework import generics
+from django.http import HttpResponse, FileResponse, Http404, JsonResponse, StreamingHttpResponse, HttpResponseBadRequest
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.views.decorators.http import condition
+from django.utils import timezone
+from pathlib import Path
+import asyncio
+import json
+from datetime import date, datetime, time, timedelta
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 
 # Importación de formularios para CRUD
 from .forms import (
@@ -24,8 +35,54 @@ from .forms import (
 )
 
 # Importación de modelos y serializadores
-from .models import Especialidad, Paciente, Medico, ConsultaMedica, Tratamiento, Medicamento, RecetaMedica
-from .serializers import EspecialidadSerializer, PacienteSerializer, MedicoSerializer, ConsultaMedicaSerializer, TratamientoSerializer, MedicamentoSerializer, RecetaMedicaSerializer
+from .models import Especialidad, Paciente, Medico, ConsultaMedica, Tratamiento, Medicamento, RecetaMedica, Cita, Trabajo
+from .serializers import EspecialidadSerializer, PacienteSerializer, MedicoSerializer, ConsultaMedicaSerializer, TratamientoSerializer, MedicamentoSerializer, RecetaMedicaSerializer, CitaSerializer, TrabajoSerializer
+
+# Cola de trabajos en segundo plano para operaciones pesadas
+from .trabajos import encolar, sede_actual
+
+# Búsquedas remotas para los widgets de autocompletado
+from .autocompletar import BUSQUEDAS
+
+# Sincronización delta para clientes sin conexión
+from .sincronizacion import TokenInvalido, pagina_cambios
+
+# Eventos en vivo de citas y consultas
+from .eventos import obtener_broker
+
+# Búsqueda de texto completo
+from . import busqueda
+
+# Pronóstico de consumo y quiebres de stock de medicamentos
+from .pronostico import obtener_pronostico, stock_bajo
+
+# Agenda diaria y semanal de los médicos
+from . import agenda
+
+# Feeds iCalendar de citas
+from . import calendario
+
+# Coalescencia de peticiones GET idénticas y simultáneas
+from .coalescencia import CoalescenciaMixin
+
+# Reportes consolidados de todas las sedes
+from .sedes import alias_actual, reporte_central
+
+# Paginación con conteo aproximado
+from .conteo import paginar
+
+# Bitácora de auditoría de los datos clínicos
+from .auditoria import historial
+from .serializers import RegistroAuditoriaSerializer
+
+# Reintentos seguros de los POST de creación (Idempotency-Key)
+from .idempotencia import IdempotenciaMixin
+
+# Varias lecturas GET en una sola petición
+from .lotes import ejecutar_lote, leer_peticiones
+
+# Analítica de ocupación y asistencia a las citas
+from .analitica import obtener_analitica
 
 def home(request):
     """
@@ -37,57 +94,141 @@ def paciente_list_view(request):
     """
     Vista para listar pacientes con datos reales.
     """
-    pacientes = Paciente.objects.all()
+    pacientes = paginar(request, Paciente.objects.order_by('apellido', 'nombre', 'id'))
     return render(request, 'gestion_clinica/pacientes/list.html', {'pacientes': pacientes})
 
 def medico_list_view(request):
     """
     Vista para listar médicos con datos reales.
+    Las filas se cachean por médico y especialidad (ver el template).
     """
-    medicos = Medico.objects.all()
+    medicos = paginar(request, Medico.objects.select_related('especialidad').order_by('apellido', 'nombre', 'id'))
     return render(request, 'gestion_clinica/medicos/list.html', {'medicos': medicos})
 
 def consulta_list_view(request):
     """
     Vista para listar consultas con datos reales.
+    Se traen paciente y médico en la misma consulta SQL, ya que sus marcas
+    updated_at forman parte de la clave de cache de cada fila.
     """
-    consultas = ConsultaMedica.objects.all()
+    consultas = paginar(request, ConsultaMedica.objects.select_related('paciente', 'medico').order_by('-fecha_consulta', '-id'))
     return render(request, 'gestion_clinica/consultas/list.html', {'consultas': consultas})
 
 def especialidad_list_view(request):
     """
     Vista para listar especialidades con datos reales.
     """
-    especialidades = Especialidad.objects.all()
+    especialidades = paginar(request, Especialidad.objects.order_by('nombre', 'id'))
     return render(request, 'gestion_clinica/especialidades/list.html', {'especialidades': especialidades})
 
 def tratamiento_list_view(request):
     """
     Vista para listar tratamientos con datos reales.
     """
-    tratamientos = Tratamiento.objects.all()
+    tratamientos = paginar(request, Tratamiento.objects.select_related('consulta__paciente', 'consulta__medico').order_by('-id'))
     return render(request, 'gestion_clinica/tratamientos/list.html', {'tratamientos': tratamientos})
 
 def medicamento_list_view(request):
     """
     Vista para listar medicamentos con datos reales.
     """
-    medicamentos = Medicamento.objects.all()
+    medicamentos = paginar(request, Medicamento.objects.order_by('nombre', 'id'))
     return render(request, 'gestion_clinica/medicamentos/list.html', {'medicamentos': medicamentos})
 
 def receta_list_view(request):
     """
     Vista para listar recetas con datos reales.
     """
-    recetas = RecetaMedica.objects.all()
+    recetas = paginar(request, RecetaMedica.objects.select_related('tratamiento__consulta__paciente', 'medicamento').order_by('-id'))
     return render(request, 'gestion_clinica/recetas/list.html', {'recetas': recetas})
 
+def autocompletar_view(request, recurso):
+    """
+    Endpoint de búsqueda paginada para los widgets de autocompletado.
+    Parámetros: q (texto a buscar) y pagina (desde 1).
+    """
+    busqueda = BUSQUEDAS.get(recurso)
+    if busqueda is None:
+        raise Http404('Recurso de autocompletado desconocido.')
+    try:
+        pagina = max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    resultados, hay_mas = busqueda.pagina(request.GET.get('q', '').strip(), pagina)
+    return JsonResponse({'resultados': resultados, 'hay_mas': hay_mas})
+
+async def eventos_view(request):
+    """
+    Canal Server-Sent Events con los cambios de citas y consultas.
+    Filtros opcionales: medico (id) y fecha (AAAA-MM-DD, día local).
+    Es una vista asíncrona: bajo ASGI cada pantalla conectada solo ocupa
+    una corrutina en espera, no un hilo.
+    """
+    try:
+        medico = int(request.GET['medico']) if request.GET.get('medico') else None
+        fecha = date.fromisoformat(request.GET['fecha']).isoformat() if request.GET.get('fecha') else None
+    except ValueError:
+        return HttpResponseBadRequest('Parámetros medico o fecha inválidos.')
+
+    broker = obtener_broker()
+    suscripcion = broker.suscribir(medico=medico, fecha=fecha)
+    latido = getattr(settings, 'EVENTOS_LATIDO_SEGUNDOS', 15)
+
+    async def flujo():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=latido)
+                except asyncio.TimeoutError:
+                    # Comentario SSE para mantener viva la conexión a través de proxies
+                    yield ': latido\n\n'
+                    continue
+                yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            broker.cancelar(suscripcion)
+
+    respuesta = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+@condition(etag_func=lambda request, pk: calendario.etag(medico_id=pk))
+def calendario_medico_view(request, pk):
+    """
+    Feed iCalendar con las citas de un médico.
+    Responde 304 si el ETag enviado por el cliente sigue vigente.
+    """
+    medico = get_object_or_404(Medico, pk=pk)
+    return _respuesta_calendario(
+        calendario.generar(f"Citas - {medico.nombre} {medico.apellido}", medico_id=pk),
+        f'medico-{pk}.ics',
+    )
+
+@condition(etag_func=lambda request, pk: calendario.etag(medico__especialidad_id=pk))
+def calendario_especialidad_view(request, pk):
+    """
+    Feed iCalendar con las citas de todos los médicos de una especialidad.
+    """
+    especialidad = get_object_or_404(Especialidad, pk=pk)
+    return _respuesta_calendario(
+        calendario.generar(f"Citas - {especialidad.nombre}", medico__especialidad_id=pk),
+        f'especialidad-{pk}.ics',
+    )
+
+def _respuesta_calendario(lineas, nombre):
+    respuesta = StreamingHttpResponse(lineas, content_type='text/calendar; charset=utf-8')
+    respuesta['Content-Disposition'] = f'inline; filename="{nombre}"'
+    # Obliga a revalidar con el ETag en cada consulta del cliente
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
 # Vista para listar y crear especialidades
-class EspecialidadListCreateView(generics.ListCreateAPIView):
+class EspecialidadListCreateView(IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Permite listar todas las especialidades y crear una nueva.
     """
-    queryset = Especialidad.objects.all()
+    queryset = Especialidad.objects.order_by('id')
     serializer_class = EspecialidadSerializer
 
 # Vista para obtener, actualizar y eliminar una especialidad
@@ -99,11 +240,11 @@ class EspecialidadRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVie
     serializer_class = EspecialidadSerializer
 
 # Vista para listar y crear pacientes
-class PacienteListCreateView(generics.ListCreateAPIView):
+class PacienteListCreateView(IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los pacientes y crear nuevos.
     """
-    queryset = Paciente.objects.all()
+    queryset = Paciente.objects.order_by('id')
     serializer_class = PacienteSerializer
     filterset_class = PacienteFilter 
 
@@ -115,12 +256,13 @@ class PacienteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Paciente.objects.all()
     serializer_class = PacienteSerializer
 
-class MedicoListCreateView(generics.ListCreateAPIView):
+class MedicoListCreateView(CoalescenciaMixin, IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los médicos y crear nuevos.
     Incluye la relación con su especialidad.
+    Los listados idénticos simultáneos comparten una sola consulta.
     """
-    queryset = Medico.objects.all()
+    queryset = Medico.objects.order_by('id')
     serializer_class = MedicoSerializer
     filterset_class = MedicoFilter  
 
@@ -132,12 +274,39 @@ class MedicoRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = MedicoSerializer
 
 
-class ConsultaMedicaListCreateView(generics.ListCreateAPIView):
+class MedicoAgendaView(generics.GenericAPIView):
+    """
+    Agenda de un médico: citas y consultas del día ?fecha= (hoy por defecto),
+    con el resumen del paciente. Con ?vista=semana devuelve de lunes a domingo.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            dia = date.fromisoformat(request.query_params.get('fecha') or timezone.localdate().isoformat())
+        except ValueError:
+            raise ValidationError({'fecha': 'Debe tener el formato AAAA-MM-DD.'})
+        vista = request.query_params.get('vista', 'dia')
+        if vista not in ('dia', 'semana'):
+            raise ValidationError({'vista': 'Debe ser dia o semana.'})
+        if not Medico.objects.filter(pk=pk).exists():
+            raise Http404('Médico no encontrado.')
+
+        if vista == 'dia':
+            return Response({'medico': pk, 'fecha': dia.isoformat(), 'entradas': agenda.agenda_dia(pk, dia)})
+        dias = agenda.agenda_semana(pk, dia)
+        return Response({
+            'medico': pk,
+            'desde': min(dias).isoformat(),
+            'hasta': max(dias).isoformat(),
+            'dias': [{'fecha': d.isoformat(), 'entradas': entradas} for d, entradas in dias.items()],
+        })
+
+class ConsultaMedicaListCreateView(CoalescenciaMixin, IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Vista para listar todas las consultas médicas y crear nuevas.
     Incluye las relaciones con paciente y médico.
+    Los listados idénticos simultáneos comparten una sola consulta.
     """
-    queryset = ConsultaMedica.objects.all()
+    queryset = ConsultaMedica.objects.order_by('-fecha_consulta', '-id')
     serializer_class = ConsultaMedicaSerializer
     filterset_class = ConsultaMedicaFilter
 
@@ -148,12 +317,27 @@ class ConsultaMedicaRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIV
     queryset = ConsultaMedica.objects.all()
     serializer_class = ConsultaMedicaSerializer
 
-class TratamientoListCreateView(generics.ListCreateAPIView):
+class ConsultaMedicaExportarView(generics.GenericAPIView):
+    """
+    Encola la exportación a CSV de las consultas que cumplen los filtros
+    recibidos en la query string. Responde 202 con el trabajo creado.
+    """
+    serializer_class = TrabajoSerializer
+
+    def post(self, request, *args, **kwargs):
+        trabajo = encolar('exportar_consultas_csv', {'filtros': request.query_params.dict()})
+        return Response(
+            TrabajoSerializer(trabajo).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('trabajo-detail', args=[trabajo.pk])},
+        )
+
+class TratamientoListCreateView(IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los tratamientos y crear nuevos.
     Incluye la relación con la consulta médica.
     """
-    queryset = Tratamiento.objects.all()
+    queryset = Tratamiento.objects.order_by('id')
     serializer_class = TratamientoSerializer
     filterset_class = TratamientoFilter
 
@@ -164,11 +348,11 @@ class TratamientoRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView
     queryset = Tratamiento.objects.all()
     serializer_class = TratamientoSerializer
 
-class MedicamentoListCreateView(generics.ListCreateAPIView):
+class MedicamentoListCreateView(IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los medicamentos y crear nuevos.
     """
-    queryset = Medicamento.objects.all()
+    queryset = Medicamento.objects.order_by('id')
     serializer_class = MedicamentoSerializer
     filterset_class = MedicamentoFilter  
 
@@ -179,12 +363,38 @@ class MedicamentoRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView
     queryset = Medicamento.objects.all()
     serializer_class = MedicamentoSerializer
 
-class RecetaMedicaListCreateView(generics.ListCreateAPIView):
+class MedicamentoPronosticoView(generics.GenericAPIView):
+    """
+    Pronóstico de consumo diario y fecha de quiebre de stock por medicamento.
+    El cálculo se sirve desde la cache; ?refrescar=1 encola su recálculo.
+    """
+    def get(self, request, *args, **kwargs):
+        if request.query_params.get('refrescar'):
+            trabajo = encolar('recalcular_pronostico')
+            return Response(
+                TrabajoSerializer(trabajo).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse('trabajo-detail', args=[trabajo.pk])},
+            )
+        return Response(obtener_pronostico())
+
+class MedicamentoStockBajoView(generics.GenericAPIView):
+    """
+    Lista los medicamentos que se agotan dentro de ?dias= días (14 por defecto).
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            dias = max(0, int(request.query_params.get('dias', 14)))
+        except ValueError:
+            raise ValidationError({'dias': 'Debe ser un número entero.'})
+        return Response({'dias': dias, 'medicamentos': stock_bajo(dias)})
+
+class RecetaMedicaListCreateView(IdempotenciaMixin, generics.ListCreateAPIView):
     """
     Vista para listar todas las recetas médicas y crear nuevas.
     Incluye las relaciones con tratamiento y medicamento.
     """
-    queryset = RecetaMedica.objects.all()
+    queryset = RecetaMedica.objects.order_by('id')
     serializer_class = RecetaMedicaSerializer
     filterset_class = RecetaMedicaFilter
 
@@ -195,6 +405,243 @@ class RecetaMedicaRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVie
     queryset = RecetaMedica.objects.all()
     serializer_class = RecetaMedicaSerializer
 
+# Vista para listar y crear citas
+class CitaListCreateView(IdempotenciaMixin, generics.ListCreateAPIView):
+    """
+    Vista para listar las citas por fecha y hora, y crear nuevas.
+    Incluye las relaciones con paciente y médico.
+    """
+    queryset = Cita.objects.order_by('fecha_hora', 'id')
+    serializer_class = CitaSerializer
+    filterset_class = CitaFilter
+
+# Vista para ver, actualizar o eliminar una cita específica
+class CitaRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Vista para ver, actualizar o eliminar una cita específica.
+    """
+    queryset = Cita.objects.all()
+    serializer_class = CitaSerializer
+
+# Vistas para consultar los trabajos en segundo plano
+class TrabajoSedeMixin:
+    """
+    Limita los trabajos (tabla global en 'default') a los encolados desde
+    la sede de la petición: una sede no ve los parámetros, resultados ni
+    exportaciones de otra.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(sede=sede_actual())
+
+class TrabajoListView(TrabajoSedeMixin, generics.ListAPIView):
+    """
+    Vista para listar los trabajos en segundo plano, del más reciente al más antiguo.
+    """
+    queryset = Trabajo.objects.order_by('-creado')
+    serializer_class = TrabajoSerializer
+    filterset_fields = ['estado', 'tarea']
+
+class TrabajoRetrieveView(TrabajoSedeMixin, generics.RetrieveAPIView):
+    """
+    Vista para consultar el estado y el progreso de un trabajo específico.
+    """
+    queryset = Trabajo.objects.all()
+    serializer_class = TrabajoSerializer
+
+class TrabajoDescargaView(TrabajoSedeMixin, generics.RetrieveAPIView):
+    """
+    Vista para descargar el archivo generado por un trabajo de exportación.
+    """
+    queryset = Trabajo.objects.filter(estado='COMPLETADO')
+    serializer_class = TrabajoSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        trabajo = self.get_object()
+        nombre = (trabajo.resultado or {}).get('archivo')
+        if not nombre:
+            raise Http404('El trabajo no generó un archivo.')
+        ruta = Path(settings.EXPORTACIONES_DIR) / Path(nombre).name
+        if not ruta.exists():
+            raise Http404('El archivo ya no está disponible.')
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=ruta.name)
+
+# Vista de sincronización delta
+class SincronizacionView(generics.GenericAPIView):
+    """
+    Devuelve los registros creados, modificados y eliminados desde el token `since`,
+    en páginas de hasta `limite` registros. Mientras `completo` sea falso se debe
+    volver a llamar con `siguiente`; al terminar, `siguiente` es el próximo `since`.
+    """
+    LIMITE_MAXIMO = 2000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limite = min(self.LIMITE_MAXIMO, max(1, int(request.query_params.get('limite', 500))))
+        except ValueError:
+            raise ValidationError({'limite': 'Debe ser un número entero.'})
+        try:
+            pagina = pagina_cambios(request.query_params.get('since', ''), limite)
+        except TokenInvalido as error:
+            raise ValidationError({'since': str(error)})
+        return Response(pagina)
+
+# Vista de búsqueda de texto completo
+class BusquedaTextoView(generics.GenericAPIView):
+    """
+    Busca por texto en consultas (motivo y diagnóstico) o tratamientos (descripción).
+    Parámetros: q, tipo (consultas o tratamientos) y limite.
+    Devuelve los resultados ordenados por relevancia con un fragmento resaltado.
+    """
+    SERIALIZADORES = {
+        'consultas': ConsultaMedicaSerializer,
+        'tratamientos': TratamientoSerializer,
+    }
+    LIMITE_MAXIMO = 50
+
+    def get(self, request, *args, **kwargs):
+        texto = request.query_params.get('q', '').strip()
+        tipo = request.query_params.get('tipo', 'consultas')
+        if not texto:
+            raise ValidationError({'q': 'Debe indicar el texto a buscar.'})
+        if tipo not in self.SERIALIZADORES:
+            raise ValidationError({'tipo': f"Debe ser uno de: {', '.join(self.SERIALIZADORES)}."})
+        try:
+            limite = min(self.LIMITE_MAXIMO, max(1, int(request.query_params.get('limite', 20))))
+        except ValueError:
+            raise ValidationError({'limite': 'Debe ser un número entero.'})
+
+        modelo = busqueda.INDICES[tipo].modelo
+        resultados = busqueda.resaltar(busqueda.filtrar(modelo.objects.all(), texto), texto)[:limite]
+        datos = []
+        for obj in resultados:
+            fila = self.SERIALIZADORES[tipo](obj).data
+            fila['rango'] = obj.rango
+            fila['fragmento'] = busqueda.fragmento_html(obj.fragmento)
+            datos.append(fila)
+        return Response({'tipo': tipo, 'resultados': datos})
+
+
+# Vista de reportes centrales de todas las sedes
+class ReporteSedesView(generics.GenericAPIView):
+    """
+    Totales por sede y últimas consultas de toda la red entre ?desde= y ?hasta=
+    (los últimos 30 días por defecto). Cada sede se consulta en paralelo.
+    """
+    LIMITE_MAXIMO = 100
+
+    def get(self, request, *args, **kwargs):
+        hoy = timezone.localdate()
+        try:
+            desde = date.fromisoformat(request.query_params.get('desde') or (hoy - timedelta(days=30)).isoformat())
+            hasta = date.fromisoformat(request.query_params.get('hasta') or hoy.isoformat())
+        except ValueError:
+            raise ValidationError({'desde': 'Las fechas deben tener el formato AAAA-MM-DD.'})
+        try:
+            limite = min(self.LIMITE_MAXIMO, max(1, int(request.query_params.get('limite', 20))))
+        except ValueError:
+            raise ValidationError({'limite': 'Debe ser un número entero.'})
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+        reporte = reporte_central(inicio, fin, limite)
+        return Response(dict(reporte, desde=desde.isoformat(), hasta=hasta.isoformat()))
+
+# Vistas de analítica de citas
+class AnaliticaMixin:
+    """
+    Lee el período ?desde= / ?hasta= (las últimas ANALITICA_DIAS_DEFECTO
+    jornadas por defecto, hasta ANALITICA_DIAS_MAXIMO) y devuelve la
+    analítica cacheada de la sede.
+    """
+    def analitica_del_periodo(self, request):
+        hoy = timezone.localdate()
+        dias = getattr(settings, 'ANALITICA_DIAS_DEFECTO', 28)
+        try:
+            desde = date.fromisoformat(request.query_params.get('desde') or (hoy - timedelta(days=dias - 1)).isoformat())
+            hasta = date.fromisoformat(request.query_params.get('hasta') or hoy.isoformat())
+        except ValueError:
+            raise ValidationError({'desde': 'Las fechas deben tener el formato AAAA-MM-DD.'})
+        if hasta < desde:
+            raise ValidationError({'hasta': 'Debe ser igual o posterior a desde.'})
+        maximo = getattr(settings, 'ANALITICA_DIAS_MAXIMO', 366)
+        if (hasta - desde).days >= maximo:
+            raise ValidationError({'desde': f'El período puede abarcar a lo más {maximo} días.'})
+        return obtener_analitica(desde, hasta)
+
+    def filtro_entero(self, request, nombre):
+        valor = request.query_params.get(nombre)
+        if not valor:
+            return None
+        try:
+            return int(valor)
+        except ValueError:
+            raise ValidationError({nombre: 'Debe ser un número entero.'})
+
+class AnaliticaOcupacionView(AnaliticaMixin, generics.GenericAPIView):
+    """
+    Ocupación de cada médico por hora de la semana (7 x 24, de lunes a
+    domingo): fracción de los minutos de esa hora en el período que tuvo
+    reservados. Filtros: ?especialidad= y ?medico=.
+    """
+    def get(self, request, *args, **kwargs):
+        analitica = self.analitica_del_periodo(request)
+        especialidad = self.filtro_entero(request, 'especialidad')
+        medico = self.filtro_entero(request, 'medico')
+        medicos = [
+            m for m in analitica['medicos']
+            if (especialidad is None or m['especialidad'] == especialidad) and (medico is None or m['medico'] == medico)
+        ]
+        return Response({
+            'desde': analitica['desde'],
+            'hasta': analitica['hasta'],
+            'calculado': analitica['calculado'],
+            'medicos': medicos,
+        })
+
+class AnaliticaEspecialidadesView(AnaliticaMixin, generics.GenericAPIView):
+    """
+    Por especialidad: citas, tasas de cancelación e inasistencia y
+    distribución de la anticipación con que se agendan (en días).
+    """
+    def get(self, request, *args, **kwargs):
+        analitica = self.analitica_del_periodo(request)
+        return Response({
+            'desde': analitica['desde'],
+            'hasta': analitica['hasta'],
+            'calculado': analitica['calculado'],
+            'especialidades': analitica['especialidades'],
+        })
+
+# Vista de lecturas por lotes
+class LoteView(generics.GenericAPIView):
+    """
+    Ejecuta hasta LOTE_PETICIONES_MAXIMO peticiones GET de la API en una sola
+    llamada: {"peticiones": [{"id": "p1", "url": "/api/pacientes/1/"}, ...]}.
+    Responde 200 aunque alguna falle; el código de cada una va en su `status`.
+    """
+    # Un lote no puede contener otro lote
+    admite_lote = False
+
+    def post(self, request, *args, **kwargs):
+        return Response({'respuestas': ejecutar_lote(request, leer_peticiones(request.data))})
+
+# Vista del historial de auditoría de un registro
+class AuditoriaHistorialView(generics.ListAPIView):
+    """
+    Historial de cambios de un paciente, consulta o receta, del más reciente
+    al más antiguo: quién cambió qué campo, cuándo y de qué valor a cuál.
+    """
+    MODELOS = {
+        'pacientes': Paciente,
+        'consultas': ConsultaMedica,
+        'recetas': RecetaMedica,
+    }
+    serializer_class = RegistroAuditoriaSerializer
+
+    def get_queryset(self):
+        modelo = self.MODELOS.get(self.kwargs['recurso'])
+        if modelo is None:
+            raise Http404('Recurso sin auditoría.')
+        return historial(modelo, self.kwargs['pk'])
 
 # =============================================================================
 # VISTAS CRUD PARA FORMULARIOS HTML
@@ -240,8 +687,15 @@ def paciente_delete_view(request, id):
     paciente = get_object_or_404(Paciente, id=id)
     
     if request.method == 'POST':
-        paciente.delete()
-        messages.success(request, 'Paciente eliminado exitosamente.')
+        # La eliminación en cascada puede ser pesada: se delega a la cola de trabajos
+        trabajo = encolar(
+            'eliminar_registro',
+            {'modelo': 'Paciente', 'pk': paciente.pk, 'usuario_id': request.user.pk},
+        )
+        messages.success(
+            request,
+            f'La eliminación del paciente y su historial se está procesando en segundo plano (trabajo #{trabajo.pk}).',
+        )
         return redirect('paciente-list')
     
     return render(request, 'gestion_clinica/pacientes/delete.html', {'paciente': paciente})
@@ -287,8 +741,15 @@ def medico_delete_view(request, id):
     medico = get_object_or_404(Medico, id=id)
     
     if request.method == 'POST':
-        medico.delete()
-        messages.success(request, 'Médico eliminado exitosamente.')
+        # La eliminación en cascada puede ser pesada: se delega a la cola de trabajos
+        trabajo = encolar(
+            'eliminar_registro',
+            {'modelo': 'Medico', 'pk': medico.pk, 'usuario_id': request.user.pk},
+        )
+        messages.success(
+            request,
+            f'La eliminación del médico y su historial se está procesando en segundo plano (trabajo #{trabajo.pk}).',
+        )
         return redirect('medico-list')
     
     return render(request, 'gestion_clinica/medicos/delete.html', {'medico': medico})
@@ -334,8 +795,15 @@ def especialidad_delete_view(request, id):
     especialidad = get_object_or_404(Especialidad, id=id)
     
     if request.method == 'POST':
-        especialidad.delete()
-        messages.success(request, 'Especialidad eliminada exitosamente.')
+        # La eliminación en cascada puede ser pesada: se delega a la cola de trabajos
+        trabajo = encolar(
+            'eliminar_registro',
+            {'modelo': 'Especialidad', 'pk': especialidad.pk, 'usuario_id': request.user.pk},
+        )
+        messages.success(
+            request,
+            f'La eliminación de la especialidad y sus médicos se está procesando en segundo plano (trabajo #{trabajo.pk}).',
+        )
         return redirect('especialidad-list')
     
     return render(request, 'gestion_clinica/especialidades/delete.html', {'especialidad': especialidad})
@@ -489,8 +957,10 @@ def receta_create_view(request):
     """
     if request.method == 'POST':
         form = RecetaMedicaForm(request.POST)
-        if form.is_valid():
-            form.save()
+        # Revisión de duplicados y guardado con el paciente bloqueado
+        with transaction.atomic(using=alias_actual()):
+            guardada = form.is_valid() and form.save()
+        if guardada:
             messages.success(request, 'Receta médica creada exitosamente.')
             return redirect('receta-list')
     else:
@@ -506,8 +976,9 @@ def receta_edit_view(request, id):
     
     if request.method == 'POST':
         form = RecetaMedicaForm(request.POST, instance=receta)
-        if form.is_valid():
-            form.save()
+        with transaction.atomic(using=alias_actual()):
+            guardada = form.is_valid() and form.save()
+        if guardada:
             messages.success(request, 'Receta médica actualizada exitosamente.')
             return redirect('receta-list')
     else:
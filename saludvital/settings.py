@@ -4,10 +4,18 @@ Define la configuración completa del sistema de gestión clínica.
 Incluye configuración de base de datos PostgreSQL, apps instaladas, middleware,
 configuración de API REST, CORS, documentación Swagger y zona horaria.
 Uso de comentarios explicativos en cada módulo o clase.
+
+Los valores que cambian entre entornos (clave secreta, DEBUG, hosts,
+credenciales y conexiones de la base de datos) se leen de variables de
+entorno o de un archivo .env con python-decouple; los valores por defecto son
+los de desarrollo. Para producción se usa saludvital.settings_produccion.
 """
 
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+from decouple import Csv, config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -16,12 +24,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-6-$7)z*tq^7bwg&!kjuwv-04!l+0$=^^ovdttl=55#qk5d8)pm'
+SECRET_KEY = config('SECRET_KEY', default='django-insecure-6-$7)z*tq^7bwg&!kjuwv-04!l+0$=^^ovdttl=55#qk5d8)pm')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 
 # Application definition
@@ -33,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'corsheaders',
@@ -42,7 +51,14 @@ INSTALLED_APPS = [
 
 # REST_FRAMEWORK para los filtros
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+        # ?ids=1,2,3 en todos los listados
+        'gestion_clinica.filters.FiltroIds',
+    ],
+    # Paginación con conteo aproximado en tablas grandes (ver gestion_clinica.conteo)
+    'DEFAULT_PAGINATION_CLASS': 'gestion_clinica.conteo.PaginacionEstimada',
+    'PAGE_SIZE': 50,
 }
 
 MIDDLEWARE = [
@@ -52,6 +68,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gestion_clinica.sedes.ClinicaMiddleware',
+    'gestion_clinica.auditoria.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,6 +86,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'gestion_clinica.sedes.contexto',
             ],
         },
     },
@@ -75,6 +94,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'saludvital.wsgi.application'
 
+# Punto de entrada ASGI, necesario para el canal de eventos en vivo (/api/eventos/)
+ASGI_APPLICATION = 'saludvital.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -82,11 +104,33 @@ WSGI_APPLICATION = 'saludvital.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'saludvital_db',
-        'USER': 'postgres',
-        'PASSWORD': 'bios',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': config('DB_NAME', default='saludvital_db'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default='bios'),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        # Segundos que se reutiliza una conexión (0: una conexión nueva por petición)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=False, cast=bool),
+    }
+}
+
+# Sedes con base de datos propia: SALUDVITAL_SEDES=norte,sur agrega los alias
+# 'norte' y 'sur' con las mismas credenciales y las bases saludvital_db_<sede>
+SEDES = config('SALUDVITAL_SEDES', default='', cast=Csv())
+for _sede in SEDES:
+    DATABASES[_sede] = {**DATABASES['default'], 'NAME': f"{DATABASES['default']['NAME']}_{_sede}"}
+
+# Router que envía los datos clínicos a la base de la sede de la petición
+DATABASE_ROUTERS = ['gestion_clinica.sedes.RouterSedes']
+
+
+# Cache local del proceso en desarrollo; en producción debe ser compartida
+# (coalescencia, versiones de cache y candados entre procesos)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'saludvital',
     }
 }
 
@@ -134,6 +178,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuración para CORS
 CORS_ALLOW_ALL_ORIGINS = True
+# Cabeceras propias de la API: sede de la petición y reintentos idempotentes
+CORS_ALLOW_HEADERS = (*default_headers, 'x-clinica', 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
 
 # Configuración para drf-yasg (Swagger)
 SWAGGER_SETTINGS = {
@@ -143,3 +190,73 @@ SWAGGER_SETTINGS = {
         }
     }
 }
+
+# Configuración de la cola de trabajos en segundo plano (manage.py procesar_trabajos)
+TRABAJOS_CONCURRENCIA = 2
+TRABAJOS_BACKOFF_BASE = 10  # segundos antes del primer reintento
+TRABAJOS_BACKOFF_MAX = 3600  # tope de espera entre reintentos
+TRABAJOS_TIMEOUT = 3600  # segundos tras los cuales un trabajo EN_PROCESO se considera huérfano
+TRABAJOS_REVISION_HUERFANOS = 60  # cada cuántos segundos los workers buscan trabajos huérfanos
+
+# Directorio donde los trabajos de exportación dejan sus archivos
+EXPORTACIONES_DIR = BASE_DIR / 'exportaciones'
+
+# Sincronización delta: los cambios más recientes que este margen se entregan en la próxima sincronización
+SINCRONIZACION_MARGEN_SEGUNDOS = 5
+
+# Eventos en vivo (Server-Sent Events) de citas y consultas
+EVENTOS_BROKER = 'gestion_clinica.eventos.BrokerMemoria'  # reemplazar por un broker compartido con varios procesos
+EVENTOS_COLA_MAXIMA = 100  # eventos pendientes por conexión antes de descartar los más antiguos
+EVENTOS_LATIDO_SEGUNDOS = 15
+
+# Pronóstico de consumo de medicamentos
+PRONOSTICO_HORIZONTE_DIAS = 90  # días proyectados hacia adelante
+PRONOSTICO_CACHE_SEGUNDOS = 900
+
+# Agenda diaria de médicos: las entradas se invalidan al cambiar, la expiración es solo un respaldo
+AGENDA_CACHE_SEGUNDOS = 86400
+# Días en torno a hoy cuya agenda se cachea; los demás se arman en cada lectura
+AGENDA_CACHE_DIAS_ATRAS = 7
+AGENDA_CACHE_DIAS_ADELANTE = 90
+
+# Feeds iCalendar: días hacia atrás y hacia adelante incluidos
+CALENDARIO_DIAS_ATRAS = 30
+CALENDARIO_DIAS_ADELANTE = 180
+
+# Recordatorios de citas (bandeja de salida)
+RECORDATORIOS_ANTICIPACION_HORAS = 24
+RECORDATORIOS_REMITENTE = 'gestion_clinica.recordatorios.RemitenteConsola'
+RECORDATORIOS_ARCHIVO = BASE_DIR / 'recordatorios.jsonl'
+RECORDATORIOS_MAX_INTENTOS = 3
+RECORDATORIOS_ESPERA_SEGUNDOS = 60  # espera tras el primer envío fallido; se duplica en cada reintento
+RECORDATORIOS_TIMEOUT = 600  # segundos antes de recuperar un lote reservado
+RECORDATORIOS_REINTENTOS_RESERVA = 5  # errores seguidos de la base antes de detener un worker
+
+# Coalescencia de GET idénticos: espera máxima por la petición líder y vida del resultado compartido
+COALESCENCIA_ESPERA_SEGUNDOS = 5
+COALESCENCIA_RESULTADO_SEGUNDOS = 2
+
+# Conteos de los listados paginados: bajo este número de filas el total es
+# exacto; sobre él se usa la estimación del planificador de PostgreSQL
+CONTEO_UMBRAL_EXACTO = 10000
+PAGINA_TAMANO_MAXIMO = 200
+PAGINA_TAMANO_WEB = 50
+
+# Claves Idempotency-Key: cuánto se guarda la respuesta para los reintentos y
+# cuánto dura la reserva de una petición en curso antes de liberarse
+IDEMPOTENCIA_RETENCION_HORAS = 24
+IDEMPOTENCIA_RESERVA_SEGUNDOS = 60
+
+# Lecturas por lotes (/api/batch/): subpeticiones GET por llamada
+LOTE_PETICIONES_MAXIMO = 25
+
+# Analítica de citas: período por defecto y máximo (días), y vida de los resultados cacheados
+# (los períodos que incluyen hoy se recalculan antes para reflejar las reservas del día)
+ANALITICA_DIAS_DEFECTO = 28
+ANALITICA_DIAS_MAXIMO = 366
+ANALITICA_CACHE_SEGUNDOS = 900
+ANALITICA_CACHE_ABIERTO_SEGUNDOS = 60
+
+# Instantáneas columnares para análisis (manage.py crear_instantanea) y cuántas se conservan por sede
+INSTANTANEAS_DIR = BASE_DIR / 'instantaneas'
+INSTANTANEAS_CONSERVAR = 3
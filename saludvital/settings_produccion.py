@@ -0,0 +1,69 @@
+"""
+Configuración de producción del proyecto Salud Vital.
+Parte de saludvital.settings y la ajusta para rendimiento; se activa con
+DJANGO_SETTINGS_MODULE=saludvital.settings_produccion.
+
+Variables de entorno (o .env):
+- obligatorias: SECRET_KEY, ALLOWED_HOSTS (separados por coma) y DB_PASSWORD;
+- DB_NAME, DB_USER, DB_HOST, DB_PORT y SALUDVITAL_SEDES, como en desarrollo;
+- DB_CONN_MAX_AGE: segundos que se reutiliza cada conexión (600 por defecto);
+- REDIS_URL: cache compartida en Redis (requiere el paquete redis). Sin ella
+  se usa la cache en base de datos (manage.py createcachetable);
+- STATIC_ROOT: directorio de manage.py collectstatic.
+
+`manage.py revisar_rendimiento` advierte si queda activa alguna opción que
+reduce el rendimiento (DEBUG, conexiones no persistentes, cache local, ...).
+"""
+
+from decouple import Csv, config
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, TEMPLATES
+
+# Sin valor por defecto: el arranque falla si faltan
+SECRET_KEY = config('SECRET_KEY')
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', cast=Csv())
+
+# Con DEBUG cada consulta SQL se guarda en memoria (connection.queries)
+DEBUG = config('DEBUG', default=False, cast=bool)
+
+# Conexiones persistentes, verificadas antes de reutilizarlas tras una petición
+# (la base de cada sede hereda la misma configuración)
+for _base in DATABASES.values():
+    _base.update(
+        PASSWORD=config('DB_PASSWORD'),
+        CONN_MAX_AGE=config('DB_CONN_MAX_AGE', default=600, cast=int),
+        CONN_HEALTH_CHECKS=config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+    )
+
+# Cache compartida por todos los procesos
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'saludvital_cache',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
+# Sesiones leídas desde la cache; la base de datos solo se consulta si no están
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Plantillas compiladas una vez por proceso
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+STATIC_ROOT = config('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))